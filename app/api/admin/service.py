@@ -3,7 +3,9 @@ from tortoise.expressions import Q
 from tortoise.transactions import in_transaction
 
 from app.api.audit.service import AuditService
+from app.api.auth.cache import auth_cache
 from app.db.models import App, Audit, Auth, Permission, Prompt, User
+from app.lib.prompts import prompt_registry
 from app.utils.types.enums import AuthScopeEnum, ClientTypeEnum
 from app.utils.types.relations import (
     AppPermissionRelation,
@@ -41,6 +43,11 @@ class AdminService:
         permission.can_create_app = body.can_create_app
         await permission.save()
 
+        filter.pop("client_type")
+        auth = await Auth.filter(**filter).first()
+        if auth:
+            await auth_cache.invalidate_auth(auth)
+
     async def search_users(self, identifier: str) -> list[UserPermissionRelation]:
         users = (
             await User.filter(
@@ -94,11 +101,13 @@ class AdminService:
                     prompt_demote.is_active = False
 
         async with in_transaction():
-            await prompt.update_from_dict(**body.model_dump(exclude_none=True))
+            prompt.update_from_dict(body.model_dump(exclude_none=True))
             await prompt.save()
             if prompt_demote:
                 await prompt_demote.save()
 
+        await prompt_registry.bump_version()
+
     async def add_prompt(self, body: CreatePromptBody) -> Prompt:
         """Add a prompt and automatically demote a promote, if applicable"""
         prompt = Prompt(
@@ -126,6 +135,8 @@ class AdminService:
             if prompt_demote:
                 await prompt_demote.save()
 
+        await prompt_registry.bump_version()
+
         return prompt
 
     async def get_audit_children(self, id: str):
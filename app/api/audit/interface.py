@@ -3,7 +3,12 @@ from uuid import UUID
 
 from pydantic import BaseModel, Field, field_validator
 
-from app.utils.types.enums import AuditStatusEnum, AuditTypeEnum, NetworkEnum
+from app.utils.types.enums import (
+    AuditPriorityEnum,
+    AuditStatusEnum,
+    AuditTypeEnum,
+    NetworkEnum,
+)
 from app.utils.types.mixins import FkMixin
 from app.utils.types.models import (
     AuditSchema,
@@ -20,6 +25,20 @@ Used for HTTP request validation, response Serialization, and arbitrary typing.
 class EvalBody(BaseModel):
     contract_id: str = Field(description="contract to evaluate")
     audit_type: AuditTypeEnum = Field(default=AuditTypeEnum.GAS)
+    use_cache: bool = Field(
+        default=True,
+        description=(
+            "reuse the result of an identical audit (same code, audit type, and "
+            "prompts) at a discount. Set to false to force a re-run"
+        ),
+    )
+    priority: AuditPriorityEnum = Field(
+        default=AuditPriorityEnum.REALTIME,
+        description=(
+            "batch audits are processed within 24 hours at a discount, for results "
+            "that aren't needed right away"
+        ),
+    )
 
 
 class CreateEvalResponse(IdResponse):
@@ -36,6 +55,17 @@ class FilterParams(BaseModel, FkMixin):
     user_address: Optional[str] = None
     page: int = 0
     page_size: int = 20
+    cursor: Optional[str] = Field(
+        default=None,
+        description=(
+            "`next_cursor` of the previous response, to continue after it. Takes "
+            "precedence over page, and stays fast however deep the page is"
+        ),
+    )
+    include_total: bool = Field(
+        default=True,
+        description="count matching audits for total_pages, skip it for speed",
+    )
     audit_type: list[AuditTypeEnum] = Field(default_factory=list)
     status: Optional[AuditStatusEnum] = None
     network: list[NetworkEnum] = Field(default_factory=list)
@@ -87,7 +117,12 @@ class AuditsResponse(BaseModel):
     more: bool = Field(
         description="whether more audits exist, given page and page_size"
     )
-    total_pages: int = Field(description="total pages, given page_size")
+    total_pages: Optional[int] = Field(
+        default=None, description="total pages, given page_size and include_total"
+    )
+    next_cursor: Optional[str] = Field(
+        default=None, description="cursor of the next page, if more audits exist"
+    )
 
 
 class AuditResponse(AuditWithFindingsRelation):
@@ -27,6 +27,9 @@ GET_AUDITS = OpenApiParams(
     description="""
         Get audits according to a filter set. If calling as an `App`, you'll be able to view all audits generated
         through your app. If calling as a `User`, you'll be able to view your own audits (making `user_id` or `user_address` irrelevant).
+
+        Results are newest first. For deep listings, pass each response's `next_cursor` as `cursor` rather than
+        incrementing `page`, and set `include_total=false` to skip counting the matching audits.
         """,
     response_model=AuditsResponse,
     responses={401: {"model": ErrorResponse}},
@@ -53,6 +56,21 @@ GET_AUDIT_STATUS = OpenApiParams(
     responses={401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}},
 )
 
+GET_AUDIT_EVENTS = OpenApiParams(
+    summary="Stream audit events",
+    description="""
+        A lighter alternative to polling `GET /audit/{id}/status`, as a stream of Server-Sent Events. Each event is
+        the status of a step, or the audit as a whole once it finishes (`name` is `audit`), after which the stream
+        closes. Events carry an `id`, reconnecting with the `Last-Event-ID` header resumes after that event.
+        """,
+    response_description="`text/event-stream` of JSON encoded events",
+    responses={
+        200: {"content": {"text/event-stream": {}}},
+        401: {"model": ErrorResponse},
+        404: {"model": ErrorResponse},
+    },
+)
+
 SUBMIT_FEEDBACK = OpenApiParams(
     summary="Submit feedback",
     description="""
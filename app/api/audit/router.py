@@ -1,14 +1,18 @@
-from typing import Annotated
+import json
+from contextlib import aclosing
+from typing import Annotated, Optional
 
 from fastapi import (
     APIRouter,
     Body,
     Depends,
+    Header,
     HTTPException,
     Query,
     Request,
     status,
 )
+from fastapi.responses import StreamingResponse
 from tortoise.exceptions import DoesNotExist
 
 from app.api.dependencies import Authentication, RequireCredits
@@ -28,6 +32,7 @@ from .interface import (
 from .openapi import (
     CREATE_AUDIT,
     GET_AUDIT,
+    GET_AUDIT_EVENTS,
     GET_AUDIT_STATUS,
     GET_AUDITS,
     SUBMIT_FEEDBACK,
@@ -74,6 +79,14 @@ class AuditRouter(APIRouter):
             status_code=status.HTTP_200_OK,
             **GET_AUDIT_STATUS,
         )
+        self.add_api_route(
+            "/{id}/events",
+            self.get_audit_events,
+            methods=["GET"],
+            dependencies=[Depends(Authentication(required_role=RoleEnum.USER))],
+            status_code=status.HTTP_200_OK,
+            **GET_AUDIT_EVENTS,
+        )
         self.add_api_route(
             "/{id}/feedback",
             self.submit_feedback,
@@ -135,6 +148,40 @@ class AuditRouter(APIRouter):
                 detail="this audit does not exist under these credentials",
             )
 
+    async def get_audit_events(
+        self,
+        request: Request,
+        id: str,
+        last_event_id: Annotated[Optional[str], Header()] = None,
+    ) -> StreamingResponse:
+        audit_service = AuditService()
+
+        try:
+            events = await audit_service.get_events(
+                auth=request.state.auth, id=id, after=last_event_id
+            )
+        except DoesNotExist:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="this audit does not exist under these credentials",
+            )
+
+        async def stream():
+            async with aclosing(events):
+                async for event in events:
+                    if event is None:
+                        yield ": keepalive\n\n"
+                        continue
+                    frame = f"id: {event['id']}\n" if "id" in event else ""
+                    yield frame + f"data: {json.dumps(event)}\n\n"
+
+        return StreamingResponse(
+            stream(),
+            media_type="text/event-stream",
+            # proxies mustn't buffer the stream.
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
     async def submit_feedback(
         self, request: Request, body: Annotated[FeedbackBody, Body()], id: str
     ) -> BooleanResponse:
@@ -1,16 +1,28 @@
+import asyncio
+import base64
+import json
 import math
 from collections import defaultdict
+from contextlib import aclosing
+from datetime import datetime
+from typing import AsyncIterator, Optional
 
-from arq import create_pool
 from fastapi import HTTPException, status
 from logfire.propagate import get_context
+from tortoise.expressions import Q
 from tortoise.timezone import now
 
-from app.config import redis_settings
 from app.db.models import Audit, Contract, Finding
+from app.lib.clients import queue_client
+from app.lib.events import job_event_hub, stream_position
 from app.utils.templates.gas import gas_template
 from app.utils.templates.security import security_template
-from app.utils.types.enums import AuditTypeEnum, FindingLevelEnum, RoleEnum
+from app.utils.types.enums import (
+    AuditStatusEnum,
+    AuditTypeEnum,
+    FindingLevelEnum,
+    RoleEnum,
+)
 from app.utils.types.models import AuditSchema
 from app.utils.types.relations import AuditRelation, AuditWithFindingsRelation
 from app.utils.types.shared import AuthState
@@ -26,11 +38,35 @@ from .interface import (
 )
 
 
+def encode_cursor(audit: Audit, n: int) -> str:
+    """Opaque position after `audit`, n being the index of the result that follows"""
+    position = [audit.created_at.isoformat(), str(audit.id), n]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str, int]:
+    try:
+        created_at, id, n = json.loads(base64.urlsafe_b64decode(cursor))
+        return datetime.fromisoformat(created_at), str(id), int(n)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="invalid cursor"
+        )
+
+
 class AuditService:
     template_map: dict[AuditTypeEnum, str] = {
         AuditTypeEnum.GAS: gas_template,
         AuditTypeEnum.SECURITY: security_template,
     }
+    FINISHED_STATUSES = [
+        AuditStatusEnum.SUCCESS,
+        AuditStatusEnum.FAILED,
+        AuditStatusEnum.CANCELLED,
+    ]
+    # without an event for this long, followers get a keepalive and the audit's
+    # status is checked, in case its final event wasn't published.
+    EVENTS_IDLE_SECONDS = 15
 
     async def get_audits(self, auth: AuthState, query: FilterParams) -> AuditsResponse:
         limit = query.page_size
@@ -60,15 +96,26 @@ class AuditService:
 
         audit_query = Audit.filter(**filter)
 
-        total = await audit_query.count()
-        total_pages = math.ceil(total / limit)
-
-        if total <= offset:
-            return AuditsResponse(more=False, total_pages=total_pages)
+        total_pages = None
+        if query.include_total:
+            total = await audit_query.count()
+            total_pages = math.ceil(total / limit)
+            if not query.cursor and total <= offset:
+                return AuditsResponse(more=False, total_pages=total_pages)
+
+        # (created_at, id) keyset, matching the listing order and the audit indexes,
+        # so a page after the cursor is a range scan rather than a skipped offset.
+        page_query = audit_query
+        if query.cursor:
+            created_at, id, offset = decode_cursor(query.cursor)
+            page_query = page_query.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=id)
+            )
+        else:
+            page_query = page_query.offset(offset)
 
         audits = (
-            await audit_query.order_by("-created_at")
-            .offset(offset)
+            await page_query.order_by("-created_at", "-id")
             .limit(limit + 1)
             .select_related("user", "contract")
         )
@@ -82,8 +129,13 @@ class AuditService:
             )
             data.append(response)
 
+        more = len(audits) > limit
+        next_cursor = None
+        if more:
+            next_cursor = encode_cursor(audits_trimmed[-1], offset + limit)
+
         return AuditsResponse(
-            results=data, more=len(audits) > query.page_size, total_pages=total_pages
+            results=data, more=more, total_pages=total_pages, next_cursor=next_cursor
         )
 
     async def get_audit(self, auth: AuthState, id: str) -> AuditResponse:
@@ -123,6 +175,81 @@ class AuditService:
 
         return response
 
+    async def get_events(
+        self, auth: AuthState, id: str, after: Optional[str] = None
+    ) -> AsyncIterator[Optional[dict]]:
+        """
+        Follow the audit's events after the `after` event id, until the audit
+        finishes. None is yielded whenever the stream has been idle for a while.
+        Raises DoesNotExist up front, rather than once iterated.
+        """
+        obj_filter = {"id": id}
+        if auth.role == RoleEnum.APP:
+            obj_filter["app_id"] = auth.app_id
+        if auth.role == RoleEnum.USER:
+            obj_filter["user_id"] = auth.user_id
+
+        audit = await Audit.get(**obj_filter).only("id", "status")
+
+        try:
+            stream_position(after or "0")
+        except ValueError:
+            after = None
+
+        return self._follow_events(audit, after=after or "0")
+
+    def _status_event(self, audit_id: str, status: AuditStatusEnum) -> dict:
+        return {
+            "type": "eval",
+            "name": "audit",
+            "status": status.value,
+            "job_id": audit_id,
+        }
+
+    async def _follow_events(
+        self, audit: Audit, after: str
+    ) -> AsyncIterator[Optional[dict]]:
+        audit_id = str(audit.id)
+
+        if audit.status in self.FINISHED_STATUSES:
+            events = await job_event_hub.event_log.read(audit_id, after=after)
+            for event in events:
+                yield event
+            if not any(event["name"] == "audit" for event in events):
+                yield self._status_event(audit_id, audit.status)
+            return
+
+        async with aclosing(job_event_hub.subscribe(audit_id, after=after)) as events:
+            pending = None
+            try:
+                while True:
+                    pending = pending or asyncio.ensure_future(events.__anext__())
+                    done, _ = await asyncio.wait(
+                        [pending], timeout=self.EVENTS_IDLE_SECONDS
+                    )
+
+                    if not done:
+                        current = AuditStatusEnum(
+                            await Audit.get(id=audit.id).values_list(
+                                "status", flat=True
+                            )
+                        )
+                        if current in self.FINISHED_STATUSES:
+                            yield self._status_event(audit_id, current)
+                            return
+                        yield None
+                        continue
+
+                    event = pending.result()
+                    pending = None
+                    yield event
+                    if event["name"] == "audit":
+                        return
+            finally:
+                if pending is not None:
+                    pending.cancel()
+                    await asyncio.gather(pending, return_exceptions=True)
+
     async def submit_feedback(
         self, data: FeedbackBody, auth: AuthState, id: str
     ) -> None:
@@ -203,15 +330,15 @@ class AuditService:
             audit_type=audit_type,
         )
 
-        redis_pool = await create_pool(redis_settings)
-
         # the job_id is guaranteed to be unique, make it align with the audit.id
         # for simplicitly.
         log_context = get_context()
-        await redis_pool.enqueue_job(
+        await queue_client.enqueue_job(
             "process_eval",
             _job_id=str(audit.id),
             trace=log_context,
+            use_cache=data.use_cache,
+            priority=data.priority,
         )
 
         return audit
@@ -0,0 +1,96 @@
+from typing import Optional
+
+from tortoise.exceptions import DoesNotExist
+
+from app.db.models import Auth, User
+from app.lib.cache import TieredCache
+from app.utils.types.common import ModelId
+from app.utils.types.enums import AuthScopeEnum
+from app.utils.types.shared import CachedAuth
+
+
+class AuthCache:
+    """
+    Resolves API keys and delegated users without hitting postgres on every
+    request.
+
+    Entries live for a few seconds in each process and for minutes in redis.
+    Anything that mutates an Auth row must call `invalidate`, which clears redis
+    and the current process; other processes converge within `LOCAL_TTL`.
+    """
+
+    LOCAL_TTL = 10
+    REDIS_TTL = 300
+
+    def __init__(self):
+        self.keys = TieredCache(
+            namespace="auth", local_ttl=self.LOCAL_TTL, redis_ttl=self.REDIS_TTL
+        )
+        self.users = TieredCache(
+            namespace="auth_user", local_ttl=self.LOCAL_TTL, redis_ttl=self.REDIS_TTL
+        )
+
+    async def get_auth(self, hashed_key: str) -> CachedAuth:
+        cached = await self.keys.get(hashed_key)
+        if cached is not None:
+            return CachedAuth.model_validate(cached)
+
+        auth = await Auth.get(hashed_key=hashed_key).select_related("app")
+
+        app = auth.app
+        cached_auth = CachedAuth(
+            id=auth.id,
+            client_type=auth.client_type,
+            scope=auth.scope,
+            consumes_credits=auth.consumes_credits,
+            is_revoked=auth.revoked_at is not None,
+            rate_limit=auth.rate_limit,
+            user_id=auth.user_id,
+            app_id=app.id if app else None,
+            app_type=app.type if app else None,
+            owner_id=app.owner_id if app else None,
+        )
+
+        await self.keys.set(hashed_key, cached_auth.model_dump(mode="json"))
+        return cached_auth
+
+    async def _get_user(self, user_id: ModelId) -> Optional[dict]:
+        key = str(user_id)
+        cached = await self.users.get(key)
+        if cached is not None:
+            return cached
+
+        if not await User.exists(id=user_id):
+            # don't cache misses, the user could be created at any moment.
+            return None
+
+        auth = await Auth.filter(user_id=user_id).first()
+        cached = {"scope": auth.scope.value if auth else None}
+
+        await self.users.set(key, cached)
+        return cached
+
+    async def user_exists(self, user_id: ModelId) -> bool:
+        return await self._get_user(user_id) is not None
+
+    async def get_user_scope(self, user_id: ModelId) -> AuthScopeEnum:
+        cached = await self._get_user(user_id)
+        if not cached or not cached["scope"]:
+            raise DoesNotExist("no auth exists for this user")
+        return AuthScopeEnum(cached["scope"])
+
+    async def invalidate(
+        self,
+        hashed_key: Optional[str] = None,
+        user_id: Optional[ModelId] = None,
+    ) -> None:
+        if hashed_key:
+            await self.keys.delete(hashed_key)
+        if user_id:
+            await self.users.delete(str(user_id))
+
+    async def invalidate_auth(self, auth: Auth) -> None:
+        await self.invalidate(hashed_key=auth.hashed_key, user_id=auth.user_id)
+
+
+auth_cache = AuthCache()
@@ -1,5 +1,6 @@
 from fastapi import HTTPException, status
 
+from app.api.auth.cache import auth_cache
 from app.api.permission.service import PermissionService
 from app.db.models import App, Auth, User
 from app.utils.types.enums import ClientTypeEnum, PermissionEnum
@@ -23,7 +24,8 @@ class AuthService:
         auth = await Auth.filter(**search_criteria).first()
         api_key, hash_key = Auth.create_credentials()
         if auth:
-            # regenerate
+            # regenerate, the previous key must stop resolving immediately.
+            await auth_cache.invalidate_auth(auth)
             auth.hashed_key = hash_key
             await auth.save()
             return api_key
@@ -44,6 +46,8 @@ class AuthService:
         await Auth.create(
             **search_criteria, client_type=client_type, hashed_key=hash_key
         )
+        # delegated lookups may have cached this user without an auth.
+        await auth_cache.invalidate(user_id=search_criteria.get("user_id"))
 
         return api_key
 
@@ -1,10 +1,9 @@
-from arq import create_pool
 from fastapi import APIRouter, status
 from fastapi.openapi.docs import get_redoc_html
 from fastapi.responses import JSONResponse, RedirectResponse
 from tortoise import Tortoise
 
-from app.config import redis_settings
+from app.lib.clients import queue_client
 
 
 class BaseRouter(APIRouter):
@@ -28,8 +27,7 @@ class BaseRouter(APIRouter):
             return JSONResponse({"ok": False, "error": str(e)})
 
     async def test(self):
-        redis_pool = await create_pool(redis_settings)
-        job = await redis_pool.enqueue_job(
+        job = await queue_client.enqueue_job(
             "mock",
         )
 
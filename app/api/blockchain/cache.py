@@ -0,0 +1,82 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+from app.lib.cache import TieredCache
+from app.utils.types.enums import NetworkEnum
+
+
+class SourceCodeCache:
+    """
+    Explorer getsourcecode results by (network, address), including addresses
+    that weren't found, so repeated scans don't query every explorer again.
+
+    Verified source code doesn't change, so it's kept the longest. Unverified
+    contracts can be verified, and missing addresses can be deployed to, so those
+    expire sooner. Concurrent lookups of the same address in a process share a
+    single request.
+    """
+
+    FOUND_TTL = 24 * 60 * 60
+    UNVERIFIED_TTL = 60 * 60
+    NOT_FOUND_TTL = 10 * 60
+    LOCAL_TTL = 60
+
+    def __init__(self):
+        self.results = TieredCache(
+            namespace="explorer_source",
+            local_ttl=self.LOCAL_TTL,
+            redis_ttl=self.FOUND_TTL,
+        )
+        self._in_flight: dict[str, asyncio.Task] = {}
+
+    def _key(self, network: NetworkEnum, address: str) -> str:
+        return f"{network.value}|{address.lower()}"
+
+    def _ttl(self, result: dict) -> int:
+        if result["is_available"]:
+            return self.FOUND_TTL
+        if result["exists"]:
+            return self.UNVERIFIED_TTL
+        return self.NOT_FOUND_TTL
+
+    async def _fetch(
+        self, key: str, fetch: Callable[[], Awaitable[Optional[dict]]]
+    ) -> Optional[dict]:
+        result = await fetch()
+        # None means the explorer errored, which is worth retrying.
+        if result is not None:
+            await self.results.set(key, result, ttl=self._ttl(result))
+        return result
+
+    async def get_or_fetch(
+        self,
+        network: NetworkEnum,
+        address: str,
+        fetch: Callable[[], Awaitable[Optional[dict]]],
+    ) -> Optional[dict]:
+        key = self._key(network, address)
+
+        cached = await self.results.get(key)
+        if cached is not None:
+            return cached
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(key, fetch))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        # a cancelled caller shouldn't cancel the fetch for everyone else.
+        return await asyncio.shield(task)
+
+    async def invalidate(self, network: NetworkEnum, address: str) -> None:
+        await self.results.delete(self._key(network, address))
+
+
+source_code_cache = SourceCodeCache()
+
+# on-chain credit balances, briefly, so polling doesn't query the contract each time.
+CREDITS_TTL = 10
+credits_cache = TieredCache(
+    namespace="credits", local_ttl=CREDITS_TTL, redis_ttl=CREDITS_TTL
+)
@@ -1,32 +1,27 @@
-import httpx
+import asyncio
+import os
+from typing import Optional
+
 import logfire
 
+from app.api.blockchain.cache import credits_cache, source_code_cache
 from app.lib.clients import ExplorerClient, Web3Client
 from app.utils.helpers.code_parser import SourceCodeParser
 from app.utils.types.enums import NetworkEnum
 
 
 class BlockchainService:
+    PROBE_TIMEOUT_SECONDS = 3
+
     async def get_gas(self) -> dict:
         explorer_client = ExplorerClient()
 
-        async with httpx.AsyncClient() as client:
-            response = await explorer_client.get_gas(
-                client=client, network=NetworkEnum.ETH
-            )
-            response.raise_for_status()
+        response = await explorer_client.get_gas(network=NetworkEnum.ETH)
+        data = response.json()
+        return data
 
-            data = response.json()
-            return data
-
-    async def get_source_code(
-        self, client: httpx.AsyncClient, address: str, network: NetworkEnum
-    ) -> dict:
-        explorer_client = ExplorerClient()
-
-        logfire.info(f"SCANNING {network} for address {address}")
-
-        obj = {
+    def _empty_source_code(self, address: str, network: NetworkEnum) -> dict:
+        return {
             "network": network,
             "address": address,
             "exists": False,
@@ -36,32 +31,107 @@ class BlockchainService:
             "contract_name": None,
         }
 
+    async def _fetch_source_code(
+        self, address: str, network: NetworkEnum
+    ) -> Optional[dict]:
+        """Returns None if the explorer didn't give a usable answer"""
+        explorer_client = ExplorerClient()
+
+        logfire.info(f"SCANNING {network} for address {address}")
+
+        obj = self._empty_source_code(address=address, network=network)
+
         try:
             response = await explorer_client.get_source_code(
-                client=client, network=network, address=address
+                network=network, address=address
             )
             response.raise_for_status()
             data = response.json()
+        except Exception as err:
+            logfire.exception(str(err))
+            return None
 
-            result = data.get("result")
-            if result and isinstance(result, list) and len(result) > 0:
-                obj["exists"] = True
+        result = data.get("result")
+        if not isinstance(result, list):
+            # rate limits and other errors are reported as a string result.
+            logfire.warning(f"unexpected {network} explorer response: {result}")
+            return None
+
+        if len(result) > 0:
+            obj["exists"] = True
+            try:
                 parser = SourceCodeParser(result[0])
                 parser.extract_code()
                 obj["is_available"] = parser.source != ""
                 obj["code"] = parser.source if parser.source != "" else None
                 obj["contract_name"] = parser.contract_name
                 obj["is_proxy"] = parser.is_proxy
+            except Exception as err:
+                logfire.exception(str(err))
+
+        return obj
+
+    async def _has_code(self, address: str, network: NetworkEnum) -> bool:
+        try:
+            web3_client = Web3Client(network=network)
+            exists = await asyncio.wait_for(
+                web3_client.get_code_exists([address]),
+                timeout=self.PROBE_TIMEOUT_SECONDS,
+            )
+            return exists[address]
         except Exception as err:
-            logfire.exception(str(err))
-        finally:
-            return obj
+            logfire.warning(f"unable to probe {network} for {address}: {err}")
+            return True
+
+    async def get_networks_with_code(
+        self, address: str, networks: list[NetworkEnum]
+    ) -> list[NetworkEnum]:
+        """
+        Narrow `networks` down to those where `address` has deployed bytecode, so
+        explorer lookups only go to chains the contract actually lives on.
+        Networks that can't be probed are kept, a failed probe never hides a
+        contract.
+        """
+        if not os.getenv("ALCHEMY_API_KEY"):
+            return networks
+
+        results = await asyncio.gather(
+            *[self._has_code(address=address, network=network) for network in networks]
+        )
+        found = [network for network, exists in zip(networks, results) if exists]
+
+        logfire.info(f"{address} has code on {len(found)}/{len(networks)} networks")
+        return found
+
+    async def get_source_code(self, address: str, network: NetworkEnum) -> dict:
+        result = await source_code_cache.get_or_fetch(
+            network=network,
+            address=address,
+            fetch=lambda: self._fetch_source_code(address=address, network=network),
+        )
+
+        if result is None:
+            return self._empty_source_code(address=address, network=network)
+        return result
 
     async def get_credits(self, address: str) -> float:
         """
-        Call the apiCredit contract directly.
+        Call the apiCredit contract directly. Balances are cached briefly, failed
+        reads aren't.
         """
+        key = address.lower()
+        cached = await credits_cache.get(key)
+        if cached is not None:
+            return cached
+
         web3_client = Web3Client.from_deployment()
 
-        credits = await web3_client.get_user_credits(user_address=address)
+        try:
+            credits = await web3_client.get_user_credits(user_address=address)
+        except Exception:
+            # most likely in development, if not running anvil + connected to ngrok
+            logfire.warning("unable to query contract")
+            return 0
+
+        await credits_cache.set(key, credits)
         return credits
@@ -2,15 +2,18 @@ import asyncio
 import hashlib
 from typing import Optional
 
-import httpx
 import logfire
 from fastapi import HTTPException, status
+from tortoise.exceptions import IntegrityError
 
 from app.api.blockchain.service import BlockchainService
-from app.db.models import Contract
-from app.utils.helpers.code_parser import SourceCodeParser
+from app.db.models import Contract, ContractAnalysis
+from app.lib.parser_pool import parser_pool
+from app.metrics import metrics_cache_requests
+from app.utils.helpers.code_parser import SourceCodeParser, analyze_source
 from app.utils.mappers import networks_by_type
 from app.utils.types.enums import ContractMethodEnum, NetworkEnum, NetworkTypeEnum
+from app.utils.types.errors import ParserError, ParserUnavailableError
 from app.utils.types.models import ContractSchema
 
 from .interface import (
@@ -62,42 +65,50 @@ class ContractService:
             )
             return [contract]
 
+        blockchain_service = BlockchainService()
         if network:
             networks_scan = [network]
         else:
-            networks_scan = networks_by_type[NetworkTypeEnum.MAINNET]
+            networks_scan = list(networks_by_type[NetworkTypeEnum.MAINNET])
             if self.allow_testnet:
                 networks_scan += networks_by_type[NetworkTypeEnum.TESTNET]
+            # cheap bytecode check first, most addresses only exist on a chain or two.
+            networks_scan = await blockchain_service.get_networks_with_code(
+                address=address, networks=networks_scan
+            )
 
         # Rather than calling these sequentially and breaking, we'll call them all.
         # For example, USDC contract on ETH mainnet is an address on BASE, so it early
         # exits without finding source code...
         tasks = []
-        blockchain_service = BlockchainService()
-        async with httpx.AsyncClient() as client:
-            for network in networks_scan:
-                tasks.append(
-                    asyncio.create_task(
-                        blockchain_service.get_source_code(
-                            client=client, address=address, network=network
-                        )
-                    )
+        for network in networks_scan:
+            tasks.append(
+                asyncio.create_task(
+                    blockchain_service.get_source_code(address=address, network=network)
                 )
+            )
 
-            results: list[dict] = await asyncio.gather(*tasks)
+        results: list[dict] = await asyncio.gather(*tasks)
 
         # only return those with source code.
         contracts_return: list[Contract] = []
         for result in results:
             if result["exists"]:
-                contract = await Contract.create(
-                    method=ContractMethodEnum.SCAN,
+                # an unverified scan, or the deployment indexer, may have stored it.
+                code = result["code"]
+                contract, _ = await Contract.update_or_create(
                     address=address,
-                    is_available=result["is_available"],
                     network=result["network"],
-                    is_proxy=result["is_proxy"],
-                    contract_name=result["contract_name"],
-                    code=result["code"],
+                    defaults={
+                        "method": ContractMethodEnum.SCAN,
+                        "is_available": result["is_available"],
+                        "is_proxy": result["is_proxy"],
+                        "contract_name": result["contract_name"],
+                        "code": code,
+                        "hashed_code": (
+                            hashlib.sha256(code.encode()).hexdigest() if code else None
+                        ),
+                    },
                 )
                 if contract.is_available:
                     contracts_return.append(contract)
@@ -129,6 +140,58 @@ class ContractService:
 
         return contract
 
+    async def _get_analysis(
+        self, contract: Contract
+    ) -> Optional[StaticAnalysisTokenResult]:
+        """
+        Static analysis of the contract's code. Code is only parsed once per
+        hashed_code, later calls read the stored result. None if the code can't
+        be parsed.
+        """
+        hashed_code = (
+            contract.hashed_code or hashlib.sha256(contract.code.encode()).hexdigest()
+        )
+        version = SourceCodeParser.ANALYSIS_VERSION
+
+        stored = await ContractAnalysis.get_or_none(hashed_code=hashed_code)
+        hit = stored is not None and stored.version == version
+        metrics_cache_requests.add(
+            1,
+            attributes={
+                "cache.namespace": "contract_analysis",
+                "cache.result": "hit" if hit else "miss",
+            },
+        )
+
+        if hit:
+            result = stored.result
+        else:
+            try:
+                ast, result = await parser_pool.run(analyze_source, contract.code)
+            except ParserUnavailableError:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="contract parsing is unavailable, try again shortly",
+                    headers={"Retry-After": "1"},
+                )
+            except ParserError as err:
+                # not stored, it may only have failed under load.
+                logfire.warning(str(err))
+                return None
+
+            try:
+                await ContractAnalysis.update_or_create(
+                    hashed_code=hashed_code,
+                    defaults={"version": version, "ast": ast, "result": result},
+                )
+            except IntegrityError:
+                # stored by a concurrent request for the same code.
+                pass
+
+        if result is None:
+            return None
+        return StaticAnalysisTokenResult(**result)
+
     async def process_static_eval_token(
         self, body: ContractScanBody
     ) -> StaticAnalysisTokenResult:
@@ -143,14 +206,11 @@ class ContractService:
                 status_code=status.HTTP_404_NOT_FOUND,
             )
 
-        if not first_candidate.is_parsable:
+        analysis = await self._get_analysis(first_candidate)
+        if not analysis:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="unable to parse smart contract code",
             )
 
-        parser = SourceCodeParser.from_contract_instance(first_candidate)
-        parser.generate_ast()
-        analysis = parser.analyze_contract()
-
         return analysis
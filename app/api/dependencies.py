@@ -4,17 +4,17 @@ basis. Fundamentally acts as a middleware, but we have more control over when it
 used without explicitly needing to whitelist / blacklist routes.
 """
 
-from datetime import datetime
 from typing import Annotated, Optional
 
 import logfire
-from fastapi import Depends, Header, HTTPException, Request, status
+from fastapi import Depends, Header, HTTPException, Request, Response, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
-from app.config import redis_client
+from app.api.auth.cache import auth_cache
+from app.api.middlewares import check_rate_limit
 from app.db.models import Auth, User
 from app.utils.types.enums import AppTypeEnum, AuthScopeEnum, ClientTypeEnum, RoleEnum
-from app.utils.types.shared import AuthState
+from app.utils.types.shared import AuthState, CachedAuth
 
 security = HTTPBearer(description="API key authorization")
 
@@ -32,14 +32,9 @@ class Authentication:
 
     async def check_authentication(
         self, request: Request, credentials: str, user_identifier: Optional[str] = None
-    ) -> Auth:
+    ) -> CachedAuth:
         hashed_key = Auth.hash_key(credentials)
-        auth = await Auth.get(hashed_key=hashed_key).select_related(
-            "user", "app__owner"
-        )
-
-        app = auth.app
-        user = auth.user
+        auth = await auth_cache.get_auth(hashed_key)
 
         is_delegated = user_identifier is not None
         credit_consumer_user_id = None
@@ -48,20 +43,20 @@ class Authentication:
         user_id = None
 
         if auth.client_type == ClientTypeEnum.APP:
-            app_id = app.id
-            if app.type == AppTypeEnum.FIRST_PARTY:
+            app_id = auth.app_id
+            if auth.app_type == AppTypeEnum.FIRST_PARTY:
                 consumes_credits = False
                 role = RoleEnum.APP_FIRST_PARTY
                 user_id = user_identifier
             else:
                 role = RoleEnum.APP
-                credit_consumer_user_id = app.owner.id
-                user_id = app.owner.id if not is_delegated else user_identifier
+                credit_consumer_user_id = auth.owner_id
+                user_id = auth.owner_id if not is_delegated else user_identifier
         else:
-            credit_consumer_user_id = user.id
+            credit_consumer_user_id = auth.user_id
             is_delegated = False
             role = RoleEnum.USER
-            user_id = user.id
+            user_id = auth.user_id
 
         auth_state = AuthState(
             role=role,
@@ -74,32 +69,32 @@ class Authentication:
 
         logfire.info("user auth state", **auth_state.model_dump())
 
-        if auth.revoked_at:
+        if auth.is_revoked:
             raise Exception("api key revoked")
 
         if self.required_role == RoleEnum.APP_FIRST_PARTY:
-            if not app:
+            if not auth.app_id:
                 raise Exception("invalid api permissions")
             if auth.client_type != ClientTypeEnum.APP:
                 raise Exception("invalid api permissions")
-            if app.type != AppTypeEnum.FIRST_PARTY:
+            if auth.app_type != AppTypeEnum.FIRST_PARTY:
                 raise Exception("invalid api permissions")
 
         if self.required_role == RoleEnum.APP:
-            if not app:
+            if not auth.app_id:
                 raise Exception("invalid api permissions")
             if auth.client_type != ClientTypeEnum.APP:
                 raise Exception("invalid api permissions")
 
         if user_identifier is not None:
-            if not await User.exists(id=user_identifier):
+            if not await auth_cache.user_exists(user_identifier):
                 raise Exception("bevor-user-id provided is not a valid user")
 
         request.state.auth = auth_state
 
         return auth
 
-    async def check_authorization(self, request: Request, auth: Auth) -> None:
+    async def check_authorization(self, request: Request, auth: CachedAuth) -> None:
         method = request.method
         cur_scope = auth.scope
         required_scope = self.scope_override
@@ -128,10 +123,10 @@ class Authentication:
             AuthScopeEnum.READ: 0,
         }
 
-        delegated_auth = await Auth.get(user_id=user_identifier)
+        delegated_scope = await auth_cache.get_user_scope(user_identifier)
 
         required_scope_tier = scope_tiers[self.delegated_scope]
-        delegated_scope_tier = scope_tiers[delegated_auth.scope]
+        delegated_scope_tier = scope_tiers[delegated_scope]
 
         if required_scope_tier > delegated_scope_tier:
             raise Exception("invalid scope for this request")
@@ -169,14 +164,11 @@ class AuthenticationWithoutDelegation:
         self.required_role = required_role
         self.scope_override = scope_override
 
-    async def check_authentication(self, request: Request, credentials: str) -> Auth:
+    async def check_authentication(
+        self, request: Request, credentials: str
+    ) -> CachedAuth:
         hashed_key = Auth.hash_key(credentials)
-        auth = await Auth.get(hashed_key=hashed_key).select_related(
-            "user", "app__owner"
-        )
-
-        app = auth.app
-        user = auth.user
+        auth = await auth_cache.get_auth(hashed_key)
 
         credit_consumer_user_id = None
         consumes_credits = auth.consumes_credits
@@ -184,19 +176,19 @@ class AuthenticationWithoutDelegation:
         user_id = None
 
         if auth.client_type == ClientTypeEnum.APP:
-            app_id = app.id
-            if app.type == AppTypeEnum.FIRST_PARTY:
+            app_id = auth.app_id
+            if auth.app_type == AppTypeEnum.FIRST_PARTY:
                 consumes_credits = False
                 role = RoleEnum.APP_FIRST_PARTY
 
             else:
                 role = RoleEnum.APP
-                credit_consumer_user_id = app.owner.id
-                user_id = app.owner.id
+                credit_consumer_user_id = auth.owner_id
+                user_id = auth.owner_id
         else:
-            credit_consumer_user_id = user.id
+            credit_consumer_user_id = auth.user_id
             role = RoleEnum.USER
-            user_id = user.id
+            user_id = auth.user_id
 
         auth_state = AuthState(
             role=role,
@@ -209,19 +201,19 @@ class AuthenticationWithoutDelegation:
 
         logfire.info("user auth state", **auth_state.model_dump())
 
-        if auth.revoked_at:
+        if auth.is_revoked:
             raise Exception("api key revoked")
 
         if self.required_role == RoleEnum.APP_FIRST_PARTY:
-            if not app:
+            if not auth.app_id:
                 raise Exception("invalid api permissions")
             if auth.client_type != ClientTypeEnum.APP:
                 raise Exception("invalid api permissions")
-            if app.type != AppTypeEnum.FIRST_PARTY:
+            if auth.app_type != AppTypeEnum.FIRST_PARTY:
                 raise Exception("invalid api permissions")
 
         if self.required_role == RoleEnum.APP:
-            if not app:
+            if not auth.app_id:
                 raise Exception("invalid api permissions")
             if auth.client_type != ClientTypeEnum.APP:
                 raise Exception("invalid api permissions")
@@ -230,7 +222,7 @@ class AuthenticationWithoutDelegation:
 
         return auth
 
-    async def check_authorization(self, request: Request, auth: Auth) -> None:
+    async def check_authorization(self, request: Request, auth: CachedAuth) -> None:
         method = request.method
         cur_scope = auth.scope
         required_scope = self.scope_override
@@ -297,33 +289,25 @@ class RequireCredits:
 
 
 class RateLimit:
-    MAX_LIMIT_PER_MINUTE = 30
-    WINDOW_SECONDS = 60
-
-    def __init__(self):
-        pass
-
-    async def __call__(self, request: Request) -> None:
-        auth: AuthState = request.state
-        if auth["app"]:
-            if auth["app"].type == AppTypeEnum.FIRST_PARTY:
-                return
-
-        authorization = request.headers.get("authorization")
-        api_key = authorization.split(" ")[1]
-        redis_key = f"rate_limit|{api_key}"
+    """
+    Per-route rate limit, layered on top of the global RateLimitMiddleware. Buckets
+    are namespaced by `name`, so they don't consume from the global bucket.
+    """
 
-        current_time = int(datetime.now().timestamp())
-        await redis_client.ltrim(redis_key, 0, self.MAX_LIMIT_PER_MINUTE)
-        await redis_client.lrem(redis_key, 0, current_time - self.WINDOW_SECONDS)
+    def __init__(self, name: str = "route", limit: Optional[int] = None):
+        self.name = name
+        self.limit = limit
 
-        request_count = await redis_client.llen(redis_key)
+    async def __call__(self, request: Request, response: Response) -> None:
+        result = await check_rate_limit(request, name=self.name, limit=self.limit)
+        if not result:
+            return
 
-        if request_count >= self.MAX_LIMIT_PER_MINUTE:
+        if not result.allowed:
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 detail="Too many requests in a minute",
+                headers=result.headers,
             )
 
-        await redis_client.rpush(redis_key, current_time)
-        await redis_client.expire(redis_client, self.WINDOW_SECONDS)
+        response.headers.update(result.headers)
@@ -1,10 +1,15 @@
-from datetime import datetime
+from typing import Optional
 
-from fastapi import HTTPException, Request
+from fastapi import Request, status
+from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.types import ASGIApp
+from tortoise.exceptions import DoesNotExist
 
-from app.config import redis_client
+from app.api.auth.cache import auth_cache
+from app.db.models import Auth
+from app.lib.ratelimit import RateLimitResult, rate_limiter
+from app.utils.types.enums import AppTypeEnum
 
 endpoint_groupings = [
     "/admin",
@@ -18,11 +23,39 @@ endpoint_groupings = [
 ]
 
 
+async def check_rate_limit(
+    request: Request, name: str = "global", limit: Optional[int] = None
+) -> Optional[RateLimitResult]:
+    """
+    Consume a request from the caller's bucket. Limits come from the caller's Auth,
+    unless overridden. First party apps aren't limited, and neither are requests
+    without a valid API key (authentication rejects those).
+    """
+    authorization = request.headers.get("authorization")
+    if not authorization:
+        return None
+
+    scheme, _, credentials = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not credentials:
+        return None
+
+    try:
+        auth = await auth_cache.get_auth(Auth.hash_key(credentials))
+    except DoesNotExist:
+        return None
+
+    if auth.app_type == AppTypeEnum.FIRST_PARTY:
+        return None
+
+    return await rate_limiter.hit(
+        key=f"{name}|{auth.id}",
+        limit=limit or auth.rate_limit or rate_limiter.DEFAULT_LIMIT,
+    )
+
+
 class RateLimitMiddleware(BaseHTTPMiddleware):
     def __init__(self, app: ASGIApp):
         super().__init__(app)
-        self.max_limit_per_minute = 30
-        self.window_seconds = 60
 
     async def dispatch(self, request: Request, call_next):
         if request.url.path in [
@@ -39,21 +72,16 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
             response = await call_next(request)
             return response
 
-        bearer = request.headers.get("authorization")
-        api_key = bearer.split(" ")[1]
-        redis_key = f"rate_limit|{api_key}"
-
-        current_time = int(datetime.now().timestamp())
-        await redis_client.ltrim(redis_key, 0, self.max_limit_per_minute - 1)
-        await redis_client.lrem(redis_key, 0, current_time - self.window_seconds)
-
-        request_count = await redis_client.llen(redis_key)
-
-        if request_count >= self.max_limit_per_minute:
-            raise HTTPException(status_code=429, detail="Too many requests in a minute")
+        result = await check_rate_limit(request)
 
-        await redis_client.rpush(redis_key, current_time)
-        await redis_client.expire(redis_client, self.window_seconds)
+        if result and not result.allowed:
+            return JSONResponse(
+                {"detail": "Too many requests in a minute"},
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers=result.headers,
+            )
 
         response = await call_next(request)
+        if result:
+            response.headers.update(result.headers)
         return response
@@ -7,6 +7,8 @@ class CreditCosts:
     BASE_FACTOR = 1_000_000  # number of tokens for pricing
     PRICE_PEG = 0.001  # token price peg
     PREMIUM = 4  # premium factor on top of compute
+    CACHE_DISCOUNT = 0.1  # fraction charged when reusing a prior audit's result
+    BATCH_DISCOUNT = 0.5  # fraction charged for audits run through the batch API
 
     def __init__(self):
         self.input_tokens = 0
@@ -31,6 +33,12 @@ class CreditCosts:
 
         return max(floor_cost, math.ceil(credit_cost))
 
+    def get_cached_cost(self):
+        return math.ceil(self.get_cost() * self.CACHE_DISCOUNT)
+
+    def get_batch_cost(self):
+        return math.ceil(self.get_cost() * self.BATCH_DISCOUNT)
+
     @classmethod
     def estimate_pricing(self):
         standard_output_tokens = 5_000  # historically what we've seen per audit
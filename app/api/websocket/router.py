@@ -1,31 +1,77 @@
 import asyncio
 import hashlib
 import hmac
-import json
 import os
+import time
 from collections import defaultdict
+from contextlib import aclosing
+from dataclasses import dataclass
 from datetime import datetime
-from typing import List
+from typing import Optional
 
 import logfire
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, WebSocketException
 
-from app.config import redis_client
-from app.metrics import metrics_ws_active
+from app.lib.events import JobEventHub, job_event_hub, stream_position
+from app.metrics import (
+    metrics_ws_active,
+    metrics_ws_connections,
+    metrics_ws_dropped,
+    metrics_ws_ping_rtt,
+)
 
 secret = os.getenv("SHARED_SECRET")
 
 
-class WebsocketRouter(APIRouter):
-    HEARTBEAT_INTERVAL = 5
+@dataclass
+class _Connection:
+    # the heartbeat wheel slot the socket is swept in.
+    slot: int
+    # when the unanswered heartbeat was sent, None once it's PONGed.
+    pinged_at: Optional[float] = None
+
 
-    def __init__(self):
+class WebsocketRouter(APIRouter):
+    """
+    Relays job events to the sockets subscribed to them, any number of sockets
+    may subscribe to a job. Events come from the process' `JobEventHub`, so a
+    replica only receives events for the jobs its clients follow.
+
+    Sockets subscribe with `subscribe:<job_id>`, and first receive the job's logged
+    events, or with `subscribe:<job_id>:<event_id>` to resume after an event they
+    already have.
+
+    A single heartbeat loop serves every socket. Sockets are spread over the slots
+    of a timer wheel by when they connected, each tick sweeps one slot, so every
+    socket gets a heartbeat once per interval without a timer of its own. A socket
+    is dropped once its heartbeat has gone unanswered for longer than the grace
+    window, which spans a few intervals so slow mobile clients aren't cut off.
+    """
+
+    HEARTBEAT_INTERVAL = int(os.getenv("WS_HEARTBEAT_INTERVAL_SECONDS", 5))
+    HEARTBEAT_GRACE = int(os.getenv("WS_HEARTBEAT_GRACE_SECONDS", 15))
+    HEARTBEAT_SLOTS = 10
+
+    def __init__(
+        self,
+        events: Optional[JobEventHub] = None,
+        heartbeat_interval: float = HEARTBEAT_INTERVAL,
+        heartbeat_grace: float = HEARTBEAT_GRACE,
+    ):
         super().__init__(include_in_schema=False)
-        self.active_connections: list[WebSocket] = []
-        self.pending_jobs: dict[str, WebSocket] = {}
-        self.inverse_jobs: defaultdict[WebSocket, List[str]] = defaultdict(list)
-        self.heartbeat_check = {}
-        self.pubsub_task = None
+        self.events = events or job_event_hub
+        self.active_connections: dict[WebSocket, _Connection] = {}
+        self.subscriptions: defaultdict[WebSocket, dict[str, asyncio.Task]] = (
+            defaultdict(dict)
+        )
+
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_grace = heartbeat_grace
+        self.wheel: list[set[WebSocket]] = [set() for _ in range(self.HEARTBEAT_SLOTS)]
+        self.slot = 0
+        self.heartbeat_task: Optional[asyncio.Task] = None
+        # pings and disconnects in flight, so a stalled socket can't hold up a sweep.
+        self.pending: set[asyncio.Task] = set()
 
         self.add_websocket_route("/ws", self.websocket)
 
@@ -38,47 +84,17 @@ class WebsocketRouter(APIRouter):
                 raw_message = await websocket.receive_text()
                 message = str(raw_message).strip()
                 if message.startswith("subscribe:"):
-                    job_id = message.split(":")[1]
+                    _, job_id, *offset = message.split(":")
                     logfire.info(f"WS subscribed to job {job_id}")
-                    self.assign_job(job_id, websocket)
+                    await self.assign_job(job_id, websocket, *offset[:1])
                 elif message == "PONG":
-                    self.heartbeat_check[websocket] = False
+                    self.pong(websocket)
         except WebSocketDisconnect:
             await self.disconnect(websocket)
         except WebSocketException as e:
             logfire.error(f"WebSocket error: {e}")
             await websocket.close(code=4001)
 
-    async def listen_to_pubsub(self):
-        """
-        Continuously listen to Redis pub/sub and send messages to WebSocket clients.
-        """
-        pubsub = redis_client.pubsub()
-        await pubsub.subscribe("evals")
-        try:
-            while True:
-                message = await pubsub.get_message(
-                    ignore_subscribe_messages=True, timeout=1
-                )
-                if message and message["type"] == "message":
-                    data = json.loads(message["data"])
-                    job_id = data["job_id"]
-                    logfire.info(f"event received for job {job_id}")
-
-                    websocket = self.pending_jobs.get(job_id)
-                    if websocket:
-                        await self.send_personal_message(data, websocket)
-        except asyncio.CancelledError:
-            await pubsub.unsubscribe("evals")
-            await pubsub.close()
-        except Exception as e:
-            logfire.error(f"Error in Pub/Sub listener: {e}")
-
-    def stop_pubsub_task(self):
-        """Stop the background Pub/Sub listener."""
-        if self.pubsub_task:
-            self.pubsub_task.cancel()
-
     async def require_auth(self, websocket: WebSocket):
         signature = websocket.query_params.get("signature")
         timestamp = websocket.query_params.get("timestamp")
@@ -96,30 +112,53 @@ class WebsocketRouter(APIRouter):
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        # the slot just swept, so its first heartbeat is a full interval away.
+        self.active_connections[websocket] = _Connection(slot=self.slot)
+        self.wheel[self.slot].add(websocket)
         logfire.info(
             "New WS connection, current connection count:"
             f" {len(self.active_connections)}"
         )
-        self.heartbeat_check[websocket] = False
-        asyncio.create_task(self.heartbeat(websocket))
-        if len(self.active_connections) == 1:
-            self.pubsub_task = asyncio.create_task(self.listen_to_pubsub())
+        if self.heartbeat_task is None or self.heartbeat_task.done():
+            self.heartbeat_task = asyncio.create_task(self.heartbeat())
         metrics_ws_active.set(len(self.active_connections))
 
-    def assign_job(self, job_id: str, websocket: WebSocket):
-        self.pending_jobs[job_id] = websocket
-        self.inverse_jobs[websocket].append(job_id)
+    async def relay(self, job_id: str, websocket: WebSocket, after: str):
+        try:
+            async with aclosing(self.events.subscribe(job_id, after=after)) as events:
+                async for event in events:
+                    await self.send_personal_message(event, websocket)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logfire.warning(f"failed to relay event to WS: {e}")
+
+    async def assign_job(self, job_id: str, websocket: WebSocket, after: str = "0"):
+        if job_id in self.subscriptions[websocket]:
+            return
+
+        try:
+            stream_position(after)
+        except ValueError:
+            after = "0"
+
+        self.subscriptions[websocket][job_id] = asyncio.create_task(
+            self.relay(job_id, websocket, after)
+        )
+
+    async def unassign_job(self, job_id: str, websocket: WebSocket):
+        task = self.subscriptions[websocket].pop(job_id, None)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
 
     async def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        for job_id in self.inverse_jobs[websocket]:
-            self.pending_jobs.pop(job_id, None)
-        self.inverse_jobs.pop(websocket, None)
-        self.heartbeat_check.pop(websocket, None)
-        if not self.active_connections:
-            self.stop_pubsub_task()
+        connection = self.active_connections.pop(websocket, None)
+        if connection is not None:
+            self.wheel[connection.slot].discard(websocket)
+        for job_id in list(self.subscriptions.get(websocket, ())):
+            await self.unassign_job(job_id, websocket)
+        self.subscriptions.pop(websocket, None)
         if websocket.client_state.name != "DISCONNECTED":
             await websocket.close()
         metrics_ws_active.set(len(self.active_connections))
@@ -127,19 +166,40 @@ class WebsocketRouter(APIRouter):
     async def send_personal_message(self, data: str, websocket: WebSocket):
         await websocket.send_json(data)
 
-    async def heartbeat(self, websocket: WebSocket):
-        while websocket in self.active_connections:
-            await asyncio.sleep(self.HEARTBEAT_INTERVAL)
-            try:
-                if websocket.client_state.name == "DISCONNECTED":
-                    return
-                await self.send_personal_message({"type": "heartbeat"}, websocket)
-                self.heartbeat_check[websocket] = True
-
-                await asyncio.sleep(1)
-                if self.heartbeat_check.get(websocket, False):
-                    await self.disconnect(websocket)
-                    break
-            except Exception:
-                await self.disconnect(websocket)
-                break
+    def pong(self, websocket: WebSocket):
+        connection = self.active_connections.get(websocket)
+        if connection is None or connection.pinged_at is None:
+            return
+        metrics_ws_ping_rtt.record(time.monotonic() - connection.pinged_at)
+        connection.pinged_at = None
+
+    def spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    async def ping(self, websocket: WebSocket):
+        try:
+            await self.send_personal_message({"type": "heartbeat"}, websocket)
+        except Exception:
+            await self.disconnect(websocket)
+
+    async def heartbeat(self):
+        """Sweep one slot of the wheel per tick, until no sockets are left"""
+        tick = self.heartbeat_interval / len(self.wheel)
+        while self.active_connections:
+            await asyncio.sleep(tick)
+            self.slot = (self.slot + 1) % len(self.wheel)
+            if self.slot == 0:
+                metrics_ws_connections.record(len(self.active_connections))
+
+            now = time.monotonic()
+            for websocket in list(self.wheel[self.slot]):
+                connection = self.active_connections[websocket]
+                if connection.pinged_at is None:
+                    connection.pinged_at = now
+                    self.spawn(self.ping(websocket))
+                elif now - connection.pinged_at > self.heartbeat_grace:
+                    logfire.info("WS heartbeat went unanswered, disconnecting")
+                    metrics_ws_dropped.add(1)
+                    self.spawn(self.disconnect(websocket))
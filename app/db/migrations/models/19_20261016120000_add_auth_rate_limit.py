@@ -0,0 +1,12 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "auth" ADD "rate_limit" INT;
+        COMMENT ON COLUMN "auth"."rate_limit" IS 'requests per minute, falls back to the global limit if null';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "auth" DROP COLUMN "rate_limit";"""
@@ -0,0 +1,14 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "audit" ADD "result_key" VARCHAR(64);
+        COMMENT ON COLUMN "audit"."result_key" IS 'hash of the code, audit type, and prompts that produced the result';
+        CREATE INDEX IF NOT EXISTS "idx_audit_result__5b1f0e" ON "audit" ("result_key");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX IF EXISTS "idx_audit_result__5b1f0e";
+        ALTER TABLE "audit" DROP COLUMN "result_key";"""
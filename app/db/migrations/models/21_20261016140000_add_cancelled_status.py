@@ -0,0 +1,13 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        COMMENT ON COLUMN "audit"."status" IS 'WAITING: waiting\nPROCESSING: processing\nSUCCESS: success\nFAILED: failed\nCANCELLED: cancelled';
+        COMMENT ON COLUMN "intermediate_response"."status" IS 'WAITING: waiting\nPROCESSING: processing\nSUCCESS: success\nFAILED: failed\nCANCELLED: cancelled';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        COMMENT ON COLUMN "audit"."status" IS 'WAITING: waiting\nPROCESSING: processing\nSUCCESS: success\nFAILED: failed';
+        COMMENT ON COLUMN "intermediate_response"."status" IS 'WAITING: waiting\nPROCESSING: processing\nSUCCESS: success\nFAILED: failed';"""
@@ -0,0 +1,14 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "intermediate_response" ADD "batch_id" VARCHAR(255);
+        COMMENT ON COLUMN "intermediate_response"."batch_id" IS 'OpenAI batch the step was submitted in, for batch priority audits';
+        CREATE INDEX IF NOT EXISTS "idx_intermediat_batch_i_2c7d41" ON "intermediate_response" ("batch_id");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX IF EXISTS "idx_intermediat_batch_i_2c7d41";
+        ALTER TABLE "intermediate_response" DROP COLUMN "batch_id";"""
@@ -0,0 +1,21 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "indexer_cursor" (
+    "id" UUID NOT NULL PRIMARY KEY,
+    "created_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "updated_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "network" VARCHAR(12) NOT NULL UNIQUE,
+    "block_number" BIGINT NOT NULL
+);
+COMMENT ON COLUMN "indexer_cursor"."network" IS 'ETH: eth\nBSC: bsc\nPOLYGON: polygon\nBASE: base\nAVAX: avax\nMODE: mode\nARB: arb\nETH_SEPOLIA: eth_sepolia\nBSC_TEST: bsc_test\nPOLYGON_AMOY: polygon_amoy\nBASE_SEPOLIA: base_sepolia\nAVAX_FUJI: avax_fuji\nMODE_TESTNET: mode_testnet\nARB_SEPOLIA: arb_sepolia';
+COMMENT ON COLUMN "indexer_cursor"."block_number" IS 'last block whose deployments were indexed';
+        CREATE INDEX IF NOT EXISTS "idx_contract_network_eaef76" ON "contract" ("network", "address");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX IF EXISTS "idx_contract_network_eaef76";
+        DROP TABLE IF EXISTS "indexer_cursor";"""
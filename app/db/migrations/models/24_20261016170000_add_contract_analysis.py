@@ -0,0 +1,22 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "contract_analysis" (
+    "id" UUID NOT NULL PRIMARY KEY,
+    "created_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "updated_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "hashed_code" VARCHAR(255) NOT NULL UNIQUE,
+    "version" VARCHAR(20) NOT NULL,
+    "ast" BYTEA,
+    "result" JSONB
+);
+COMMENT ON COLUMN "contract_analysis"."version" IS 'version of the analyzer that produced the result';
+COMMENT ON COLUMN "contract_analysis"."ast" IS 'zlib compressed JSON of the solidity AST';
+COMMENT ON COLUMN "contract_analysis"."result" IS 'static analysis result, null if unparsable';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "contract_analysis";"""
@@ -0,0 +1,20 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE INDEX IF NOT EXISTS "idx_audit_app_id_88462a" ON "audit" ("app_id", "created_at", "id");
+        CREATE INDEX IF NOT EXISTS "idx_audit_user_id_f69cd4" ON "audit" ("user_id", "created_at", "id");
+        CREATE INDEX IF NOT EXISTS "idx_audit_created_c27cd0" ON "audit" ("created_at", "id");
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS "idx_contract_address_trgm" ON "contract" USING GIN (UPPER(CAST("address" AS VARCHAR)) gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS "idx_user_address_trgm" ON "user" USING GIN (UPPER(CAST("address" AS VARCHAR)) gin_trgm_ops);"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX IF EXISTS "idx_user_address_trgm";
+        DROP INDEX IF EXISTS "idx_contract_address_trgm";
+        DROP INDEX IF EXISTS "idx_audit_created_c27cd0";
+        DROP INDEX IF EXISTS "idx_audit_user_id_f69cd4";
+        DROP INDEX IF EXISTS "idx_audit_app_id_88462a";"""
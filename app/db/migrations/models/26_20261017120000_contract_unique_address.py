@@ -0,0 +1,25 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TEMPORARY TABLE "contract_duplicate" AS
+    SELECT "id", FIRST_VALUE("id") OVER (
+        PARTITION BY "network", "address"
+        ORDER BY "is_available" DESC, "code" IS NULL, "created_at" DESC
+    ) AS "keep_id"
+    FROM "contract"
+    WHERE "network" IS NOT NULL AND "address" IS NOT NULL;
+UPDATE "audit" SET "contract_id" = d."keep_id" FROM "contract_duplicate" d
+    WHERE "audit"."contract_id" = d."id" AND d."id" <> d."keep_id";
+DELETE FROM "contract" USING "contract_duplicate" d
+    WHERE "contract"."id" = d."id" AND d."id" <> d."keep_id";
+DROP TABLE "contract_duplicate";
+        DROP INDEX IF EXISTS "idx_contract_network_eaef76";
+        CREATE UNIQUE INDEX IF NOT EXISTS "uid_contract_network_eaef76" ON "contract" ("network", "address");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX IF EXISTS "uid_contract_network_eaef76";
+        CREATE INDEX IF NOT EXISTS "idx_contract_network_eaef76" ON "contract" ("network", "address");"""
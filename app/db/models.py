@@ -83,6 +83,11 @@ class Auth(AbstractModel):
     revoked_at = fields.DatetimeField(null=True, default=None)
     scope = fields.CharEnumField(enum_type=AuthScopeEnum, default=AuthScopeEnum.WRITE)
     consumes_credits = fields.BooleanField(default=True)
+    rate_limit = fields.IntField(
+        null=True,
+        default=None,
+        description="requests per minute, falls back to the global limit if null",
+    )
 
     class Meta:
         table = "auth"
@@ -144,6 +149,7 @@ class Contract(AbstractModel):
 
     class Meta:
         table = "contract"
+        unique_together = (("network", "address"),)
 
     def __str__(self):
         return f"{str(self.id)} | {self.address}"
@@ -162,6 +168,38 @@ class Contract(AbstractModel):
         await super().save(*args, **kwargs)
 
 
+class ContractAnalysis(AbstractModel):
+    hashed_code = fields.CharField(max_length=255, unique=True)
+    version = fields.CharField(
+        max_length=20, description="version of the analyzer that produced the result"
+    )
+    ast = fields.BinaryField(
+        null=True, description="zlib compressed JSON of the solidity AST"
+    )
+    result = fields.JSONField(
+        null=True, description="static analysis result, null if unparsable"
+    )
+
+    class Meta:
+        table = "contract_analysis"
+
+    def __str__(self):
+        return f"{self.hashed_code} | v{self.version}"
+
+
+class IndexerCursor(AbstractModel):
+    network = fields.CharEnumField(enum_type=NetworkEnum, unique=True)
+    block_number = fields.BigIntField(
+        description="last block whose deployments were indexed"
+    )
+
+    class Meta:
+        table = "indexer_cursor"
+
+    def __str__(self):
+        return f"{self.network} | {self.block_number}"
+
+
 class Audit(AbstractModel):
     app: fields.ForeignKeyNullableRelation[App] = fields.ForeignKeyField(
         "models.App", on_delete=fields.SET_NULL, null=True, related_name="audits"
@@ -183,6 +221,12 @@ class Audit(AbstractModel):
     input_tokens = fields.IntField(null=True, default=0)
     output_tokens = fields.IntField(null=True, default=0)
     processing_time_seconds = fields.IntField(null=True, default=None)
+    result_key = fields.CharField(
+        max_length=64,
+        null=True,
+        default=None,
+        description="hash of the code, audit type, and prompts that produced the result",
+    )
 
     intermediate_responses: fields.ReverseRelation["IntermediateResponse"]
     findings: fields.ReverseRelation["Finding"]
@@ -194,6 +238,11 @@ class Audit(AbstractModel):
             ("user_id", "audit_type", "contract_id"),
             ("user_id", "audit_type"),
             ("audit_type", "contract_id"),
+            ("result_key",),
+            # keyset pagination of audit listings, by app, user, or overall.
+            ("app_id", "created_at", "id"),
+            ("user_id", "created_at", "id"),
+            ("created_at", "id"),
         )
 
     def __str__(self):
@@ -216,9 +265,16 @@ class IntermediateResponse(AbstractModel):
         null=True,
         related_name="intermediate_responses",
     )
+    batch_id = fields.CharField(
+        max_length=255,
+        null=True,
+        default=None,
+        description="OpenAI batch the step was submitted in, for batch priority audits",
+    )
 
     class Meta:
         table = "intermediate_response"
+        indexes = (("batch_id",),)
 
     def __str__(self):
         return f"{str(self.id)} | {self.audit_id}"
@@ -0,0 +1,145 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+import logfire
+from redis.asyncio import Redis
+
+from app.config import redis_client
+from app.metrics import metrics_cache_requests
+
+
+class LocalCache:
+    """
+    Bounded, in-process LRU cache with a per-entry TTL. Entries are not shared
+    across processes, so keep the TTL short for anything that can be invalidated
+    from elsewhere.
+    """
+
+    def __init__(self, maxsize: int = 1_024, ttl: float = 10):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._data.pop(key, None)
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+class TieredCache:
+    """
+    JSON cache with a LocalCache in front of redis.
+
+    Redis is treated as best-effort: any failure is logged and behaves like a miss,
+    and further redis calls are skipped for `REDIS_BACKOFF_SECONDS` so an outage
+    doesn't add a connection attempt to every lookup.
+    """
+
+    REDIS_BACKOFF_SECONDS = 5
+
+    def __init__(
+        self,
+        namespace: str,
+        local_ttl: float = 10,
+        redis_ttl: int = 300,
+        maxsize: int = 1_024,
+        redis: Optional[Redis] = None,
+    ):
+        self.namespace = namespace
+        self.local = LocalCache(maxsize=maxsize, ttl=local_ttl)
+        self.redis_ttl = redis_ttl
+        self.redis = redis if redis is not None else redis_client
+        self._redis_retry_at = 0.0
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}|{key}"
+
+    def _redis_available(self) -> bool:
+        return time.monotonic() >= self._redis_retry_at
+
+    def _redis_failed(self, err: Exception) -> None:
+        logfire.warning(f"{self.namespace} cache unavailable: {err}")
+        self._redis_retry_at = time.monotonic() + self.REDIS_BACKOFF_SECONDS
+
+    def _observe(self, result: str) -> None:
+        metrics_cache_requests.add(
+            1, attributes={"cache.namespace": self.namespace, "cache.result": result}
+        )
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = self.local.get(key)
+        if value is not None:
+            self._observe("local")
+            return value
+
+        if not self._redis_available():
+            self._observe("miss")
+            return None
+
+        try:
+            raw = await self.redis.get(self._key(key))
+        except Exception as err:
+            self._redis_failed(err)
+            self._observe("miss")
+            return None
+
+        if raw is None:
+            self._observe("miss")
+            return None
+
+        value = json.loads(raw)
+        self.local.set(key, value)
+        self._observe("redis")
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        """`ttl` overrides the redis TTL, and caps the local one"""
+        local_ttl = self.local.ttl if ttl is None else min(self.local.ttl, ttl)
+        self.local.set(key, value, ttl=local_ttl)
+
+        if not self._redis_available():
+            return
+
+        try:
+            await self.redis.set(
+                self._key(key), json.dumps(value), ex=ttl or self.redis_ttl
+            )
+        except Exception as err:
+            self._redis_failed(err)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self.local.delete(key)
+
+        # always attempt deletes, a stale entry in redis outlives the local one.
+        try:
+            await self.redis.delete(*[self._key(key) for key in keys])
+        except Exception as err:
+            self._redis_failed(err)
@@ -1,5 +1,13 @@
-from .explorer import ExplorerClient
+from .explorer import ExplorerClient, explorer_pool
 from .llm import llm_client
-from .web3 import Web3Client
+from .queue import queue_client
+from .web3 import Web3Client, web3_registry
 
-__all__ = ["ExplorerClient", "llm_client", "Web3Client"]
+__all__ = [
+    "ExplorerClient",
+    "explorer_pool",
+    "llm_client",
+    "queue_client",
+    "Web3Client",
+    "web3_registry",
+]
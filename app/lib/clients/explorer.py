@@ -1,7 +1,13 @@
-from urllib.parse import urlencode
+import asyncio
+import os
+import random
+import time
+from typing import Optional
 
 import httpx
+import logfire
 
+from app.metrics import metrics_explorer_errors, metrics_explorer_latency
 from app.utils.mappers import (
     network_chainid_mapper,
     network_explorer_apikey_mapper,
@@ -9,9 +15,174 @@ from app.utils.mappers import (
     networks_by_type,
 )
 from app.utils.types.enums import NetworkEnum, NetworkTypeEnum
+from app.utils.types.errors import ExplorerError
+
+
+class TokenBucket:
+    """
+    Paces calls to `rate` per second, allowing bursts of up to `capacity`.
+    Callers reserve a token up front and sleep off any debt, so waiters are
+    admitted in the order they arrived.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Take a token, returning the seconds to wait before using it"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+
+        return max(0.0, -self.tokens / self.rate)
+
+    async def acquire(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class ExplorerPool:
+    """
+    Long-lived HTTP/2 clients, one per explorer host, shared by every caller in
+    the process.
+
+    Requests are paced by a token bucket per API key, as etherscan-family APIs
+    limit each key to ~5 requests per second. Rate limits are often reported as
+    a 200 with a "NOTOK" payload, so bodies are inspected as well as status codes.
+    Rate limits, server errors and transport errors are retried with jittered
+    backoff, anything else raises `ExplorerError` straight away.
+    """
+
+    REQUESTS_PER_SECOND = float(os.getenv("EXPLORER_REQUESTS_PER_SECOND", 5))
+    MAX_RETRIES = 3
+    BACKOFF_SECONDS = 0.5
+    MAX_BACKOFF_SECONDS = 8
+    TIMEOUT_SECONDS = 15
+    RETRYABLE = ["rate_limited", "server_error", "transport_error"]
+
+    def __init__(
+        self,
+        requests_per_second: float = REQUESTS_PER_SECOND,
+        max_retries: int = MAX_RETRIES,
+        backoff_seconds: float = BACKOFF_SECONDS,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.requests_per_second = requests_per_second
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.transport = transport
+
+        self._clients: dict[str, httpx.AsyncClient] = {}
+        self._buckets: dict[str, TokenBucket] = {}
+
+    def _client(self, host: str) -> httpx.AsyncClient:
+        client = self._clients.get(host)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                http2=True,
+                timeout=self.TIMEOUT_SECONDS,
+                transport=self.transport,
+            )
+            self._clients[host] = client
+        return client
+
+    def _bucket(self, key: str) -> TokenBucket:
+        if key not in self._buckets:
+            self._buckets[key] = TokenBucket(rate=self.requests_per_second)
+        return self._buckets[key]
+
+    def _backoff(self, attempt: int) -> float:
+        # "full jitter", so concurrent callers that were limited together don't
+        # all come back at the same moment.
+        ceiling = min(self.MAX_BACKOFF_SECONDS, self.backoff_seconds * 2**attempt)
+        return random.uniform(0, ceiling)
+
+    def _failure(self, response: httpx.Response) -> Optional[tuple[str, str]]:
+        """The reason and detail if the response is an error, otherwise None"""
+        if response.status_code == 429:
+            return "rate_limited", response.text[:200]
+        if response.status_code >= 500:
+            return "server_error", str(response.status_code)
+        if response.status_code >= 400:
+            return "http_error", str(response.status_code)
+
+        try:
+            data = response.json()
+        except ValueError:
+            return "invalid_response", response.text[:200]
+
+        # status "0" is also used for legitimate empty answers, ie "No records
+        # found", only treat NOTOK as an error.
+        if not isinstance(data, dict) or data.get("status") != "0":
+            return None
+
+        result = str(data.get("result", ""))
+        if "rate limit" in result.lower():
+            return "rate_limited", result
+        if str(data.get("message", "")).startswith("NOTOK"):
+            return "notok", result
+        return None
+
+    async def get(self, url: str, params: dict) -> httpx.Response:
+        host = httpx.URL(url).host
+        client = self._client(host)
+        bucket = self._bucket(params.get("apikey") or host)
+
+        attempt = 0
+        while True:
+            await bucket.acquire()
+
+            started = time.monotonic()
+            try:
+                response = await client.get(url, params=params)
+                failure = self._failure(response)
+            except httpx.TransportError as err:
+                failure = "transport_error", repr(err)
+
+            attributes = {"explorer.host": host}
+            metrics_explorer_latency.record(
+                time.monotonic() - started,
+                attributes={
+                    **attributes,
+                    "explorer.outcome": failure[0] if failure else "ok",
+                },
+            )
+
+            if failure is None:
+                return response
+
+            reason, detail = failure
+            metrics_explorer_errors.add(
+                1, attributes={**attributes, "explorer.reason": reason}
+            )
+
+            if reason not in self.RETRYABLE or attempt >= self.max_retries:
+                raise ExplorerError(host=host, reason=reason, detail=detail)
+
+            wait = self._backoff(attempt)
+            logfire.warning(f"{host} {reason}, retrying in {wait:.2f}s")
+            await asyncio.sleep(wait)
+            attempt += 1
+
+    async def close(self) -> None:
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
+
+
+explorer_pool = ExplorerPool()
 
 
 class ExplorerClient:
+    def __init__(self, pool: Optional[ExplorerPool] = None):
+        self.pool = pool or explorer_pool
+
     def _get_base_url(self, network: NetworkEnum) -> str:
         platform_route = network_explorer_mapper[network]
         chain_id = network_chainid_mapper[network]
@@ -27,35 +198,25 @@ class ExplorerClient:
 
         return url
 
+    async def _get(self, network: NetworkEnum, params: dict) -> httpx.Response:
+        params = {**params, "apikey": network_explorer_apikey_mapper[network]}
+        return await self.pool.get(self._get_base_url(network=network), params)
+
     async def get_source_code(
-        self, client: httpx.AsyncClient, network: NetworkEnum, address: str
+        self, network: NetworkEnum, address: str
     ) -> httpx.Response:
-        api_key = network_explorer_apikey_mapper[network]
-
         params = {
             "module": "contract",
             "action": "getsourcecode",
             "address": address,
-            "apikey": api_key,
         }
 
-        url = self._get_base_url(network=network)
-        params_encoded = urlencode(params)
-
-        return await client.get(f"{url}?{params_encoded}")
-
-    async def get_gas(
-        self, client: httpx.AsyncClient, network: NetworkEnum
-    ) -> httpx.Response:
-        api_key = network_explorer_apikey_mapper[network]
+        return await self._get(network=network, params=params)
 
+    async def get_gas(self, network: NetworkEnum) -> httpx.Response:
         params = {
             "module": "gastracker",
             "action": "gasoracle",
-            "apikey": api_key,
         }
 
-        url = self._get_base_url(network=network)
-        params_encoded = urlencode(params)
-
-        return await client.get(f"{url}?${params_encoded}")
+        return await self._get(network=network, params=params)
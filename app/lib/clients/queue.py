@@ -0,0 +1,76 @@
+import asyncio
+import dataclasses
+import os
+from typing import Any, Optional
+
+import logfire
+from arq import ArqRedis, create_pool
+from arq.jobs import Job
+
+from app.config import redis_settings
+from app.metrics import metrics_queue_pool
+
+
+class QueueClient:
+    """
+    Process-wide arq pool used for enqueueing jobs from the API.
+
+    Connected in the app lifespan and closed on shutdown. If a caller enqueues
+    before the lifespan ran (ie tests, scripts), the pool is created lazily.
+    """
+
+    def __init__(self, max_connections: Optional[int] = None):
+        self.settings = dataclasses.replace(
+            redis_settings,
+            max_connections=max_connections
+            or int(os.getenv("REDIS_MAX_CONNECTIONS", 20)),
+        )
+        self._pool: Optional[ArqRedis] = None
+        self._lock = asyncio.Lock()
+
+    async def connect(self) -> ArqRedis:
+        if self._pool is not None:
+            return self._pool
+
+        async with self._lock:
+            if self._pool is None:
+                self._pool = await create_pool(self.settings)
+                self._observe()
+
+        return self._pool
+
+    async def close(self) -> None:
+        if self._pool is None:
+            return
+
+        pool = self._pool
+        self._pool = None
+        # lifespan shutdown runs after requests stop, so nothing is mid-enqueue.
+        await pool.aclose()
+        metrics_queue_pool.set(0, attributes={"pool.state": "in_use"})
+        metrics_queue_pool.set(0, attributes={"pool.state": "available"})
+
+    async def enqueue_job(self, function: str, *args: Any, **kwargs: Any) -> Job:
+        pool = await self.connect()
+        job = await pool.enqueue_job(function, *args, **kwargs)
+        self._observe()
+
+        if job is None:
+            # arq returns None if a job with this _job_id already exists.
+            logfire.warning(f"job {kwargs.get('_job_id')} was already enqueued")
+
+        return job
+
+    def _observe(self) -> None:
+        if self._pool is None:
+            return
+
+        connection_pool = self._pool.connection_pool
+        in_use = len(getattr(connection_pool, "_in_use_connections", []))
+        available = len(getattr(connection_pool, "_available_connections", []))
+
+        metrics_queue_pool.set(in_use, attributes={"pool.state": "in_use"})
+        metrics_queue_pool.set(available, attributes={"pool.state": "available"})
+
+
+queue_client = QueueClient()
@@ -1,24 +1,184 @@
+import asyncio
 import os
+from typing import Any, Optional
 
-import logfire
 from eth_typing import BlockNumber
-from web3 import AsyncWeb3
-from web3.types import BlockReceipts
+from web3 import AsyncHTTPProvider, AsyncWeb3
+from web3.contract import AsyncContract
+from web3.exceptions import Web3ValueError
+from web3.types import BlockReceipts, RPCEndpoint, RPCResponse
 
 from app.utils.mappers import network_rpc_mapper
 from app.utils.types.enums import NetworkEnum
 
 
+class BatchingHTTPProvider(AsyncHTTPProvider):
+    """
+    Coalesces JSON-RPC calls made within `window` seconds of each other into a
+    single batched POST, and hands each caller back its own response, or error.
+    A lone call is sent as a plain request.
+
+    This is the only batching on the provider. web3's `batch_requests()` flags
+    the whole provider, so on one shared by every client on a network it would
+    hand other callers batch entries instead of results. It's refused, make the
+    calls concurrently instead.
+    """
+
+    WINDOW_SECONDS = 0.005
+    MAX_BATCH_SIZE = 50
+
+    def __init__(
+        self,
+        endpoint_uri: Optional[str] = None,
+        window: float = WINDOW_SECONDS,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        **kwargs: Any,
+    ):
+        super().__init__(endpoint_uri, **kwargs)
+        self.window = window
+        self.max_batch_size = max_batch_size
+
+        self._pending: list[tuple[RPCEndpoint, Any, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def _is_batching(self) -> bool:
+        return False
+
+    @_is_batching.setter
+    def _is_batching(self, value: bool) -> None:
+        if value:
+            raise Web3ValueError(
+                "explicit batches aren't supported on a shared provider, gather the "
+                "calls and they're batched automatically"
+            )
+
+    async def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((method, params, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        task = asyncio.create_task(self._send(pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, pending: list[tuple[RPCEndpoint, Any, asyncio.Future]]):
+        try:
+            if len(pending) == 1:
+                method, params, _ = pending[0]
+                responses = [await super().make_request(method, params)]
+            else:
+                responses = await self.make_batch_request(
+                    [(method, params) for method, params, _ in pending]
+                )
+                if not isinstance(responses, list):
+                    # the batch as a whole was rejected.
+                    responses = [responses] * len(pending)
+                if len(responses) != len(pending):
+                    raise ValueError(
+                        f"expected {len(pending)} responses, got {len(responses)}"
+                    )
+        except Exception as err:
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(err)
+            return
+
+        for (_, _, future), response in zip(pending, responses):
+            # callers may have been cancelled while waiting.
+            if not future.done():
+                future.set_result(response)
+
+
+# the credits contract deployed in each environment.
+CREDITS_CONTRACTS = {
+    "production": "0x1bdEEe6376572F1CAE454dC68a936Af56A803e96",
+    "staging": "0xbc14A36c59154971A8Eb431031729Af39f97eEd1",
+    "development": "0xe7f1725e7734ce288f8367e1bb143e90bb3f0512",
+}
+
+CREDITS_ABI = [
+    {
+        "inputs": [{"type": "address"}],
+        "name": "apiCredits",
+        "outputs": [{"type": "uint256"}],
+        "stateMutability": "view",
+        "type": "function",
+    }
+]
+
+
+class Web3Registry:
+    """
+    Process-wide AsyncWeb3 instances, one per RPC endpoint, so every client on a
+    network shares a warm session and request batches. Contract objects are only
+    built once per endpoint and address.
+    """
+
+    def __init__(self):
+        self._web3: dict[str, AsyncWeb3] = {}
+        self._contracts: dict[tuple[str, str], AsyncContract] = {}
+
+    def get(self, url: str) -> AsyncWeb3:
+        if url not in self._web3:
+            self._web3[url] = AsyncWeb3(BatchingHTTPProvider(url))
+        return self._web3[url]
+
+    def contract(self, url: str, address: str, abi: list[dict]) -> AsyncContract:
+        key = (url, address)
+        if key not in self._contracts:
+            self._contracts[key] = self.get(url).eth.contract(address=address, abi=abi)
+        return self._contracts[key]
+
+    async def close(self) -> None:
+        web3s = list(self._web3.values())
+        self._web3.clear()
+        self._contracts.clear()
+        for web3 in web3s:
+            await web3.provider.disconnect()
+
+
+web3_registry = Web3Registry()
+
+
 class Web3Client:
-    def __init__(self, network: NetworkEnum):
-        self.provider = self._get_provider(network=network)
+    # the network each environment's credits contract is deployed to.
+    DEPLOYMENT_NETWORKS = {
+        "production": NetworkEnum.BASE,
+        "staging": NetworkEnum.ETH_SEPOLIA,
+    }
+
+    def __init__(self, network: NetworkEnum, url: Optional[str] = None):
+        self.network = network
+        self.url = url or self._get_base_url(network)
+        self.provider = web3_registry.get(self.url)
         self.ENV = os.getenv("RAILWAY_ENVIRONMENT_NAME", "development")
 
     @classmethod
     def from_deployment(cls) -> "Web3Client":
-        instance = cls(network=NetworkEnum.ETH)  # Default network, will be overridden
-        instance.provider = instance.get_deployed_provider()
-        return instance
+        env = os.getenv("RAILWAY_ENVIRONMENT_NAME", "development")
+        if env == "development":
+            url = os.getenv("LOCAL_BLOCKCHAIN_URL", "http://localhost:8545")
+            return cls(network=NetworkEnum.ETH, url=url)
+
+        return cls(network=cls.DEPLOYMENT_NETWORKS[env])
 
     def _get_base_url(self, network: NetworkEnum) -> str:
         rpc_url = network_rpc_mapper[network]
@@ -27,22 +187,6 @@ class Web3Client:
 
         return url
 
-    def _get_provider(self, network: NetworkEnum) -> AsyncWeb3:
-        url = self._get_base_url(network)
-
-        return AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(url))
-
-    def get_deployed_provider(self) -> AsyncWeb3:
-        url_mappper = {
-            "production": self._get_base_url(NetworkEnum.BASE),
-            "staging": self._get_base_url(NetworkEnum.ETH_SEPOLIA),
-            "development": os.getenv("LOCAL_BLOCKCHAIN_URL"),
-        }
-
-        url = url_mappper[self.ENV]
-
-        return AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(url))
-
     async def get_block_number(self) -> BlockNumber:
         block = await self.provider.eth.get_block_number()
         return block
@@ -51,32 +195,38 @@ class Web3Client:
         receipts = await self.provider.eth.get_block_receipts(block)
         return receipts
 
-    async def get_user_credits(self, user_address: str) -> int:
-        contract_mapper = {
-            "production": "0x1bdEEe6376572F1CAE454dC68a936Af56A803e96",
-            "staging": "0xbc14A36c59154971A8Eb431031729Af39f97eEd1",
-            "development": "0xe7f1725e7734ce288f8367e1bb143e90bb3f0512",
-        }
-
-        abi = [
-            {
-                "inputs": [{"type": "address"}],
-                "name": "apiCredits",
-                "outputs": [{"type": "uint256"}],
-                "stateMutability": "view",
-                "type": "function",
-            }
-        ]
-
-        contract_address = self.provider.to_checksum_address(contract_mapper[self.ENV])
-        user_addres = self.provider.to_checksum_address(user_address)
-
-        try:
-            contract = self.provider.eth.contract(address=contract_address, abi=abi)
-            raw_credits = await contract.functions.apiCredits(user_addres).call()
-            credits = raw_credits / 10**18
-            return credits
-        except Exception:
-            # most likely in development, if not running anvil + connected to ngrok
-            logfire.warning("unable to query contract")
-            return 0
+    async def get_blocks_receipts(
+        self, blocks: list[BlockNumber]
+    ) -> list[BlockReceipts]:
+        """
+        Receipts for each block. The calls are made together, so the provider sends
+        them as a single batched JSON-RPC request.
+        """
+        receipts = await asyncio.gather(
+            *[self.provider.eth.get_block_receipts(block) for block in blocks]
+        )
+        return list(receipts)
+
+    async def get_code_exists(self, addresses: list[str]) -> dict[str, bool]:
+        """
+        Whether each address has deployed bytecode. The calls are made together,
+        so the provider sends them as a single batched JSON-RPC request.
+        """
+        codes = await asyncio.gather(
+            *[
+                self.provider.eth.get_code(self.provider.to_checksum_address(address))
+                for address in addresses
+            ]
+        )
+
+        return {address: len(code) > 0 for address, code in zip(addresses, codes)}
+
+    async def get_user_credits(self, user_address: str) -> float:
+        contract_address = self.provider.to_checksum_address(
+            CREDITS_CONTRACTS[self.ENV]
+        )
+        contract = web3_registry.contract(self.url, contract_address, CREDITS_ABI)
+
+        user_address = self.provider.to_checksum_address(user_address)
+        raw_credits = await contract.functions.apiCredits(user_address).call()
+        return raw_credits / 10**18
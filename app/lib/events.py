@@ -0,0 +1,260 @@
+import asyncio
+import json
+import os
+from collections import defaultdict
+from typing import AsyncIterator, Optional
+
+import logfire
+from redis.asyncio import Redis
+
+from app.config import redis_client
+from app.metrics import metrics_events_jobs
+
+# each job publishes to its own channel, so an API replica only receives events
+# for the jobs its clients subscribed to.
+CHANNEL_PREFIX = "evals"
+
+# Appends an event to the job's capped stream and publishes it, with its stream
+# id, in one atomic call, so the log and live subscribers never disagree.
+#
+# KEYS[1] = stream key, KEYS[2] = channel
+# ARGV = maxlen, ttl (seconds), event (a non-empty JSON object)
+# returns the event's stream id.
+PUBLISH_SCRIPT = """
+local id = redis.call("XADD", KEYS[1], "MAXLEN", "~", ARGV[1], "*", "data", ARGV[3])
+redis.call("EXPIRE", KEYS[1], ARGV[2])
+redis.call("PUBLISH", KEYS[2], '{"id":"' .. id .. '",' .. string.sub(ARGV[3], 2))
+return id
+"""
+
+
+def job_channel(job_id: str) -> str:
+    return f"{CHANNEL_PREFIX}:{job_id}"
+
+
+def job_stream(job_id: str) -> str:
+    return f"{CHANNEL_PREFIX}:log:{job_id}"
+
+
+def stream_position(event_id: str) -> tuple[int, int]:
+    """Sortable form of a stream id, ie "1700000000000-1" -> (1700000000000, 1)"""
+    milliseconds, _, sequence = event_id.partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+
+class JobEventLog:
+    """
+    Pipeline events for each job, appended to a capped redis stream as well as
+    published live. Subscribers that arrive late, or reconnect, replay the stream
+    after the last event id they saw and then follow the live channel.
+
+    Every event carries its stream id as "id", which is the offset to resume from.
+    """
+
+    MAXLEN = int(os.getenv("JOB_EVENTS_MAXLEN", 5_000))
+    TTL_SECONDS = int(os.getenv("JOB_EVENTS_TTL_SECONDS", 24 * 60 * 60))
+
+    def __init__(
+        self,
+        redis: Optional[Redis] = None,
+        maxlen: int = MAXLEN,
+        ttl: int = TTL_SECONDS,
+    ):
+        self.redis = redis if redis is not None else redis_client
+        self.maxlen = maxlen
+        self.ttl = ttl
+        self.script = self.redis.register_script(PUBLISH_SCRIPT)
+
+    async def publish(self, job_id: str, message: dict) -> str:
+        event_id = await self.script(
+            keys=[job_stream(job_id), job_channel(job_id)],
+            args=[self.maxlen, self.ttl, json.dumps(message)],
+        )
+        return event_id.decode() if isinstance(event_id, bytes) else event_id
+
+    async def read(
+        self, job_id: str, after: str = "0", count: Optional[int] = None
+    ) -> list[dict]:
+        """Events logged after the `after` id, oldest first"""
+        response = await self.redis.xread(
+            {job_stream(job_id): after}, count=count or self.maxlen
+        )
+
+        events = []
+        for _, entries in response:
+            for event_id, fields in entries:
+                if isinstance(event_id, bytes):
+                    event_id = event_id.decode()
+                events.append({"id": event_id, **json.loads(fields[b"data"])})
+        return events
+
+
+job_event_log = JobEventLog()
+
+
+# put on a subscriber's queue in place of events it was too slow to take, it
+# catches up from the log instead.
+_RESYNC = object()
+
+
+class JobEventHub:
+    """
+    Live job events for any number of subscribers in the process, WebSockets and
+    SSE streams alike.
+
+    A single pub/sub connection is shared, subscribed to a job's channel while the
+    job has at least one subscriber, and its listener blocks on reads rather than
+    polling. Each subscriber has a bounded queue, so a slow one can't hold up the
+    others, if it fills up the subscriber re-reads the log from its last event.
+    """
+
+    QUEUE_SIZE = 1_000
+    RECONNECT_SECONDS = 1
+
+    def __init__(
+        self,
+        redis: Optional[Redis] = None,
+        queue_size: int = QUEUE_SIZE,
+    ):
+        self.redis = redis if redis is not None else redis_client
+        self.event_log = JobEventLog(redis=self.redis)
+        self.queue_size = queue_size
+        self.subscribers: defaultdict[str, set[asyncio.Queue]] = defaultdict(set)
+        self.pubsub = self.redis.pubsub()
+        # the pubsub connects lazily, concurrent first commands would each open one.
+        self._lock = asyncio.Lock()
+        self.listener: Optional[asyncio.Task] = None
+
+    def _observe(self) -> None:
+        metrics_events_jobs.set(len(self.subscribers))
+
+    def _deliver(self, event: dict) -> None:
+        job_id = event["job_id"]
+        # chunks of streamed output arrive several times a second.
+        if event.get("status") != "chunk":
+            logfire.info(f"event received for job {job_id}")
+
+        for queue in self.subscribers.get(job_id, ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._resync(queue)
+
+    def _resync(self, queue: asyncio.Queue) -> None:
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(_RESYNC)
+
+    async def _listen(self) -> None:
+        """Deliver messages from the subscribed job channels, until none are left"""
+        reconnect = False
+        while True:
+            try:
+                if reconnect:
+                    await self._reconnect()
+                    reconnect = False
+
+                async for message in self.pubsub.listen():
+                    if message["type"] == "message":
+                        self._deliver(json.loads(message["data"]))
+
+                if not self.subscribers:
+                    return
+                # a job's subscribe failed, or is still in flight.
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logfire.error(f"Error in Pub/Sub listener: {e}")
+                if not self.subscribers:
+                    return
+                reconnect = True
+
+            await asyncio.sleep(self.RECONNECT_SECONDS)
+            reconnect = reconnect or not self.pubsub.subscribed
+
+    async def _reconnect(self) -> None:
+        async with self._lock:
+            pubsub, self.pubsub = self.pubsub, self.redis.pubsub()
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+            if self.subscribers:
+                await self.pubsub.subscribe(*map(job_channel, self.subscribers))
+
+        # events published while disconnected are only in the log.
+        for queues in self.subscribers.values():
+            for queue in queues:
+                self._resync(queue)
+
+    async def subscribe(self, job_id: str, after: str = "0") -> AsyncIterator[dict]:
+        """
+        Events for the job after the `after` id, the logged backlog and then live
+        events as they're published, until the caller stops iterating. Close it
+        with `contextlib.aclosing` so the subscription is released.
+        """
+        last_position = stream_position(after)
+
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        first = job_id not in self.subscribers
+        self.subscribers[job_id].add(queue)
+        self._observe()
+
+        try:
+            if first:
+                try:
+                    async with self._lock:
+                        await self.pubsub.subscribe(job_channel(job_id))
+                except Exception as e:
+                    logfire.error(f"failed to subscribe to {job_id}: {e}")
+                # started once subscribed, the listener stops when it has no channels.
+                if self.listener is None or self.listener.done():
+                    self.listener = asyncio.create_task(self._listen())
+
+            # subscribed before reading the log, so no event falls between the two,
+            # events both logged and queued are only yielded once.
+            resync = True
+            while True:
+                if resync:
+                    resync = False
+                    try:
+                        events = await self.event_log.read(job_id, after=after)
+                    except Exception as e:
+                        logfire.warning(f"failed to replay events for {job_id}: {e}")
+                        events = []
+                else:
+                    event = await queue.get()
+                    if event is _RESYNC:
+                        resync = True
+                        continue
+                    events = [event]
+
+                for event in events:
+                    position = stream_position(event["id"])
+                    if position > last_position:
+                        after, last_position = event["id"], position
+                        yield event
+        finally:
+            queues = self.subscribers.get(job_id)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self.subscribers[job_id]
+                    try:
+                        async with self._lock:
+                            await self.pubsub.unsubscribe(job_channel(job_id))
+                    except Exception as e:
+                        logfire.warning(f"failed to unsubscribe from {job_id}: {e}")
+            self._observe()
+
+    async def close(self) -> None:
+        if self.listener is not None:
+            self.listener.cancel()
+        try:
+            await self.pubsub.aclose()
+        except Exception:
+            pass
+
+
+job_event_hub = JobEventHub()
@@ -0,0 +1,179 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import logfire
+from redis.asyncio import Redis
+
+from app.config import redis_client
+from app.metrics import metrics_llm_queue_depth, metrics_llm_wait
+
+# Two GCRA buckets, requests and tokens, shared by every worker. A call is only
+# admitted if both have capacity, in which case both are charged atomically.
+#
+# KEYS[1] = requests bucket, KEYS[2] = tokens bucket
+# ARGV = requests per period, tokens per period, tokens for this call,
+#        period (seconds), now (unix seconds, float)
+# returns the seconds to wait before retrying, as a string, or "0" if admitted.
+BUDGET_SCRIPT = """
+local limits = {tonumber(ARGV[1]), tonumber(ARGV[2])}
+local costs = {1, tonumber(ARGV[3])}
+local period = tonumber(ARGV[4])
+local now = tonumber(ARGV[5])
+
+local new_tats = {}
+local wait = 0
+for i = 1, 2 do
+    local tat = tonumber(redis.call("GET", KEYS[i]))
+    if not tat or tat < now then
+        tat = now
+    end
+    new_tats[i] = tat + (period / limits[i]) * costs[i]
+    wait = math.max(wait, new_tats[i] - period - now)
+end
+
+if wait > 0 then
+    return tostring(wait)
+end
+
+for i = 1, 2 do
+    local ttl = math.ceil((new_tats[i] - now) * 1000)
+    redis.call("SET", KEYS[i], tostring(new_tats[i]), "PX", ttl)
+end
+return "0"
+"""
+
+
+class LlmScheduler:
+    """
+    Governs calls to the LLM provider across all workers.
+
+    Within a process, at most `max_concurrency` calls run at once, and waiting
+    calls are admitted round-robin per tenant, so one large audit can't starve
+    everyone else. Every admitted call then reserves its estimated tokens against
+    requests/tokens per minute budgets in redis, waiting until both have room.
+    If redis is unavailable, only the local concurrency limit applies.
+    """
+
+    REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", 500))
+    TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", 200_000))
+    MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+    PERIOD_SECONDS = 60
+    CHARS_PER_TOKEN = 4
+    REDIS_BACKOFF_SECONDS = 5
+
+    def __init__(
+        self,
+        redis: Optional[Redis] = None,
+        requests_per_minute: int = REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = TOKENS_PER_MINUTE,
+        max_concurrency: int = MAX_CONCURRENCY,
+    ):
+        self.redis = redis if redis is not None else redis_client
+        self.script = self.redis.register_script(BUDGET_SCRIPT)
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrency = max_concurrency
+
+        self._running = 0
+        self._waiters: OrderedDict[str, deque[asyncio.Future]] = OrderedDict()
+        self._redis_retry_at = 0.0
+
+    @classmethod
+    def estimate_tokens(cls, *texts: str, max_output_tokens: int = 0) -> int:
+        """Rough upper bound of a call's tokens, from its inputs and output limit"""
+        chars = sum(len(text) for text in texts if text)
+        return chars // cls.CHARS_PER_TOKEN + max_output_tokens
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def _observe(self) -> None:
+        metrics_llm_queue_depth.set(self.queue_depth)
+
+    def _dispatch(self) -> None:
+        while self._running < self.max_concurrency and self._waiters:
+            tenant, waiters = next(iter(self._waiters.items()))
+            waiter = waiters.popleft()
+            if waiters:
+                self._waiters.move_to_end(tenant)
+            else:
+                del self._waiters[tenant]
+
+            if waiter.done():
+                # cancelled while waiting.
+                continue
+
+            self._running += 1
+            waiter.set_result(None)
+
+        self._observe()
+
+    async def _acquire(self, tenant: str) -> None:
+        if self._running < self.max_concurrency and not self._waiters:
+            self._running += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(tenant, deque()).append(waiter)
+        self._observe()
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # admitted, but cancelled before it could run.
+                self._release()
+            raise
+
+    def _release(self) -> None:
+        self._running -= 1
+        self._dispatch()
+
+    async def reserve(self, tokens: int) -> float:
+        """
+        Try to charge one request and `tokens` against the budgets. Returns 0 if
+        admitted, otherwise the seconds to wait before trying again.
+        """
+        if time.monotonic() < self._redis_retry_at:
+            return 0
+
+        try:
+            wait = await self.script(
+                keys=["llm_budget|requests", "llm_budget|tokens"],
+                args=[
+                    self.requests_per_minute,
+                    self.tokens_per_minute,
+                    min(tokens, self.tokens_per_minute),
+                    self.PERIOD_SECONDS,
+                    time.time(),
+                ],
+            )
+        except Exception as err:
+            logfire.warning(f"llm budget unavailable: {err}")
+            self._redis_retry_at = time.monotonic() + self.REDIS_BACKOFF_SECONDS
+            return 0
+
+        return float(wait)
+
+    @asynccontextmanager
+    async def slot(self, tenant: str, tokens: int) -> AsyncIterator[None]:
+        """Hold a slot for a single LLM call, estimated to use `tokens`"""
+        started = time.monotonic()
+        await self._acquire(tenant)
+
+        try:
+            while (wait := await self.reserve(tokens)) > 0:
+                await asyncio.sleep(wait)
+
+            metrics_llm_wait.record(time.monotonic() - started)
+            yield
+        finally:
+            self._release()
+
+
+llm_scheduler = LlmScheduler()
@@ -0,0 +1,194 @@
+import asyncio
+import multiprocessing
+import os
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+import logfire
+
+from app.metrics import (
+    metrics_parser_duration,
+    metrics_parser_pool,
+    metrics_parser_rejected,
+)
+from app.utils.types.errors import ParserError, ParserUnavailableError
+
+
+def _init_worker(memory_limit_mb: int) -> None:
+    try:
+        import resource
+
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        # not supported on this platform, run uncapped.
+        pass
+
+    # the parser's import is slow, pay it once per worker rather than on a request.
+    import solidity_parser.parser  # noqa: F401
+
+
+def _noop() -> None:
+    pass
+
+
+class ParserPool:
+    """
+    Runs CPU bound parsing in a pool of worker processes, so a large contract
+    can't stall the event loop.
+
+    At most `max_workers` jobs run at once and `max_queue` more may wait, beyond
+    that `run` raises `ParserUnavailableError` straight away. A job's timeout only
+    starts once it has a warm worker, so waiting its turn never counts against it.
+    Each worker's memory is capped, and a job that runs past its timeout has the
+    pool's processes killed and replaced, as a running job can't be cancelled
+    otherwise. Jobs that were running next to it raise `ParserUnavailableError`,
+    so they're retried rather than reported as unparsable.
+    """
+
+    MAX_WORKERS = int(os.getenv("PARSER_MAX_WORKERS", 2))
+    MAX_QUEUE = int(os.getenv("PARSER_MAX_QUEUE", 8))
+    TIMEOUT_SECONDS = float(os.getenv("PARSER_TIMEOUT_SECONDS", 10))
+    MEMORY_LIMIT_MB = int(os.getenv("PARSER_MEMORY_LIMIT_MB", 1_024))
+
+    def __init__(
+        self,
+        max_workers: int = MAX_WORKERS,
+        max_queue: int = MAX_QUEUE,
+        timeout: float = TIMEOUT_SECONDS,
+        memory_limit_mb: int = MEMORY_LIMIT_MB,
+    ):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._active = 0
+        # one per worker, a job only reaches the executor once it can run.
+        self._slots = asyncio.Semaphore(max_workers)
+        self._warming: Optional[asyncio.Task] = None
+        # executors killed by a restart, their other jobs are retryable.
+        self._retired: weakref.WeakSet[ProcessPoolExecutor] = weakref.WeakSet()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                # forking a process with running threads isn't safe.
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.memory_limit_mb,),
+            )
+        return self._executor
+
+    def _restart(self, executor: ProcessPoolExecutor) -> None:
+        if executor is not self._executor:
+            # already replaced by another job.
+            return
+
+        self._executor = None
+        self._retired.add(executor)
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+        # warm the replacement, rather than the next job paying for it.
+        self._warming = asyncio.create_task(self._warm())
+
+    async def _warm(self) -> None:
+        executor = self._get_executor()
+        await asyncio.gather(
+            *[
+                asyncio.wrap_future(executor.submit(_noop))
+                for _ in range(self.max_workers)
+            ],
+            return_exceptions=True,
+        )
+
+    async def _ready(self) -> ProcessPoolExecutor:
+        """The executor, once its workers are spawned"""
+        if self._executor is None and (self._warming is None or self._warming.done()):
+            self._warming = asyncio.create_task(self._warm())
+        if self._warming is not None and not self._warming.done():
+            await asyncio.shield(self._warming)
+        return self._get_executor()
+
+    def _observe(self) -> None:
+        busy = min(self._active, self.max_workers)
+        metrics_parser_pool.set(busy, attributes={"pool.state": "busy"})
+        metrics_parser_pool.set(
+            self._active - busy, attributes={"pool.state": "queued"}
+        )
+
+    async def start(self) -> None:
+        """Spawn the workers ahead of the first request"""
+        await self._ready()
+
+    async def close(self) -> None:
+        if self._warming is not None:
+            self._warming.cancel()
+            self._warming = None
+        if self._executor is None:
+            return
+
+        executor = self._executor
+        self._executor = None
+        await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+
+    async def run(
+        self, fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None
+    ) -> Any:
+        """Run `fn(*args)` in a worker. Both must be picklable."""
+        if self._active >= self.max_workers + self.max_queue:
+            metrics_parser_rejected.add(1)
+            raise ParserUnavailableError("parser pool is saturated")
+
+        self._active += 1
+        self._observe()
+
+        started = time.monotonic()
+        outcome = "ok"
+        try:
+            async with self._slots:
+                executor = await self._ready()
+                future = executor.submit(fn, *args)
+                try:
+                    return await asyncio.wait_for(
+                        asyncio.wrap_future(future), timeout=timeout or self.timeout
+                    )
+                except asyncio.TimeoutError:
+                    outcome = "timeout"
+                    logfire.warning("parse job timed out, restarting the parser pool")
+                    self._restart(executor)
+                    raise ParserError("parse timed out")
+                except BrokenProcessPool as err:
+                    if executor in self._retired:
+                        # killed along with another job, not for its own sake.
+                        outcome = "restarted"
+                        raise ParserUnavailableError("parser pool restarted")
+                    outcome = "error"
+                    logfire.warning(f"parse job failed: {err!r}")
+                    self._restart(executor)
+                    raise ParserError(f"parse failed: {err!r}")
+        except MemoryError as err:
+            outcome = "error"
+            logfire.warning(f"parse job failed: {err!r}")
+            raise ParserError(f"parse failed: {err!r}")
+        except (ParserError, ParserUnavailableError):
+            raise
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            self._active -= 1
+            self._observe()
+            metrics_parser_duration.record(
+                time.monotonic() - started, attributes={"parser.outcome": outcome}
+            )
+
+
+parser_pool = ParserPool()
@@ -0,0 +1,108 @@
+import asyncio
+import time
+from typing import Optional
+
+import logfire
+from redis.asyncio import Redis
+
+from app.config import redis_client
+from app.db.models import Prompt
+from app.utils.types.enums import AuditTypeEnum
+
+
+class PromptRegistry:
+    """
+    In-process view of the active prompts, keyed by (audit_type, tag).
+
+    Prompts are loaded once and reloaded only when the version counter in redis
+    changes. Anything that mutates a Prompt must call `bump_version`. The counter
+    is read at most every `CHECK_INTERVAL` seconds, so edits are picked up within
+    that window. If redis is unavailable, prompts are reloaded every `MAX_AGE`
+    seconds instead.
+    """
+
+    VERSION_KEY = "prompts|version"
+    CHECK_INTERVAL = 5
+    MAX_AGE = 60
+
+    def __init__(self, redis: Optional[Redis] = None):
+        self.redis = redis if redis is not None else redis_client
+        self.version: Optional[int] = None
+        self._prompts: dict[tuple[AuditTypeEnum, str], Prompt] = {}
+        self._loaded_at: Optional[float] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._loaded_at is not None
+            and time.monotonic() < self._checked_at + self.CHECK_INTERVAL
+        )
+
+    async def _get_version(self) -> Optional[int]:
+        try:
+            version = await self.redis.get(self.VERSION_KEY)
+        except Exception as err:
+            logfire.warning(f"prompt registry version unavailable: {err}")
+            return None
+        return int(version or 0)
+
+    async def _load(self) -> None:
+        prompts = await Prompt.filter(is_active=True).order_by("created_at")
+
+        # only one prompt per tag should be active, if not, the latest one wins.
+        self._prompts = {(prompt.audit_type, prompt.tag): prompt for prompt in prompts}
+        self._loaded_at = time.monotonic()
+
+    async def _sync(self) -> None:
+        if self._is_fresh():
+            return
+
+        async with self._lock:
+            if self._is_fresh():
+                return
+
+            # read the version before loading, so an edit made mid-load bumps it
+            # again and is picked up on the next check.
+            version = await self._get_version()
+            now = time.monotonic()
+
+            if self._loaded_at is not None:
+                if version is not None and version == self.version:
+                    self._checked_at = now
+                    return
+                if version is None and now < self._loaded_at + self.MAX_AGE:
+                    self._checked_at = now
+                    return
+
+            await self._load()
+            self.version = version
+            self._checked_at = now
+
+    async def get(self, audit_type: AuditTypeEnum, tag: str) -> Optional[Prompt]:
+        await self._sync()
+        return self._prompts.get((audit_type, tag))
+
+    async def get_candidates(self, audit_type: AuditTypeEnum) -> list[Prompt]:
+        await self._sync()
+        return [
+            prompt
+            for (prompt_audit_type, tag), prompt in self._prompts.items()
+            if prompt_audit_type == audit_type and tag != "reviewer"
+        ]
+
+    async def bump_version(self) -> None:
+        try:
+            await self.redis.incr(self.VERSION_KEY)
+        except Exception as err:
+            # workers fall back to reloading every MAX_AGE seconds.
+            logfire.warning(f"failed to bump prompt registry version: {err}")
+
+    def clear(self) -> None:
+        self._prompts = {}
+        self.version = None
+        self._loaded_at = None
+        self._checked_at = 0.0
+
+
+prompt_registry = PromptRegistry()
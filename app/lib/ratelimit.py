@@ -0,0 +1,130 @@
+import math
+import os
+import time
+from typing import Optional
+
+import logfire
+from pydantic import BaseModel
+from redis.asyncio import Redis
+
+from app.config import redis_client
+from app.lib.cache import LocalCache
+
+# GCRA (generic cell rate algorithm), equivalent to a token bucket holding `limit`
+# tokens that refills over `period` seconds. Only the theoretical arrival time
+# (TAT) is stored per key, so memory is constant regardless of the limit.
+#
+# KEYS[1] = bucket key
+# ARGV = limit, period (seconds), now (unix seconds, float)
+# returns {allowed, remaining, reset_after, retry_after}. Floats are returned as
+# strings, otherwise redis truncates them to integers.
+GCRA_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local interval = period / limit
+
+local tat = tonumber(redis.call("GET", KEYS[1]))
+if not tat or tat < now then
+    tat = now
+end
+
+local new_tat = tat + interval
+local diff = now - (new_tat - period)
+
+if diff < 0 then
+    return {0, 0, tostring(tat - now), tostring(-diff)}
+end
+
+redis.call("SET", KEYS[1], tostring(new_tat), "PX", math.ceil((new_tat - now) * 1000))
+
+local remaining = math.floor(diff / interval + 1e-9)
+return {1, remaining, tostring(new_tat - now), "0"}
+"""
+
+
+class RateLimitResult(BaseModel):
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float
+    retry_after: float
+
+    @property
+    def headers(self) -> dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(math.ceil(self.retry_after))
+        return headers
+
+
+class RateLimiter:
+    """
+    Token bucket rate limiter, evaluated in a single atomic redis script.
+
+    Once a key is rejected it's remembered in-process until its retry time, so a
+    client hammering past its limit doesn't cost a redis round trip per request.
+    If redis is unavailable, requests are allowed rather than failing the API.
+    """
+
+    DEFAULT_LIMIT = int(os.getenv("RATE_LIMIT_PER_MINUTE", 30))
+    PERIOD_SECONDS = 60
+    REDIS_BACKOFF_SECONDS = 5
+
+    def __init__(self, redis: Optional[Redis] = None, period: int = PERIOD_SECONDS):
+        self.redis = redis if redis is not None else redis_client
+        self.period = period
+        self.script = self.redis.register_script(GCRA_SCRIPT)
+        self.blocked = LocalCache(maxsize=10_000)
+        self._redis_retry_at = 0.0
+
+    async def hit(self, key: str, limit: int) -> Optional[RateLimitResult]:
+        """Consume one request for `key`. Returns None if the limiter is unavailable"""
+        now = time.time()
+
+        blocked = self.blocked.get(key)
+        if blocked is not None:
+            retry_at, reset_at = blocked
+            return RateLimitResult(
+                allowed=False,
+                limit=limit,
+                remaining=0,
+                reset_after=max(0, reset_at - now),
+                retry_after=max(0, retry_at - now),
+            )
+
+        if time.monotonic() < self._redis_retry_at:
+            return None
+
+        try:
+            allowed, remaining, reset_after, retry_after = await self.script(
+                keys=[f"rate_limit|{key}"], args=[limit, self.period, now]
+            )
+        except Exception as err:
+            logfire.warning(f"rate limiter unavailable: {err}")
+            self._redis_retry_at = time.monotonic() + self.REDIS_BACKOFF_SECONDS
+            return None
+
+        result = RateLimitResult(
+            allowed=bool(allowed),
+            limit=limit,
+            remaining=int(remaining),
+            reset_after=float(reset_after),
+            retry_after=float(retry_after),
+        )
+
+        if not result.allowed:
+            self.blocked.set(
+                key,
+                (now + result.retry_after, now + result.reset_after),
+                ttl=result.retry_after,
+            )
+
+        return result
+
+
+rate_limiter = RateLimiter()
@@ -1,12 +1,17 @@
 import os
+from contextlib import asynccontextmanager
 
 import logfire
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from tortoise.contrib.fastapi import register_tortoise
 
+from app.api.middlewares import RateLimitMiddleware
 from app.api.urls import router
 from app.config import TORTOISE_ORM
+from app.lib.clients import explorer_pool, queue_client, web3_registry
+from app.lib.events import job_event_hub
+from app.lib.parser_pool import parser_pool
 
 from .openapi import customize_openapi
 
@@ -16,7 +21,19 @@ logfire.configure(
 )
 
 
-app = FastAPI(debug=False, docs_url=None, redoc_url=None)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await queue_client.connect()
+    await parser_pool.start()
+    yield
+    await queue_client.close()
+    await explorer_pool.close()
+    await web3_registry.close()
+    await parser_pool.close()
+    await job_event_hub.close()
+
+
+app = FastAPI(debug=False, docs_url=None, redoc_url=None, lifespan=lifespan)
 
 
 app.openapi = customize_openapi(app)
@@ -31,7 +48,7 @@ register_tortoise(
     add_exception_handlers=True,
 )
 
-# # order matters. Runs in reverse order.
-# app.add_middleware(RateLimitMiddleware)
+# order matters. Runs in reverse order.
+app.add_middleware(RateLimitMiddleware)
 
 app.include_router(router)
@@ -9,3 +9,68 @@ metrics_tasks_duration = logfire.metric_gauge(
 metrics_ws_active = logfire.metric_gauge(
     "ws.active", description="Active WS connections", unit="#"
 )
+metrics_ws_connections = logfire.metric_histogram(
+    "ws.connections",
+    description="Open WS connections, sampled once per heartbeat round",
+    unit="#",
+)
+metrics_ws_ping_rtt = logfire.metric_histogram(
+    "ws.ping.rtt", description="Time from a WS heartbeat to its PONG", unit="s"
+)
+metrics_ws_dropped = logfire.metric_counter(
+    "ws.dropped", description="WS connections dropped by the heartbeat", unit="#"
+)
+metrics_events_jobs = logfire.metric_gauge(
+    "events.jobs", description="Jobs with a live event subscriber", unit="#"
+)
+metrics_cache_requests = logfire.metric_counter(
+    "cache.requests", description="Cache lookups by namespace and result", unit="#"
+)
+metrics_queue_pool = logfire.metric_gauge(
+    "queue.pool.connections",
+    description="arq enqueue pool connections by state",
+    unit="#",
+)
+metrics_llm_queue_depth = logfire.metric_gauge(
+    "llm.queue.depth", description="LLM calls waiting for a slot", unit="#"
+)
+metrics_llm_wait = logfire.metric_histogram(
+    "llm.queue.wait",
+    description="Time an LLM call waited for a slot and rate budget",
+    unit="s",
+)
+metrics_explorer_latency = logfire.metric_histogram(
+    "explorer.request.duration",
+    description="Explorer API latency by host and outcome",
+    unit="s",
+)
+metrics_explorer_errors = logfire.metric_counter(
+    "explorer.request.errors",
+    description="Failed explorer API attempts by host and reason",
+    unit="#",
+)
+metrics_indexer_throughput = logfire.metric_gauge(
+    "indexer.throughput",
+    description="Blocks indexed per second in the last run, by network",
+    unit="#/s",
+)
+metrics_indexer_lag = logfire.metric_gauge(
+    "indexer.lag",
+    description="Confirmed blocks not yet indexed, by network",
+    unit="#",
+)
+metrics_parser_pool = logfire.metric_gauge(
+    "parser.pool.jobs",
+    description="Parse jobs in the process pool by state",
+    unit="#",
+)
+metrics_parser_duration = logfire.metric_histogram(
+    "parser.duration",
+    description="Parse job time, including time queued, by outcome",
+    unit="s",
+)
+metrics_parser_rejected = logfire.metric_counter(
+    "parser.rejected",
+    description="Parse jobs turned away because the pool was saturated",
+    unit="#",
+)
@@ -0,0 +1,140 @@
+import hashlib
+import re
+from dataclasses import dataclass
+
+# matches the file headers written by SourceCodeParser.extract_code
+FILE_HEADER = re.compile(r"^// File: (.+)$", re.MULTILINE)
+# top-level definitions, used to split files that don't fit in a single chunk
+DEFINITION = re.compile(
+    r"^(?:abstract\s+contract|contract|library|interface)\s+\w+", re.MULTILINE
+)
+
+# vendored dependencies that are audited upstream, and not worth the tokens.
+LIBRARY_PATHS = (
+    "@openzeppelin/",
+    "@openzeppelin-upgradeable/",
+    "@chainlink/",
+    "@uniswap/",
+    "solmate/",
+    "solady/",
+    "forge-std/",
+    "node_modules/",
+    "lib/openzeppelin-contracts/",
+    "lib/openzeppelin-contracts-upgradeable/",
+    "lib/solmate/",
+    "lib/solady/",
+    "lib/forge-std/",
+)
+
+
+@dataclass
+class SourceFile:
+    path: str | None
+    content: str
+
+    @property
+    def is_library(self) -> bool:
+        return self.path is not None and any(
+            library in self.path for library in LIBRARY_PATHS
+        )
+
+    @property
+    def hashed_content(self) -> str:
+        normalized = "\n".join(line.strip() for line in self.content.splitlines())
+        return hashlib.sha256(normalized.strip().encode()).hexdigest()
+
+    def render(self) -> str:
+        if self.path is None:
+            return self.content
+        return f"// File: {self.path}\n\n{self.content}"
+
+
+def split_files(code: str) -> list[SourceFile]:
+    """Split aggregated source code back into the files it was built from"""
+    headers = list(FILE_HEADER.finditer(code))
+    if not headers:
+        return [SourceFile(path=None, content=code.strip())]
+
+    files = []
+    preamble = code[: headers[0].start()].strip()
+    if preamble:
+        files.append(SourceFile(path=None, content=preamble))
+
+    for i, header in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(code)
+        content = code[header.end() : end].strip()
+        if content:
+            files.append(SourceFile(path=header.group(1).strip(), content=content))
+
+    return files
+
+
+def _split_definitions(file: SourceFile, max_chars: int) -> list[str]:
+    """Split a file larger than `max_chars` on its top-level definitions"""
+    starts = [match.start() for match in DEFINITION.finditer(file.content)]
+    if len(starts) < 2:
+        # a single oversized definition can't be split meaningfully.
+        return [file.render()]
+
+    # pragmas and imports before the first definition are repeated in each part.
+    header = file.content[: starts[0]].strip()
+    parts = [
+        file.content[start:end].strip()
+        for start, end in zip(starts, starts[1:] + [len(file.content)])
+    ]
+
+    chunks = []
+    current = ""
+    for part in parts:
+        if current and len(current) + len(part) > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{part}" if current else part
+
+    chunks.append(current)
+
+    if header:
+        chunks = [f"{header}\n\n{chunk}" for chunk in chunks]
+
+    return [SourceFile(path=file.path, content=chunk).render() for chunk in chunks]
+
+
+def chunk_code(
+    code: str, max_chars: int = 40_000, skip_libraries: bool = True
+) -> list[str]:
+    """
+    Split source code into chunks of at most roughly `max_chars`, keeping files
+    whole where possible. Files repeated in the payload are only included once,
+    and well-known library files are dropped.
+    """
+    seen: set[str] = set()
+    files: list[SourceFile] = []
+    for file in split_files(code):
+        if skip_libraries and file.is_library:
+            continue
+        hashed = file.hashed_content
+        if hashed in seen:
+            continue
+        seen.add(hashed)
+        files.append(file)
+
+    chunks = []
+    current = ""
+    for file in files:
+        rendered = file.render()
+        if len(rendered) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.extend(_split_definitions(file, max_chars))
+            continue
+
+        if current and len(current) + len(rendered) > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{rendered}" if current else rendered
+
+    if current:
+        chunks.append(current)
+
+    return chunks
@@ -0,0 +1,210 @@
+import re
+from typing import Iterator
+
+# sources pasted with their escapes intact, ie a literal "\n", are treated as if
+# the escape was the character itself, outside of string literals.
+_TOKEN = re.compile(
+    r"""
+    (?P<ws>(?:\s|\\[ntr])+)
+    |(?P<comment>//(?:[^\n\\]|\\(?![ntr]))*|/\*.*?\*/)
+    |(?P<string>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')
+    |(?P<ident>[A-Za-z_$][\w$]*)
+    |(?P<number>\d\w*)
+    |(?P<punct>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+_TRIVIA = ("ws", "comment")
+
+
+def tokenize(code: str) -> list[tuple[str, str]]:
+    """
+    Split source into (kind, text) tokens, kinds being ws, comment, string, ident,
+    number and punct. Joining the texts gives back the source.
+    """
+    return [(match.lastgroup, match.group()) for match in _TOKEN.finditer(code)]
+
+
+class _Rewriter:
+    def __init__(self, tokens: list[tuple[str, str]]):
+        self.tokens = tokens
+
+    def next(self, i: int) -> int:
+        """Index of the first token at or after `i` that isn't whitespace or a comment"""
+        tokens = self.tokens
+        while i < len(tokens) and tokens[i][0] in _TRIVIA:
+            i += 1
+        return i
+
+    def prev(self, i: int) -> int:
+        tokens = self.tokens
+        while i >= 0 and tokens[i][0] in _TRIVIA:
+            i -= 1
+        return i
+
+    def text(self, i: int) -> str:
+        return self.tokens[i][1] if 0 <= i < len(self.tokens) else ""
+
+    def kind(self, i: int) -> str:
+        return self.tokens[i][0] if 0 <= i < len(self.tokens) else ""
+
+    def closing(self, i: int, open_: str, close: str) -> int:
+        """Index of the bracket closing the one at `i`, or -1 if it's unbalanced"""
+        depth = 0
+        for j in range(i, len(self.tokens)):
+            kind, text = self.tokens[j]
+            if kind != "punct":
+                continue
+            if text == open_:
+                depth += 1
+            elif text == close:
+                depth -= 1
+                if depth == 0:
+                    return j
+        return -1
+
+    def path(self, i: int) -> int:
+        """Index of the last token of a dotted identifier starting at `i`"""
+        while self.text(self.next(i + 1)) == ".":
+            member = self.next(self.next(i + 1) + 1)
+            if self.kind(member) != "ident":
+                break
+            i = member
+        return i
+
+    def assembly(self, i: int) -> int:
+        """`assembly ["dialect"] [(flags)] { ... }`, returns the closing brace or -1"""
+        j = self.next(i + 1)
+        if self.kind(j) == "string":
+            j = self.next(j + 1)
+        if self.text(j) == "(":
+            j = self.closing(j, "(", ")")
+            if j < 0:
+                return -1
+            j = self.next(j + 1)
+        if self.text(j) != "{":
+            return -1
+        return self.closing(j, "{", "}")
+
+    def call_options(self, i: int) -> int:
+        """`target{value: x, gas: y}(...)`, returns the closing brace or -1"""
+        previous = self.prev(i - 1)
+        if self.kind(previous) != "ident" and self.text(previous) not in (")", "]"):
+            return -1
+
+        name = self.next(i + 1)
+        if self.kind(name) != "ident" or self.text(self.next(name + 1)) != ":":
+            return -1
+
+        end = self.closing(i, "{", "}")
+        if end < 0 or self.text(self.next(end + 1)) != "(":
+            return -1
+        return end
+
+    def custom_error(self, i: int) -> tuple[int, str]:
+        """`revert Error(...);`, returns the semicolon and error name, or -1"""
+        name = self.next(i + 1)
+        if self.kind(name) != "ident":
+            return -1, ""
+
+        last = self.path(name)
+        args = self.next(last + 1)
+        if self.text(args) != "(":
+            return -1, ""
+
+        end = self.closing(args, "(", ")")
+        semicolon = self.next(end + 1) if end >= 0 else -1
+        if self.text(semicolon) != ";":
+            return -1, ""
+
+        error = "".join(text for _, text in self.tokens[name : last + 1])
+        return semicolon, re.sub(r"\s+", "", error)
+
+    def storage_pointer(self, i: int) -> int:
+        """`Layout storage $ = _getLayout();`, returns the semicolon or -1"""
+        storage = self.next(self.path(i) + 1)
+        if self.text(storage) != "storage":
+            return -1
+
+        pointer = self.next(storage + 1)
+        if self.text(pointer) != "$" or self.text(self.next(pointer + 1)) != "=":
+            return -1
+
+        j = pointer
+        while j < len(self.tokens) and self.text(j) != ";":
+            j += 1
+        return j if j < len(self.tokens) else -1
+
+    def rewrite(self) -> Iterator[str]:
+        tokens = self.tokens
+        i = 0
+        while i < len(tokens):
+            kind, text = tokens[i]
+
+            if kind == "ws":
+                yield (
+                    text.replace("\\n", "\n")
+                    .replace("\\t", "\t")
+                    .replace("\\r", "\r")
+                    .replace("\r\n", "\n")
+                )
+            elif kind == "ident" and text == "assembly":
+                end = self.assembly(i)
+                if end >= 0:
+                    # keep an empty block, so the AST still records assembly use.
+                    yield "assembly {}"
+                    i = end
+                else:
+                    yield text
+            elif kind == "ident" and text == "revert":
+                end, error = self.custom_error(i)
+                if end >= 0:
+                    yield f'require(false, "{error} error");'
+                    i = end
+                else:
+                    yield text
+            elif kind == "ident" and text == "$":
+                if self.text(i + 1) == ".":
+                    # storage pointer member, `$.balances` -> `balances`
+                    i += 1
+                else:
+                    yield text
+            elif kind == "ident" and self.text(self.next(i + 1)) in ("storage", "."):
+                end = self.storage_pointer(i)
+                if end >= 0:
+                    i = end
+                else:
+                    yield text
+            elif kind == "punct" and text == "{":
+                end = self.call_options(i)
+                if end >= 0:
+                    i = end
+                else:
+                    yield text
+            else:
+                yield text
+
+            i += 1
+
+
+def preprocess(code: str) -> str:
+    """
+    Rewrite source into something the parser's (pre 0.6) grammar accepts, in a
+    single pass over its tokens. Strings and comments are never rewritten.
+
+    - literal escape sequences outside of strings become the character itself,
+      and in a source escaped like that, so do escaped quotes
+    - inline assembly blocks are emptied, nested braces included
+    - call options, ie `{value: x}` before a call's arguments, are dropped
+    - custom errors are reverted with `require(false, "<Error> error")`
+    - ERC-7201 storage pointers are replaced with direct access
+    """
+    code = code.removeprefix("\ufeff")
+    tokens = tokenize(code)
+    if any(kind == "ws" and "\\" in text for kind, text in tokens):
+        # escaped as a whole, ie `string s = \"hi\";`, until unescaped the quotes
+        # would be read as strings swallowing the code after them.
+        code = code.replace('\\"', '"').replace("\\'", "'")
+        tokens = tokenize(code)
+    return "".join(_Rewriter(tokens).rewrite())
@@ -0,0 +1,267 @@
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from app.api.contract.interface import StaticAnalysisTokenResult
+
+EXTERNALLY_CALLABLE = ["public", "external"]
+
+
+@dataclass
+class FunctionSummary:
+    name: str
+    visibility: str
+    modifiers: set[str] = field(default_factory=set)
+    # identifiers and member names that are called, ie "require", "transfer".
+    calls: set[str] = field(default_factory=set)
+    uses_assembly: bool = False
+
+    @property
+    def is_externally_callable(self) -> bool:
+        return self.visibility in EXTERNALLY_CALLABLE
+
+    def calls_any(self, *targets: str) -> bool:
+        return any(target in self.calls for target in targets)
+
+    def calls_containing(self, fragment: str) -> bool:
+        return any(fragment in call for call in self.calls)
+
+
+@dataclass
+class ContractSummary:
+    name: str
+    kind: str
+    functions: list[FunctionSummary] = field(default_factory=list)
+    modifiers: list[FunctionSummary] = field(default_factory=list)
+    state_variables: set[str] = field(default_factory=set)
+    # names of every member, functions, variables, events, etc.
+    members: set[str] = field(default_factory=set)
+    uses_assembly: bool = False
+
+
+class AstVisitor:
+    """
+    Walks a solidity-parser AST depth first, calling `visit_<type>` for each node
+    with a handler. Handlers call `generic_visit` to continue into children.
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # resolve handlers once per class rather than a getattr per node.
+        cls._handlers = {
+            name.removeprefix("visit_"): getattr(cls, name)
+            for name in dir(cls)
+            if name.startswith("visit_")
+        }
+
+    _handlers: dict[str, Callable] = {}
+
+    def visit(self, node) -> None:
+        if isinstance(node, list):
+            for item in node:
+                self.visit(item)
+            return
+
+        if not isinstance(node, dict):
+            return
+
+        handler = self._handlers.get(node.get("type"))
+        if handler is None:
+            self.generic_visit(node)
+        else:
+            handler(self, node)
+
+    def generic_visit(self, node: dict) -> None:
+        handlers = self._handlers
+        for value in node.values():
+            if isinstance(value, dict):
+                children = (value,)
+            elif isinstance(value, list):
+                children = value
+            else:
+                continue
+
+            for child in children:
+                if not isinstance(child, dict):
+                    if isinstance(child, list):
+                        self.visit(child)
+                    continue
+                handler = handlers.get(child.get("type"))
+                if handler is None:
+                    self.generic_visit(child)
+                else:
+                    handler(self, child)
+
+
+class SummaryBuilder(AstVisitor):
+    """Collects a `ContractSummary` per contract, library and interface"""
+
+    def __init__(self):
+        self.contracts: list[ContractSummary] = []
+        self._contract: Optional[ContractSummary] = None
+        self._function: Optional[FunctionSummary] = None
+
+    def visit_ContractDefinition(self, node: dict) -> None:
+        parent = self._contract
+        self._contract = ContractSummary(
+            name=node.get("name") or "", kind=node.get("kind") or "contract"
+        )
+        self.contracts.append(self._contract)
+        self.generic_visit(node)
+        self._contract = parent
+
+    def _visit_callable(self, node: dict, into: str) -> None:
+        summary = FunctionSummary(
+            name=node.get("name") or "", visibility=node.get("visibility") or ""
+        )
+        if self._contract is not None:
+            getattr(self._contract, into).append(summary)
+            self._contract.members.add(summary.name)
+
+        parent = self._function
+        self._function = summary
+        self.generic_visit(node)
+        self._function = parent
+
+    def visit_FunctionDefinition(self, node: dict) -> None:
+        self._visit_callable(node, into="functions")
+
+    def visit_ModifierDefinition(self, node: dict) -> None:
+        self._visit_callable(node, into="modifiers")
+
+    def visit_ModifierInvocation(self, node: dict) -> None:
+        if self._function is not None:
+            self._function.modifiers.add(node.get("name") or "")
+        self.generic_visit(node)
+
+    def visit_StateVariableDeclaration(self, node: dict) -> None:
+        if self._contract is not None:
+            for variable in node.get("variables") or []:
+                name = variable.get("name") or ""
+                self._contract.state_variables.add(name)
+                self._contract.members.add(name)
+        self.generic_visit(node)
+
+    def visit_EventDefinition(self, node: dict) -> None:
+        if self._contract is not None:
+            self._contract.members.add(node.get("name") or "")
+        self.generic_visit(node)
+
+    def _add_call(self, target: Optional[str]) -> None:
+        if target and self._function is not None:
+            self._function.calls.add(target)
+
+    def visit_FunctionCall(self, node: dict) -> None:
+        expression = node.get("expression") or {}
+        if expression.get("type") == "Identifier":
+            self._add_call(expression.get("name"))
+        elif expression.get("type") == "MemberAccess":
+            self._add_call(expression.get("memberName"))
+        self.generic_visit(node)
+
+    def visit_InLineAssemblyStatement(self, node: dict) -> None:
+        if self._contract is not None:
+            self._contract.uses_assembly = True
+        if self._function is not None:
+            self._function.uses_assembly = True
+        self.generic_visit(node)
+
+    def visit_AssemblyExpression(self, node: dict) -> None:
+        self._add_call(node.get("functionName"))
+        self.generic_visit(node)
+
+
+def summarize(ast: dict) -> list[ContractSummary]:
+    builder = SummaryBuilder()
+    builder.visit(ast)
+    return builder.contracts
+
+
+Detector = Callable[[list[ContractSummary]], bool]
+
+# StaticAnalysisTokenResult field -> detector, run over the same summaries.
+DETECTORS: dict[str, Detector] = {}
+
+
+def detector(name: str) -> Callable[[Detector], Detector]:
+    def register(fn: Detector) -> Detector:
+        DETECTORS[name] = fn
+        return fn
+
+    return register
+
+
+def _functions(contracts: list[ContractSummary]) -> list[FunctionSummary]:
+    return [fn for contract in contracts for fn in contract.functions]
+
+
+@detector("is_mintable")
+def is_mintable(contracts: list[ContractSummary]) -> bool:
+    # an internal _mint reachable through an externally callable function.
+    functions = _functions(contracts)
+    internal_mint = any(fn.name.lower() == "_mint" for fn in functions)
+    public_mint = any(
+        fn.is_externally_callable
+        and (fn.name.lower() == "mint" or fn.calls_any("_mint"))
+        for fn in functions
+    )
+    return internal_mint and public_mint
+
+
+@detector("is_honeypot")
+def is_honeypot(contracts: list[ContractSummary]) -> bool:
+    return any(
+        fn.calls_any("require", "revert") and fn.calls_containing("transfer")
+        for fn in _functions(contracts)
+    )
+
+
+@detector("can_steal_fees")
+def can_steal_fees(contracts: list[ContractSummary]) -> bool:
+    return any(
+        fn.is_externally_callable
+        and any(word in fn.name.lower() for word in ["withdraw", "claim", "collect"])
+        for fn in _functions(contracts)
+    )
+
+
+@detector("can_self_destruct")
+def can_self_destruct(contracts: list[ContractSummary]) -> bool:
+    return any(fn.calls_any("selfdestruct", "suicide") for fn in _functions(contracts))
+
+
+@detector("has_proxy_functions")
+def has_proxy_functions(contracts: list[ContractSummary]) -> bool:
+    return any(fn.calls_any("delegatecall", "callcode") for fn in _functions(contracts))
+
+
+@detector("has_allowlist")
+def has_allowlist(contracts: list[ContractSummary]) -> bool:
+    return any(
+        word in member.lower()
+        for contract in contracts
+        for member in contract.members
+        for word in ["whitelist", "allowlist", "allowed"]
+    )
+
+
+@detector("has_blocklist")
+def has_blocklist(contracts: list[ContractSummary]) -> bool:
+    return any(
+        word in member.lower()
+        for contract in contracts
+        for member in contract.members
+        for word in ["blacklist", "blocklist", "banned"]
+    )
+
+
+@detector("can_terminate_transactions")
+def can_terminate_transactions(contracts: list[ContractSummary]) -> bool:
+    return any(fn.calls_any("assert", "revert") for fn in _functions(contracts))
+
+
+def analyze_ast(ast: dict) -> StaticAnalysisTokenResult:
+    """Summarize the AST in a single pass, then run every detector over it"""
+    contracts = summarize(ast)
+    return StaticAnalysisTokenResult(
+        **{name: detect(contracts) for name, detect in DETECTORS.items()}
+    )
@@ -40,6 +40,12 @@ class AuditStatusEnum(str, Enum):
     PROCESSING = "processing"
     SUCCESS = "success"
     FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class AuditPriorityEnum(str, Enum):
+    REALTIME = "realtime"
+    BATCH = "batch"
 
 
 class ResponseStructureEnum(str, Enum):
@@ -4,3 +4,24 @@ class NoSourceCodeError(Exception):
 
 class ContractParseError(Exception):
     pass
+
+
+class ExplorerError(Exception):
+    """Raised when a block explorer request fails, after any retries"""
+
+    def __init__(self, host: str, reason: str, detail: str = ""):
+        self.host = host
+        self.reason = reason
+        super().__init__(f"{host} request failed ({reason}) {detail}".strip())
+
+
+class ParserUnavailableError(Exception):
+    """Raised when the parser pool is saturated or restarting, retry later"""
+
+    pass
+
+
+class ParserError(Exception):
+    """Raised when a parse job times out, runs out of memory or crashes"""
+
+    pass
@@ -1,9 +1,15 @@
-from typing import Generic, TypedDict, TypeVar
+from typing import Generic, Optional, TypedDict, TypeVar
+from uuid import UUID
 
 from pydantic import BaseModel, Field
 
 from app.utils.types.common import ModelId, NullableModelId
-from app.utils.types.enums import RoleEnum
+from app.utils.types.enums import (
+    AppTypeEnum,
+    AuthScopeEnum,
+    ClientTypeEnum,
+    RoleEnum,
+)
 from app.utils.types.mixins import FkMixin, IdMixin
 
 
@@ -40,6 +46,21 @@ class AuthState(BaseModel, FkMixin):
     role: RoleEnum
 
 
+class CachedAuth(BaseModel, IdMixin, FkMixin):
+    """Snapshot of an Auth row, and its relations, needed to resolve AuthState"""
+
+    id: UUID
+    client_type: ClientTypeEnum
+    scope: AuthScopeEnum
+    consumes_credits: bool
+    is_revoked: bool
+    rate_limit: Optional[int] = None
+    user_id: Optional[UUID] = None
+    app_id: Optional[UUID] = None
+    app_type: Optional[AppTypeEnum] = None
+    owner_id: Optional[UUID] = None
+
+
 class Candidates(TypedDict):
     candidates: dict[str, str]
     reviewer: str
@@ -7,16 +7,17 @@ from typing import Optional, TypedDict
 import logfire
 import logfire.propagate
 import logfire.sampling
-from arq import ArqRedis, Retry
+from arq import ArqRedis, cron
 from arq.constants import default_queue_name, health_check_key_suffix
 from dotenv import load_dotenv
 from tortoise import Tortoise
 
 from app.config import TORTOISE_ORM, redis_settings
+from app.lib.clients import explorer_pool, web3_registry
 from app.metrics import metrics_tasks_duration, metrics_tasks_total
-from app.utils.types.enums import NetworkEnum
+from app.utils.types.enums import AuditPriorityEnum, NetworkEnum
 
-from .tasks import get_deployment_contracts, handle_eval
+from .tasks import handle_batches, handle_eval, index_deployments
 
 load_dotenv()
 logfire.configure(
@@ -26,6 +27,13 @@ logfire.configure(
 )
 logfire.instrument_pydantic_ai()
 
+# comma separated networks to index contract deployments on, ie "eth,eth_sepolia".
+INDEXER_NETWORKS = [
+    NetworkEnum(network.strip())
+    for network in os.getenv("INDEXER_NETWORKS", "").split(",")
+    if network.strip()
+]
+
 
 class LoggingMiddleware:
     HEALTH_REGEX = "j_complete=(?P<completed>[0-9]+).j_failed=(?P<failed>[0-9]+).j_retried=(?P<retried>[0-9]+).j_ongoing=(?P<ongoing>[0-9]+).queued=(?P<queued>[0-9]+)"  # noqa
@@ -105,15 +113,22 @@ async def on_startup(ctx: JobContext):
 
 async def on_shutdown(ctx: JobContext):
     await Tortoise.close_connections()
+    await explorer_pool.close()
+    await web3_registry.close()
     ctx["logging"].stop()
 
 
 async def scan_contracts(ctx: JobContext):
-    try:
-        for network in [NetworkEnum.ETH, NetworkEnum.ETH_SEPOLIA]:
-            await get_deployment_contracts(network)
-    except Exception:
-        raise Retry(defer=ctx["job_try"] * 5)
+    # each network resumes from its own cursor, one failing shouldn't hold up others.
+    for network in INDEXER_NETWORKS:
+        try:
+            await index_deployments(network)
+        except Exception as err:
+            logfire.exception(f"unable to index {network}: {err}")
+
+
+async def backfill_contracts(ctx: JobContext, network: NetworkEnum, from_block: int):
+    await index_deployments(NetworkEnum(network), from_block=from_block)
 
 
 async def on_job_start(ctx: JobContext):
@@ -129,22 +144,34 @@ async def on_job_end(ctx: JobContext):
     ctx["logging"].log_process_time(diff.seconds)
 
 
-async def process_eval(ctx: JobContext, trace: logfire.propagate.ContextCarrier):
+async def process_eval(
+    ctx: JobContext,
+    trace: logfire.propagate.ContextCarrier,
+    use_cache: bool = True,
+    priority: AuditPriorityEnum = AuditPriorityEnum.REALTIME,
+):
     # job_id was forcefully meant to match the audit_id
     audit_id = ctx["job_id"]
     with logfire.propagate.attach_context(trace):
         with logfire.span(f"processing audit {audit_id}"):
-            response = await handle_eval(audit_id=audit_id)
+            response = await handle_eval(
+                audit_id=audit_id, use_cache=use_cache, priority=priority
+            )
             return response
 
 
+async def poll_batches(ctx: JobContext):
+    await handle_batches()
+
+
 async def mock(ctx: JobContext):
     await asyncio.sleep(3)
     return 2
 
 
 class WorkerSettings:
-    functions = [process_eval, mock]
+    functions = [process_eval, backfill_contracts, mock]
+    cron_jobs = [cron(poll_batches, second=0), cron(scan_contracts, second=30)]
     on_startup = on_startup
     on_shutdown = on_shutdown
     on_job_start = on_job_start
@@ -0,0 +1,200 @@
+import json
+import time
+from typing import Optional
+
+import logfire
+from openai import AsyncOpenAI
+from openai.types import Batch
+
+from app.db.models import Audit, IntermediateResponse, Prompt
+from app.lib.clients.llm import llm_client, model, model_settings
+from app.lib.prompts import prompt_registry
+from app.utils.types.enums import AuditStatusEnum
+from app.utils.types.llm import OutputStructure
+
+from .audit_generation import LlmPipeline
+
+
+class BatchPipeline(LlmPipeline):
+    """
+    Runs an audit through the OpenAI Batch API, for audits nobody is waiting on.
+
+    Candidates are submitted as one batch. Once it completes, the reviewer is
+    submitted as a second batch, and its output is written as the audit result.
+    Nothing waits in between, `poll` is called periodically to move audits along.
+    Submitted steps are tracked by `IntermediateResponse.batch_id`.
+    """
+
+    ENDPOINT = "/v1/chat/completions"
+    COMPLETION_WINDOW = "24h"
+    FAILED_STATUSES = ["failed", "expired", "cancelled"]
+
+    def __init__(self, audit: Audit, client: Optional[AsyncOpenAI] = None, **kwargs):
+        super().__init__(audit, **kwargs)
+        self.client = client or llm_client
+
+        # usage accumulates on the audit across stages.
+        self.usage.add_input(audit.input_tokens or 0)
+        self.usage.add_output(audit.output_tokens or 0)
+
+    def _request(
+        self, prompt: Prompt, user_prompt: str, response_format: dict | None = None
+    ) -> dict:
+        body = {
+            "model": model.model_name,
+            "messages": [
+                {"role": "system", "content": prompt.content},
+                {"role": "user", "content": user_prompt},
+            ],
+            "max_tokens": model_settings["max_tokens"],
+            "temperature": model_settings["temperature"],
+        }
+        if response_format:
+            body["response_format"] = response_format
+
+        return {
+            "custom_id": str(prompt.id),
+            "method": "POST",
+            "url": self.ENDPOINT,
+            "body": body,
+        }
+
+    async def _submit(self, prompts: list[Prompt], requests: list[dict]) -> None:
+        content = "\n".join(json.dumps(request) for request in requests)
+
+        file = await self.client.files.create(
+            file=(f"{self.audit.id}.jsonl", content.encode()), purpose="batch"
+        )
+        batch = await self.client.batches.create(
+            input_file_id=file.id,
+            endpoint=self.ENDPOINT,
+            completion_window=self.COMPLETION_WINDOW,
+            metadata={"audit_id": str(self.audit.id)},
+        )
+
+        for prompt in prompts:
+            await self._checkpoint(
+                prompt=prompt, status=AuditStatusEnum.PROCESSING, batch_id=batch.id
+            )
+
+    async def submit_candidates(self) -> None:
+        prompts = await prompt_registry.get_candidates(self.audit_type)
+        if not prompts:
+            raise Exception("no active candidate prompts exist")
+
+        code = self.audit.contract.code
+        await self._submit(prompts, [self._request(prompt, code) for prompt in prompts])
+
+    async def submit_report(self) -> None:
+        prompt = await prompt_registry.get(self.audit_type, "reviewer")
+        if not prompt:
+            raise Exception("no active reviewer prompt exists")
+
+        candidates = await IntermediateResponse.filter(
+            audit_id=self.audit.id, status=AuditStatusEnum.SUCCESS
+        ).exclude(step="reviewer")
+        for candidate in candidates:
+            self.candidate_responses += (
+                f"\n\nAuditor #{candidate.step} Findings:\n{candidate.result}"
+            )
+
+        if not self.candidate_responses:
+            raise Exception("no candidates succeeded")
+
+        response_format = {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "OutputStructure",
+                "schema": OutputStructure.model_json_schema(),
+            },
+        }
+        request = self._request(
+            prompt, self.candidate_responses.strip(), response_format=response_format
+        )
+        await self._submit([prompt], [request])
+
+    async def _read_output(self, batch: Batch) -> dict[str, str]:
+        """Successful responses in the batch, by custom_id"""
+        if not batch.output_file_id:
+            return {}
+
+        output = await self.client.files.content(batch.output_file_id)
+
+        results = {}
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            response = item.get("response") or {}
+            if item.get("error") or response.get("status_code") != 200:
+                logfire.warning(
+                    f"batch request failed: {item.get('error')}",
+                    **{"audit_id": str(self.audit.id)},
+                )
+                continue
+
+            body = response["body"]
+            usage = body.get("usage") or {}
+            self.usage.add_input(usage.get("prompt_tokens", 0))
+            self.usage.add_output(usage.get("completion_tokens", 0))
+
+            results[item["custom_id"]] = body["choices"][0]["message"]["content"]
+
+        return results
+
+    async def poll(self, batch_id: str) -> Optional[OutputStructure]:
+        """
+        Check on a submitted batch, recording its results once it's done. Returns
+        the report once the reviewer batch completes.
+        """
+        batch = await self.client.batches.retrieve(batch_id)
+        if batch.status not in ["completed", *self.FAILED_STATUSES]:
+            return None
+
+        steps = await IntermediateResponse.filter(
+            batch_id=batch_id, status=AuditStatusEnum.PROCESSING
+        ).prefetch_related("prompt")
+        if not steps:
+            # already recorded by an earlier poll.
+            return None
+
+        results = await self._read_output(batch) if batch.status == "completed" else {}
+        runtime = int(time.time() - batch.created_at)
+
+        report = None
+        for step in steps:
+            result = results.get(str(step.prompt_id))
+
+            if result and step.step == "reviewer":
+                try:
+                    report = OutputStructure.model_validate_json(result)
+                    result = report.model_dump_json()
+                except ValueError as err:
+                    logfire.warning(str(err), **{"audit_id": str(self.audit.id)})
+                    result = None
+
+            status = AuditStatusEnum.SUCCESS if result else AuditStatusEnum.FAILED
+
+            await self._checkpoint(
+                prompt=step.prompt,
+                status=status,
+                result=result,
+                processing_time=runtime,
+            )
+
+        self.audit.input_tokens = self.usage.input_tokens
+        self.audit.output_tokens = self.usage.output_tokens
+        await self.audit.save()
+
+        if any(step.step == "reviewer" for step in steps):
+            if not report:
+                raise Exception(f"reviewer batch {batch_id} {batch.status}")
+            return report
+
+        await self.submit_report()
+        return None
+
+    def get_cost(self) -> int:
+        if self.cached_from is not None:
+            return super().get_cost()
+        return self.usage.get_batch_cost()
@@ -1,32 +1,64 @@
 import asyncio
+import hashlib
 import json
 from datetime import datetime
-from typing import Any, Coroutine
+from typing import Optional
 
 import logfire
+from pydantic_ai.usage import Usage
+from tortoise.transactions import in_transaction
 
 from app.api.pricing.service import CreditCosts
-from app.config import redis_client
 from app.db.models import Audit, Finding, IntermediateResponse, Prompt
-from app.lib.clients.llm import agent
+from app.lib.clients.llm import agent, model_settings
+from app.lib.events import job_event_log
+from app.lib.llm_scheduler import llm_scheduler
+from app.lib.prompts import prompt_registry
+from app.metrics import metrics_cache_requests
+from app.utils.helpers.code_chunker import chunk_code
 from app.utils.types.enums import AuditStatusEnum, FindingLevelEnum
 from app.utils.types.llm import OutputStructure
 
 
 class LlmPipeline:
+    # partial candidate output is grouped over this window into a single event.
+    STREAM_DEBOUNCE_SECONDS = 0.5
+    # in chunked mode, the size of each chunk and how many run against the LLM at once.
+    CHUNK_MAX_CHARS = 40_000
+    CHUNK_CONCURRENCY = 4
+
     def __init__(
         self,
         audit: Audit,
         should_publish: bool = False,  # **to pubsub channel**
+        quorum: Optional[int] = None,
+        deadline_seconds: Optional[float] = None,
+        chunked: bool = False,
     ):
         self.audit = audit
         self.audit_type = audit.audit_type
         self.usage = CreditCosts()
 
         self.should_publish = should_publish
+        # LLM calls are scheduled fairly between tenants.
+        self.tenant = str(audit.app_id or audit.user_id or "internal")
+        # start the reviewer once `quorum` candidates succeed, or `deadline_seconds`
+        # pass, rather than waiting on every candidate.
+        self.quorum = quorum
+        self.deadline_seconds = deadline_seconds
+
+        # split large sources and run each candidate per chunk, merging the findings
+        # before the reviewer. Falls back to the whole source if nothing is left.
+        self.chunks: list[str] = []
+        if chunked and self.audit.contract.code:
+            self.chunks = chunk_code(
+                self.audit.contract.code, max_chars=self.CHUNK_MAX_CHARS
+            ) or [self.audit.contract.code]
+        self._chunk_semaphore = asyncio.Semaphore(self.CHUNK_CONCURRENCY)
         self.candidate_responses = ""
+        self.cached_from: Optional[Audit] = None
 
-    async def _publish_event(self, name: str, status: str):
+    async def _publish_event(self, name: str, status: str, data: str | None = None):
         if not self.should_publish:
             return
 
@@ -36,11 +68,17 @@ class LlmPipeline:
             "status": status,
             "job_id": str(self.audit.id),
         }
+        if data is not None:
+            message["data"] = data
 
-        await redis_client.publish(
-            "evals",
-            json.dumps(message),
-        )
+        await job_event_log.publish(job_id=str(self.audit.id), message=message)
+
+    async def _publish_status(self):
+        # followers of the audit's events stop at this one.
+        try:
+            await self._publish_event(name="audit", status=self.audit.status.value)
+        except Exception as err:
+            logfire.warning(f"failed to publish audit status: {err}")
 
     async def _checkpoint(
         self,
@@ -48,6 +86,7 @@ class LlmPipeline:
         status: AuditStatusEnum,
         result: str | None = None,
         processing_time: int | None = None,
+        batch_id: str | None = None,
     ):
         checkpoint = await IntermediateResponse.filter(
             audit_id=self.audit.id, prompt_id=prompt.id
@@ -57,6 +96,8 @@ class LlmPipeline:
             checkpoint.status = status
             checkpoint.result = result
             checkpoint.processing_time_seconds = processing_time
+            if batch_id:
+                checkpoint.batch_id = batch_id
             await checkpoint.save()
             return
 
@@ -67,9 +108,73 @@ class LlmPipeline:
             status=status,
             result=result,
             processing_time_seconds=processing_time,
+            batch_id=batch_id,
+        )
+
+    def _llm_slot(self, user_prompt: str, prompt: Prompt):
+        tokens = llm_scheduler.estimate_tokens(
+            user_prompt,
+            prompt.content,
+            max_output_tokens=model_settings["max_tokens"],
+        )
+        return llm_scheduler.slot(self.tenant, tokens)
+
+    async def _run_agent(self, user_prompt: str, prompt: Prompt, **kwargs):
+        async with self._llm_slot(user_prompt, prompt):
+            return await agent.run(user_prompt, deps=prompt.content, **kwargs)
+
+    async def _run_chunk(self, prompt: Prompt, chunk: str) -> tuple[str, Usage]:
+        async with self._chunk_semaphore:
+            result = await self._run_agent(chunk, prompt)
+            return result.data, result.usage()
+
+    async def _run_chunked_candidate(self, prompt: Prompt) -> tuple[str, Usage]:
+        """Map the prompt over every chunk, then merge the findings into one response"""
+        results = await asyncio.gather(
+            *[self._run_chunk(prompt, chunk) for chunk in self.chunks]
         )
 
-    async def _generate_candidate(self, prompt: Prompt):
+        usage = Usage()
+        merged = []
+        for i, (data, chunk_usage) in enumerate(results):
+            usage += chunk_usage
+            merged.append(f"Part {i + 1} of {len(results)}:\n{data}")
+
+        return "\n\n".join(merged), usage
+
+    async def _run_candidate(self, prompt: Prompt) -> tuple[str, Usage]:
+        """
+        Run a candidate prompt. When publishing, the output is streamed and forwarded
+        to subscribers as "chunk" events while it's generated.
+        """
+        if self.chunks:
+            return await self._run_chunked_candidate(prompt)
+
+        code = self.audit.contract.code
+        if not self.should_publish:
+            result = await self._run_agent(code, prompt)
+            return result.data, result.usage()
+
+        chunks: list[str] = []
+        async with (
+            self._llm_slot(code, prompt),
+            agent.run_stream(code, deps=prompt.content) as result,
+        ):
+            async for chunk in result.stream_text(
+                delta=True, debounce_by=self.STREAM_DEBOUNCE_SECONDS
+            ):
+                chunks.append(chunk)
+                try:
+                    await self._publish_event(
+                        name=prompt.tag, status="chunk", data=chunk
+                    )
+                except Exception as err:
+                    # partial output is best-effort, don't fail the candidate.
+                    logfire.warning(f"failed to publish chunk: {err}")
+
+        return "".join(chunks), result.usage()
+
+    async def _generate_candidate(self, prompt: Prompt) -> bool:
         await self._publish_event(name=prompt.tag, status="start")
         await self._checkpoint(prompt=prompt, status=AuditStatusEnum.PROCESSING)
 
@@ -82,13 +187,8 @@ class LlmPipeline:
             },
         ):
             try:
-                result = await agent.run(self.audit.contract.code, deps=prompt.content)
+                data, usage = await self._run_candidate(prompt)
                 runtime = (datetime.now() - now).seconds
-                self.candidate_responses += (
-                    f"\n\nAuditor #{prompt.tag} Findings:\n{result.data}"
-                )
-
-                usage = result.usage()
 
                 self.usage.add_input(usage.request_tokens or 0)
                 self.usage.add_output(usage.response_tokens or 0)
@@ -97,9 +197,26 @@ class LlmPipeline:
                 await self._checkpoint(
                     prompt=prompt,
                     status=AuditStatusEnum.SUCCESS,
-                    result=result.data,
+                    result=data,
+                    processing_time=runtime,
+                )
+
+                # only once nothing else is awaited, so a cancelled candidate is
+                # never passed to the reviewer.
+                self.candidate_responses += (
+                    f"\n\nAuditor #{prompt.tag} Findings:\n{data}"
+                )
+                return True
+
+            except asyncio.CancelledError:
+                runtime = (datetime.now() - now).seconds
+                await self._publish_event(name=prompt.tag, status="cancelled")
+                await self._checkpoint(
+                    prompt=prompt,
+                    status=AuditStatusEnum.CANCELLED,
                     processing_time=runtime,
                 )
+                raise
 
             except Exception as err:
                 logfire.warning(str(err))
@@ -110,25 +227,64 @@ class LlmPipeline:
                     status=AuditStatusEnum.FAILED,
                     processing_time=runtime,
                 )
+                return False
+
+    async def _wait_for_quorum(self, tasks: list[asyncio.Task[bool]]) -> None:
+        """
+        Wait until `quorum` candidates succeed or the deadline passes, whichever
+        comes first, then cancel the stragglers.
+        """
+        loop = asyncio.get_running_loop()
+        deadline_at = None
+        if self.deadline_seconds is not None:
+            deadline_at = loop.time() + self.deadline_seconds
+
+        succeeded = 0
+        pending = set(tasks)
+        while pending:
+            timeout = None
+            if deadline_at is not None:
+                timeout = max(0, deadline_at - loop.time())
+
+            done, pending = await asyncio.wait(
+                pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                break
 
-    async def generate_candidates(self) -> None:
-        tasks: list[Coroutine[Any, Any, None]] = []
-        candidate_prompts = await Prompt.filter(
-            audit_type=self.audit_type, is_active=True, tag__not="reviewer"
+            succeeded += sum(task.result() for task in done)
+            if self.quorum is not None and succeeded >= self.quorum:
+                break
+
+        if not pending:
+            return
+
+        logfire.info(
+            f"cancelling {len(pending)} candidates after {succeeded} succeeded",
+            **{"audit_id": str(self.audit.id)},
         )
-        for prompt in candidate_prompts:
-            task = self._generate_candidate(prompt)
-            tasks.append(task)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    async def generate_candidates(self) -> None:
+        candidate_prompts = await prompt_registry.get_candidates(self.audit_type)
+        tasks = [
+            asyncio.create_task(self._generate_candidate(prompt))
+            for prompt in candidate_prompts
+        ]
+
+        if self.quorum is None and self.deadline_seconds is None:
+            await asyncio.gather(*tasks)
+            return
 
-        await asyncio.gather(*tasks)
+        await self._wait_for_quorum(tasks)
 
     async def generate_report(self) -> OutputStructure:
         if not self.candidate_responses:
             raise NotImplementedError("must run generate_candidates() first")
 
-        prompt = await Prompt.filter(
-            audit_type=self.audit_type, is_active=True, tag="reviewer"
-        ).first()
+        prompt = await prompt_registry.get(self.audit_type, "reviewer")
 
         if not prompt:
             raise Exception("no active reviewer prompt exists")
@@ -139,9 +295,9 @@ class LlmPipeline:
         now = datetime.now()
 
         try:
-            result = await agent.run(
+            result = await self._run_agent(
                 self.candidate_responses.strip(),
-                deps=prompt.content,
+                prompt,
                 result_type=OutputStructure,
             )
             runtime = (datetime.now() - now).seconds
@@ -169,6 +325,99 @@ class LlmPipeline:
 
         return result.data
 
+    async def get_result_key(self) -> Optional[str]:
+        """
+        Identifies the output of this pipeline, the same code audited with the same
+        prompts. Prompts can be edited in place, so include their last update.
+        """
+        hashed_code = self.audit.contract.hashed_code
+        if not hashed_code:
+            return None
+
+        prompts = await prompt_registry.get_candidates(self.audit_type)
+        reviewer = await prompt_registry.get(self.audit_type, "reviewer")
+        if reviewer:
+            prompts.append(reviewer)
+
+        versions = sorted(
+            f"{prompt.id}:{prompt.version}:{prompt.updated_at.isoformat()}"
+            for prompt in prompts
+        )
+        key = json.dumps([hashed_code, self.audit_type.value, versions])
+
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    async def find_cached_result(self) -> Optional[Audit]:
+        """Most recent successful audit with the same result key, if any"""
+        if not self.audit.result_key:
+            return None
+
+        # only audits that ran the LLM, copies have no usage to discount from.
+        audit = (
+            await Audit.filter(
+                result_key=self.audit.result_key,
+                status=AuditStatusEnum.SUCCESS,
+                input_tokens__gt=0,
+            )
+            .exclude(id=self.audit.id)
+            .order_by("-created_at")
+            .first()
+        )
+
+        metrics_cache_requests.add(
+            1,
+            attributes={
+                "cache.namespace": "audit_result",
+                "cache.result": "hit" if audit else "miss",
+            },
+        )
+
+        return audit
+
+    async def copy_results(self, source: Audit, processing_time_seconds: int):
+        """Reuse the output and findings of an identical audit, instead of the LLM"""
+        self.cached_from = source
+
+        self.audit.status = AuditStatusEnum.SUCCESS
+        self.audit.processing_time_seconds = processing_time_seconds
+        self.audit.raw_output = source.raw_output
+        self.audit.introduction = source.introduction
+        self.audit.scope = source.scope
+        self.audit.conclusion = source.conclusion
+
+        # feedback and attestations belong to the original audit, don't copy them.
+        findings = await Finding.filter(audit_id=source.id)
+        to_create = [
+            Finding(
+                audit=self.audit,
+                audit_type=self.audit_type,
+                level=finding.level,
+                name=finding.name,
+                explanation=finding.explanation,
+                recommendation=finding.recommendation,
+                reference=finding.reference,
+            )
+            for finding in findings
+        ]
+
+        async with in_transaction():
+            await self.audit.save()
+            if to_create:
+                await Finding.bulk_create(objects=to_create)
+
+        await self._publish_status()
+
+    def get_cost(self) -> int:
+        if self.cached_from is None:
+            return self.usage.get_cost()
+
+        # discounted relative to what the original audit cost to generate.
+        usage = CreditCosts()
+        usage.add_input(self.cached_from.input_tokens or 0)
+        usage.add_output(self.cached_from.output_tokens or 0)
+
+        return usage.get_cached_cost()
+
     async def write_results(
         self,
         response: OutputStructure | None,
@@ -183,6 +432,7 @@ class LlmPipeline:
 
         if not response:
             await self.audit.save()
+            await self._publish_status()
             return
 
         self.audit.raw_output = response.model_dump_json()
@@ -212,3 +462,5 @@ class LlmPipeline:
 
         if to_create:
             await Finding.bulk_create(objects=to_create)
+
+        await self._publish_status()
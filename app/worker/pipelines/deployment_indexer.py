@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import os
+import time
+from typing import Iterable, Optional
+
+import logfire
+from tortoise.transactions import in_transaction
+from web3.types import TxReceipt
+
+from app.api.blockchain.service import BlockchainService
+from app.db.models import Contract, IndexerCursor
+from app.lib.clients import Web3Client
+from app.metrics import metrics_indexer_lag, metrics_indexer_throughput
+from app.utils.types.enums import ContractMethodEnum, NetworkEnum
+
+
+class DeploymentIndexer:
+    """
+    Indexes verified contract deployments on a network, a block range at a time.
+
+    Progress is kept in an `IndexerCursor` per network, advanced in the same
+    transaction as each batch's contracts are written, so a run can stop anywhere
+    and the next one resumes where it left off. Only blocks `confirmations` deep
+    are indexed, so a reorg can't remove a deployment after it's recorded.
+
+    A network without a cursor starts at the current head, `backfill` moves the
+    cursor back to index history. Contracts are upserted on (network, address),
+    so re-indexing a range is harmless. Runs that overlap, ie a slow scheduled
+    run and a backfill, can't move each other's cursor back: each write locks the
+    cursor row, and a run stops once the cursor is no longer where it left it.
+    """
+
+    BATCH_BLOCKS = int(os.getenv("INDEXER_BATCH_BLOCKS", 10))
+    MAX_BLOCKS_PER_RUN = int(os.getenv("INDEXER_MAX_BLOCKS_PER_RUN", 500))
+    CONFIRMATIONS = int(os.getenv("INDEXER_CONFIRMATIONS", 12))
+
+    def __init__(
+        self,
+        network: NetworkEnum,
+        web3_client: Optional[Web3Client] = None,
+        batch_blocks: int = BATCH_BLOCKS,
+        confirmations: int = CONFIRMATIONS,
+    ):
+        self.network = network
+        self.web3_client = web3_client or Web3Client(network=network)
+        self.blockchain_service = BlockchainService()
+        self.batch_blocks = batch_blocks
+        self.confirmations = confirmations
+
+    @staticmethod
+    def extract_deployments(receipts: Iterable[TxReceipt]) -> list[str]:
+        """Addresses of the contracts created by these receipts"""
+        addresses = []
+        for receipt in receipts:
+            address = receipt.get("contractAddress")
+            if address and address not in addresses:
+                addresses.append(address)
+        return addresses
+
+    async def get_cursor(self, start: int) -> IndexerCursor:
+        cursor, _ = await IndexerCursor.get_or_create(
+            network=self.network, defaults={"block_number": start}
+        )
+        return cursor
+
+    async def backfill(self, from_block: int) -> None:
+        """Move the cursor so the next runs index from `from_block` onwards"""
+        await IndexerCursor.update_or_create(
+            network=self.network, defaults={"block_number": from_block - 1}
+        )
+
+    async def _lookup(self, addresses: list[str]) -> list[dict]:
+        results = await asyncio.gather(
+            *[
+                self.blockchain_service.get_source_code(
+                    address=address, network=self.network
+                )
+                for address in addresses
+            ]
+        )
+        return [result for result in results if result["is_available"]]
+
+    async def _write(
+        self, results: list[dict], expected: int, block_number: int
+    ) -> bool:
+        """
+        Upsert the contracts, and advance the cursor from `expected` to
+        `block_number`, in one transaction. The cursor row is locked first, if
+        another run or a backfill moved it meanwhile nothing is written and False
+        is returned.
+        """
+        async with in_transaction():
+            cursor = await IndexerCursor.select_for_update().get(network=self.network)
+            if cursor.block_number != expected:
+                return False
+
+            if results:
+                await Contract.bulk_create(
+                    [
+                        Contract(
+                            method=ContractMethodEnum.SCAN,
+                            address=result["address"],
+                            network=self.network,
+                            is_available=True,
+                            code=result["code"],
+                            hashed_code=hashlib.sha256(
+                                result["code"].encode()
+                            ).hexdigest(),
+                            contract_name=result["contract_name"],
+                            is_proxy=result["is_proxy"],
+                        )
+                        for result in results
+                    ],
+                    on_conflict=["network", "address"],
+                    update_fields=[
+                        "is_available",
+                        "code",
+                        "hashed_code",
+                        "contract_name",
+                        "is_proxy",
+                    ],
+                )
+
+            cursor.block_number = block_number
+            await cursor.save(update_fields=["block_number", "updated_at"])
+        return True
+
+    async def run(self, max_blocks: int = MAX_BLOCKS_PER_RUN) -> int:
+        """
+        Index confirmed blocks past the cursor, at most `max_blocks` of them.
+        Returns the number of blocks indexed.
+        """
+        head = await self.web3_client.get_block_number()
+        confirmed = head - self.confirmations
+        cursor = await self.get_cursor(start=confirmed)
+
+        end = min(confirmed, cursor.block_number + max_blocks)
+        started = time.monotonic()
+        indexed = 0
+
+        for start in range(cursor.block_number + 1, end + 1, self.batch_blocks):
+            blocks = list(range(start, min(start + self.batch_blocks, end + 1)))
+            receipts = await self.web3_client.get_blocks_receipts(blocks)
+
+            addresses = self.extract_deployments(
+                receipt for block in receipts for receipt in block
+            )
+            results = await self._lookup(addresses) if addresses else []
+
+            if not await self._write(results, cursor.block_number, blocks[-1]):
+                logfire.warning(f"{self.network} cursor moved by another run, stopping")
+                break
+            cursor.block_number = blocks[-1]
+            indexed += len(blocks)
+
+            logfire.info(
+                f"indexed {self.network} blocks {blocks[0]}-{blocks[-1]}, "
+                f"{len(results)}/{len(addresses)} deployments verified"
+            )
+
+        attributes = {"network": self.network.value}
+        elapsed = time.monotonic() - started
+        if indexed and elapsed > 0:
+            metrics_indexer_throughput.set(indexed / elapsed, attributes=attributes)
+        metrics_indexer_lag.set(confirmed - cursor.block_number, attributes=attributes)
+
+        return indexed
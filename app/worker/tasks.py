@@ -1,63 +1,45 @@
-import asyncio
+import os
 from datetime import datetime
+from typing import Optional
 
-import httpx
 import logfire
+from openai import AsyncOpenAI
+from tortoise import timezone
 
-from app.api.blockchain.service import BlockchainService
-from app.db.models import Audit, Auth, Contract, Transaction
-from app.lib.clients import Web3Client
+from app.db.models import Audit, Auth, IntermediateResponse, Transaction
 from app.utils.types.enums import (
     AppTypeEnum,
+    AuditPriorityEnum,
     AuditStatusEnum,
     ClientTypeEnum,
-    ContractMethodEnum,
     NetworkEnum,
     TransactionTypeEnum,
 )
 
+from .pipelines.audit_batch import BatchPipeline
 from .pipelines.audit_generation import LlmPipeline
+from .pipelines.deployment_indexer import DeploymentIndexer
 
+# publish step events, and stream candidate output, to websocket subscribers.
+PUBLISH_AUDIT_EVENTS = os.getenv("PUBLISH_AUDIT_EVENTS", "false").lower() == "true"
+
+# if set, the reviewer starts once this many candidates succeed, or the deadline
+# passes, instead of waiting on the slowest candidate.
+CANDIDATE_QUORUM = os.getenv("CANDIDATE_QUORUM")
+CANDIDATE_DEADLINE_SECONDS = os.getenv("CANDIDATE_DEADLINE_SECONDS")
+
+# sources at least this large are audited in chunks.
+CHUNKED_AUDIT_MIN_CHARS = int(os.getenv("CHUNKED_AUDIT_MIN_CHARS", 40_000))
 
-async def handle_eval(audit_id: str):
-    now = datetime.now()
-    audit = await Audit.get(id=audit_id).select_related("contract")
 
+async def charge_for_audit(audit: Audit, cost: int) -> None:
     if audit.app_id:
         caller_auth = await Auth.get(app_id=audit.app_id).select_related("app__owner")
     else:
         caller_auth = await Auth.get(user_id=audit.user_id).select_related("user")
 
-    pipeline = LlmPipeline(
-        audit=audit,
-        should_publish=False,
-    )
-
-    audit.status = AuditStatusEnum.PROCESSING
-    await audit.save()
-
-    try:
-        await pipeline.generate_candidates()
-        result = await pipeline.generate_report()
-
-        await pipeline.write_results(
-            response=result,
-            status=AuditStatusEnum.SUCCESS,
-            processing_time_seconds=(datetime.now() - now).seconds,
-        )
-    except Exception as err:
-        logfire.exception(str(err), **{"audit_id": str(audit.id)})
-        await pipeline.write_results(
-            response=None,
-            status=AuditStatusEnum.FAILED,
-            processing_time_seconds=(datetime.now() - now).seconds,
-        )
-        raise err
-
     # NOTE: could remove this if condition in the future. Free via the app.
 
-    cost = pipeline.usage.get_cost()
-
     transaction = Transaction(
         app_id=audit.app_id,
         user_id=audit.user_id,
@@ -99,61 +81,115 @@ async def handle_eval(audit_id: str):
             await user.save()
             await transaction.save()
 
+
+async def handle_eval(
+    audit_id: str,
+    use_cache: bool = True,
+    priority: AuditPriorityEnum = AuditPriorityEnum.REALTIME,
+):
+    now = datetime.now()
+    audit = await Audit.get(id=audit_id).select_related("contract")
+
+    if priority == AuditPriorityEnum.BATCH:
+        pipeline = BatchPipeline(audit=audit)
+    else:
+        pipeline = LlmPipeline(
+            audit=audit,
+            should_publish=PUBLISH_AUDIT_EVENTS,
+            quorum=int(CANDIDATE_QUORUM) if CANDIDATE_QUORUM else None,
+            deadline_seconds=(
+                float(CANDIDATE_DEADLINE_SECONDS)
+                if CANDIDATE_DEADLINE_SECONDS
+                else None
+            ),
+            chunked=len(audit.contract.code or "") >= CHUNKED_AUDIT_MIN_CHARS,
+        )
+
+    try:
+        audit.status = AuditStatusEnum.PROCESSING
+        audit.result_key = await pipeline.get_result_key()
+        await audit.save()
+
+        cached_audit = None
+        if use_cache:
+            cached_audit = await pipeline.find_cached_result()
+
+        if cached_audit:
+            logfire.info(
+                "reusing result of an identical audit",
+                **{"audit_id": str(audit.id), "source_audit_id": str(cached_audit.id)},
+            )
+            await pipeline.copy_results(
+                source=cached_audit,
+                processing_time_seconds=(datetime.now() - now).seconds,
+            )
+        elif isinstance(pipeline, BatchPipeline):
+            await pipeline.submit_candidates()
+            # handle_batches completes the audit, and charges for it.
+            return {"audit_id": audit_id, "audit_status": audit.status}
+        else:
+            await pipeline.generate_candidates()
+            result = await pipeline.generate_report()
+
+            await pipeline.write_results(
+                response=result,
+                status=AuditStatusEnum.SUCCESS,
+                processing_time_seconds=(datetime.now() - now).seconds,
+            )
+    except Exception as err:
+        logfire.exception(str(err), **{"audit_id": str(audit.id)})
+        await pipeline.write_results(
+            response=None,
+            status=AuditStatusEnum.FAILED,
+            processing_time_seconds=(datetime.now() - now).seconds,
+        )
+        raise err
+
+    await charge_for_audit(audit, pipeline.get_cost())
+
     return {"audit_id": audit_id, "audit_status": audit.status}
 
 
-async def get_deployment_contracts(network: NetworkEnum):
-    logfire.info(f"RUNNING contract scan for {network}")
-    web3_client = Web3Client()
-    current_block = await web3_client.get_block_number()
-    logfire.info(f"Network: {network} --- Current block: {current_block}")
-    receipts = await web3_client.get_block_receipts(current_block)
-
-    logfire.info(f"RECEIPTS FOUND {len(receipts)}")
-
-    deployment_addresses = []
-    for receipt in receipts:
-        if not receipt["to"]:
-            logs = receipt["logs"]
-            if logs:
-                initial_log = logs[0]
-                address = initial_log["address"]
-                deployment_addresses.append(address)
-
-    logfire.info(f"DEPLOYMENT ADDRESSES {deployment_addresses}")
-
-    if not deployment_addresses:
-        logfire.info("no deployment addresses found")
-        return
-
-    tasks = []
-    blockchain_service = BlockchainService()
-    async with httpx.AsyncClient() as client:
-        for address in deployment_addresses:
-            tasks.append(
-                asyncio.create_task(
-                    blockchain_service.get_source_code(
-                        client, address=address, network=network
-                    )
-                )
+async def handle_batches(client: Optional[AsyncOpenAI] = None):
+    """Move batch priority audits along, once their submitted batches complete"""
+    submitted = (
+        await IntermediateResponse.filter(
+            status=AuditStatusEnum.PROCESSING, batch_id__isnull=False
+        )
+        .distinct()
+        .values_list("audit_id", "batch_id")
+    )
+
+    for audit_id, batch_id in submitted:
+        audit = await Audit.get(id=audit_id).select_related("contract")
+        pipeline = BatchPipeline(audit=audit, client=client)
+
+        try:
+            report = await pipeline.poll(batch_id)
+            if report is None:
+                continue
+
+            await pipeline.write_results(
+                response=report,
+                status=AuditStatusEnum.SUCCESS,
+                processing_time_seconds=(timezone.now() - audit.created_at).seconds,
             )
-        results: list[dict] = await asyncio.gather(*tasks)
-
-    logfire.info(f"RESULTS {results}")
-
-    to_create = []
-    for result in results:
-        if result["found"]:
-            if result["has_source_code"]:
-                obj = {
-                    "method": ContractMethodEnum.SCAN,
-                    "address": address,
-                    "is_available": result["has_source_code"],
-                    "network": result["network"],
-                    "code": result["source_code"],
-                }
-                to_create.append(obj)
-
-    if to_create:
-        await Contract.bulk_create(objects=to_create)
-    logfire.info(f"Added {len(to_create)} contracts from {network}")
+        except Exception as err:
+            logfire.exception(str(err), **{"audit_id": str(audit.id)})
+            await pipeline.write_results(
+                response=None,
+                status=AuditStatusEnum.FAILED,
+                processing_time_seconds=(timezone.now() - audit.created_at).seconds,
+            )
+            continue
+
+        await charge_for_audit(audit, pipeline.get_cost())
+
+
+async def index_deployments(network: NetworkEnum, from_block: Optional[int] = None):
+    indexer = DeploymentIndexer(network=network)
+    if from_block is not None:
+        await indexer.backfill(from_block)
+
+    indexed = await indexer.run()
+    logfire.info(f"indexed {indexed} blocks on {network}")
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Compares the solidity pre-processor against the chained regex rewrites it
+replaced, on preprocessing throughput and on how many contracts then parse
+without syntax errors.
+
+The corpus is either a directory of .sol files, or the verified contracts
+already stored in the database:
+
+    python scripts/benchmark-preprocessor.py --dir ./corpus
+    python scripts/benchmark-preprocessor.py --limit 200
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+# Add the parent directory to Python path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# flake8: noqa: E402
+from antlr4 import CommonTokenStream, InputStream
+from solidity_parser.parser import AstVisitor, SolidityLexer, SolidityParser
+from tortoise import Tortoise
+
+from app.config import TORTOISE_ORM
+from app.db.models import Contract
+from app.utils.helpers.solidity_preprocessor import preprocess
+
+
+def legacy_preprocess(code: str) -> str:
+    """SourceCodeParser.generate_ast's rewrites before the pre-processor"""
+    code = code.replace("\\'", "___SINGLE_QUOTE___")
+    code = code.replace('\\"', "___DOUBLE_QUOTE___")
+
+    code = code.replace("\\n", "\n")
+    code = code.replace("\\t", "\t")
+    code = code.replace("\\r", "\r")
+    code = code.replace("\r\n", "\n")
+
+    code = re.sub(
+        r"(\w+(?:\.\w+)*){value:\s*([^}]+)}(\([^)]*\))",
+        r"\1\3 /* value: \2 */",
+        code,
+    )
+
+    code = re.sub(r"assembly\s*{[^}]*}", "", code, flags=re.DOTALL)
+
+    code = re.sub(r"\b(\w+)\s+storage\s+\$\s*=\s*\w+\(\);", "", code)
+    code = re.sub(r"\$\.(\w+)", r"\1", code)
+
+    code = re.sub(r"revert\s+(\w+)\(([^)]*)\);", r'require(false, "\1 error");', code)
+
+    code = code.replace("___SINGLE_QUOTE___", "'")
+    code = code.replace("___DOUBLE_QUOTE___", '"')
+    if code.startswith("\ufeff"):
+        code = code[1:]
+    return code
+
+
+def parses(code: str) -> bool:
+    lexer = SolidityLexer(InputStream(code))
+    lexer.removeErrorListeners()
+    parser = SolidityParser(CommonTokenStream(lexer))
+    parser.removeErrorListeners()
+
+    try:
+        AstVisitor().visit(parser.sourceUnit())
+    except Exception:
+        return False
+    return parser.getNumberOfSyntaxErrors() == 0
+
+
+async def load_corpus(directory: str | None, limit: int) -> list[str]:
+    if directory:
+        paths = sorted(Path(directory).rglob("*.sol"))[:limit]
+        return [path.read_text(errors="ignore") for path in paths]
+
+    await Tortoise.init(config=TORTOISE_ORM)
+    try:
+        contracts = (
+            await Contract.filter(is_available=True, code__isnull=False)
+            .order_by("-created_at")
+            .limit(limit)
+            .values_list("code", flat=True)
+        )
+    finally:
+        await Tortoise.close_connections()
+    return list(contracts)
+
+
+def benchmark(name: str, fn, corpus: list[str]) -> None:
+    started = time.perf_counter()
+    processed = [fn(code) for code in corpus]
+    elapsed = time.perf_counter() - started
+
+    size = sum(len(code) for code in corpus) / 1_000_000
+    succeeded = sum(parses(code) for code in processed)
+
+    print(
+        f"{name:<8} {size / elapsed:8.2f} MB/s  "
+        f"{succeeded}/{len(corpus)} parsed ({succeeded / len(corpus):.1%})"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dir", help="directory of .sol files, instead of the db")
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    corpus = asyncio.run(load_corpus(args.dir, args.limit))
+    if not corpus:
+        print("corpus is empty")
+        return 1
+
+    print(f"{len(corpus)} contracts, {sum(map(len, corpus)) / 1_000_000:.2f} MB")
+    benchmark("legacy", legacy_preprocess, corpus)
+    benchmark("current", preprocess, corpus)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import json
+import time
+from email.parser import BytesParser
+from email.policy import default
+from typing import Callable
+from uuid import uuid4
+
+import httpx
+from openai import AsyncOpenAI
+
+
+class OpenAIBatchStub:
+    """
+    Stands in for the OpenAI files and batches endpoints. Batches stay in progress
+    until `complete` is called with a function producing each response's content.
+    """
+
+    def __init__(self):
+        self.files: dict[str, bytes] = {}
+        self.batches: dict[str, dict] = {}
+
+    def client(self) -> AsyncOpenAI:
+        return AsyncOpenAI(
+            api_key="fake-key",
+            base_url="http://openai.stub/v1",
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(self.handle)),
+        )
+
+    def requests(self, batch_id: str) -> list[dict]:
+        content = self.files[self.batches[batch_id]["input_file_id"]]
+        return [json.loads(line) for line in content.decode().splitlines()]
+
+    def complete(self, batch_id: str, respond: Callable[[dict], str]) -> None:
+        lines = []
+        for request in self.requests(batch_id):
+            body = {
+                "choices": [
+                    {"message": {"role": "assistant", "content": respond(request)}}
+                ],
+                "usage": {"prompt_tokens": 1_000, "completion_tokens": 500},
+            }
+            lines.append(
+                {
+                    "custom_id": request["custom_id"],
+                    "response": {"status_code": 200, "body": body},
+                    "error": None,
+                }
+            )
+
+        file_id = self._add_file("\n".join(json.dumps(line) for line in lines).encode())
+        self.batches[batch_id].update(status="completed", output_file_id=file_id)
+
+    def _add_file(self, content: bytes) -> str:
+        file_id = f"file-{uuid4().hex}"
+        self.files[file_id] = content
+        return file_id
+
+    def _file(self, file_id: str) -> dict:
+        return {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(self.files[file_id]),
+            "created_at": int(time.time()),
+            "filename": f"{file_id}.jsonl",
+            "purpose": "batch",
+            "status": "processed",
+        }
+
+    def _upload(self, request: httpx.Request) -> bytes:
+        headers = f"Content-Type: {request.headers['content-type']}\r\n\r\n".encode()
+        message = BytesParser(policy=default).parsebytes(headers + request.content)
+        for part in message.iter_parts():
+            if part.get_param("name", header="content-disposition") == "file":
+                content = part.get_content()
+                return content if isinstance(content, bytes) else content.encode()
+        raise ValueError("no file uploaded")
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path.removeprefix("/v1")
+
+        if request.method == "POST" and path == "/files":
+            file_id = self._add_file(self._upload(request))
+            return httpx.Response(200, json=self._file(file_id))
+
+        if request.method == "GET" and path.startswith("/files/"):
+            file_id = path.split("/")[2]
+            return httpx.Response(200, content=self.files[file_id])
+
+        if request.method == "POST" and path == "/batches":
+            body = json.loads(request.content)
+            batch_id = f"batch_{uuid4().hex}"
+            self.batches[batch_id] = {
+                "id": batch_id,
+                "object": "batch",
+                "endpoint": body["endpoint"],
+                "input_file_id": body["input_file_id"],
+                "completion_window": body["completion_window"],
+                "metadata": body.get("metadata"),
+                "status": "in_progress",
+                "output_file_id": None,
+                "created_at": int(time.time()),
+            }
+            return httpx.Response(200, json=self.batches[batch_id])
+
+        if request.method == "GET" and path.startswith("/batches/"):
+            batch_id = path.split("/")[2]
+            return httpx.Response(200, json=self.batches[batch_id])
+
+        return httpx.Response(404, json={"error": {"message": f"{path} not stubbed"}})
@@ -1,10 +1,21 @@
+from unittest.mock import patch
+
 import pytest
 import pytest_asyncio
+from fakeredis import FakeAsyncRedis
 
+from app.api.admin.interface import CreatePromptBody, UpdatePromptBody
+from app.api.admin.service import AdminService
 from app.api.auth.service import AuthService
 from app.api.user.service import UserService
-from app.db.models import Auth, Permission
-from app.utils.types.enums import AuthScopeEnum, ClientTypeEnum, RoleEnum
+from app.db.models import Auth, Permission, Prompt
+from app.lib.prompts import PromptRegistry
+from app.utils.types.enums import (
+    AuditTypeEnum,
+    AuthScopeEnum,
+    ClientTypeEnum,
+    RoleEnum,
+)
 from app.utils.types.shared import AuthState
 from tests.constants import FIRST_PARTY_APP_API_KEY
 
@@ -115,3 +126,51 @@ async def test_fail_if_not_admin(
         },
     )
     assert response.status_code == 200
+
+
+@pytest.mark.anyio
+async def test_prompt_registry_versioning():
+    """
+    Prompts are served from memory, and only reloaded once an admin edit bumps
+    the version
+    """
+    registry = PromptRegistry(redis=FakeAsyncRedis())
+    admin_service = AdminService()
+
+    with patch("app.api.admin.service.prompt_registry", registry):
+        prompt = await admin_service.add_prompt(
+            CreatePromptBody(
+                audit_type=AuditTypeEnum.SECURITY,
+                tag="registry-test",
+                content="v1",
+                version="0.1",
+                is_active=True,
+            )
+        )
+
+        cached = await registry.get(AuditTypeEnum.SECURITY, "registry-test")
+        assert cached.content == "v1"
+        assert cached in await registry.get_candidates(AuditTypeEnum.SECURITY)
+        assert cached not in await registry.get_candidates(AuditTypeEnum.GAS)
+
+        # edits that skip the admin service aren't seen, and don't cause a reload.
+        await Prompt.filter(id=prompt.id).update(content="v2")
+        registry._checked_at = 0
+        with patch.object(registry, "_load", side_effect=AssertionError("reloaded")):
+            cached = await registry.get(AuditTypeEnum.SECURITY, "registry-test")
+        assert cached.content == "v1"
+
+        await admin_service.update_prompt(
+            str(prompt.id), UpdatePromptBody(content="v3")
+        )
+        registry._checked_at = 0
+        cached = await registry.get(AuditTypeEnum.SECURITY, "registry-test")
+        assert cached.content == "v3"
+
+        await admin_service.update_prompt(
+            str(prompt.id), UpdatePromptBody(is_active=False)
+        )
+        registry._checked_at = 0
+        assert await registry.get(AuditTypeEnum.SECURITY, "registry-test") is None
+
+    await prompt.delete()
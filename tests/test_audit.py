@@ -1,7 +1,12 @@
+import asyncio
+import json
 from unittest.mock import AsyncMock, MagicMock, patch
+from uuid import uuid4
 
 import pytest
 import pytest_asyncio
+from fakeredis import FakeAsyncRedis
+from pydantic_ai.models.test import TestModel
 
 from app.api.audit.interface import CreateEvalResponse, EvalBody
 from app.api.audit.service import AuditService
@@ -12,11 +17,18 @@ from app.db.models import (
     Auth,
     Contract,
     Finding,
+    IntermediateResponse,
     Permission,
     Prompt,
     User,
 )
+from app.lib.clients.llm import agent
+from app.lib.clients.queue import QueueClient, queue_client
+from app.lib.events import JobEventHub, JobEventLog
+from app.lib.prompts import prompt_registry
+from app.utils.helpers.code_chunker import chunk_code
 from app.utils.types.enums import (
+    AuditPriorityEnum,
     AuditStatusEnum,
     AuditTypeEnum,
     ClientTypeEnum,
@@ -25,8 +37,12 @@ from app.utils.types.enums import (
     NetworkEnum,
     RoleEnum,
 )
+from app.utils.types.llm import OutputStructure
 from app.utils.types.shared import AuthState
+from app.worker.pipelines.audit_generation import LlmPipeline
+from app.worker.tasks import handle_batches, handle_eval
 from tests.constants import THIRD_PARTY_APP_API_KEY, USER_API_KEY
+from tests.openai_stub import OpenAIBatchStub
 
 USER_WITH_CREDITS_ADDRESS = "0xuserwithcredits"
 USER_WITH_CREDITS_API_KEY = "user-with-credits-api-key"
@@ -200,11 +216,12 @@ async def test_successfully_creates_audit(user_with_auth_and_credits, async_clie
 
     # Mock the redis pool to avoid actual job enqueuing
     with (
-        patch("app.api.audit.service.create_pool") as mock_create_pool,
+        patch("app.lib.clients.queue.create_pool") as mock_create_pool,
         patch("app.api.audit.service.get_context", return_value=mock_trace_context),
     ):
         mock_redis_pool = MagicMock()
         mock_redis_pool.enqueue_job = AsyncMock()
+        mock_redis_pool.aclose = AsyncMock()
         mock_create_pool.return_value = mock_redis_pool
 
         # Make request to create an audit
@@ -222,7 +239,11 @@ async def test_successfully_creates_audit(user_with_auth_and_credits, async_clie
 
         # Verify redis job was enqueued
         mock_redis_pool.enqueue_job.assert_called_once_with(
-            "process_eval", _job_id=data["id"], trace=mock_trace_context
+            "process_eval",
+            _job_id=data["id"],
+            trace=mock_trace_context,
+            use_cache=True,
+            priority=AuditPriorityEnum.REALTIME,
         )
 
         # Verify audit was created in database
@@ -230,11 +251,34 @@ async def test_successfully_creates_audit(user_with_auth_and_credits, async_clie
         assert audit.contract_id == contract.id
         assert audit.audit_type == AuditTypeEnum.SECURITY
 
+        # release the mocked pool held by the process-wide client.
+        await queue_client.close()
+
     # Clean up
     await contract.delete()
     await audit.delete()
 
 
+@pytest.mark.anyio
+async def test_queue_pool_is_shared():
+    """Every enqueue reuses a single pool, which is closed on shutdown"""
+    with patch("app.lib.clients.queue.create_pool") as mock_create_pool:
+        mock_redis_pool = MagicMock()
+        mock_redis_pool.enqueue_job = AsyncMock()
+        mock_redis_pool.aclose = AsyncMock()
+        mock_create_pool.return_value = mock_redis_pool
+
+        client = QueueClient()
+        await client.enqueue_job("mock")
+        await client.enqueue_job("mock")
+
+        mock_create_pool.assert_called_once()
+        assert mock_redis_pool.enqueue_job.await_count == 2
+
+        await client.close()
+        mock_redis_pool.aclose.assert_awaited_once()
+
+
 class MockQueue:
     def __init__(self):
         self.job = None
@@ -350,6 +394,64 @@ async def test_get_audits(user_with_auth, async_client):
     await contract.delete()
 
 
+@pytest.mark.anyio
+async def test_get_audits_cursor(user_with_auth, async_client):
+    """Following cursors lists the same audits, in the same order, as paging"""
+    contract = await Contract.create(
+        address="0xAUDITCURSOR",
+        network=NetworkEnum.ETH,
+        method=ContractMethodEnum.SCAN,
+        code="contract Test {}",
+    )
+    audits = [
+        await Audit.create(
+            user=user_with_auth,
+            contract=contract,
+            audit_type=AuditTypeEnum.GAS,
+            status=AuditStatusEnum.SUCCESS,
+        )
+        for _ in range(5)
+    ]
+    headers = {"Authorization": f"Bearer {USER_API_KEY}"}
+    filters = "contract_address=0xAUDITCURSOR&page_size=2"
+
+    paged = []
+    for page in range(3):
+        response = await async_client.get(
+            f"/audit/list?{filters}&page={page}", headers=headers
+        )
+        data = response.json()
+        assert data["total_pages"] == 3
+        paged += data["results"]
+
+    followed, cursor = [], ""
+    while True:
+        response = await async_client.get(
+            f"/audit/list?{filters}&include_total=false&cursor={cursor}",
+            headers=headers,
+        )
+        data = response.json()
+        assert data["total_pages"] is None
+        followed += data["results"]
+        if not data["more"]:
+            assert data["next_cursor"] is None
+            break
+        cursor = data["next_cursor"]
+
+    assert followed == paged
+    assert {a["id"] for a in followed} == {str(a.id) for a in audits}
+    assert [a["n"] for a in followed] == list(range(5))
+
+    response = await async_client.get(
+        f"/audit/list?{filters}&cursor=invalid", headers=headers
+    )
+    assert response.status_code == 400
+
+    for audit in audits:
+        await audit.delete()
+    await contract.delete()
+
+
 @pytest.mark.anyio
 async def test_submit_feedback(user_with_auth, async_client):
     """Test submitting feedback for a finding through the API endpoint"""
@@ -450,3 +552,417 @@ async def test_get_audit_with_delegation(user_with_auth, third_party_app, async_
     # Clean up
     await audit.delete()
     await contract.delete()
+
+
+@pytest.mark.anyio
+async def test_reuses_identical_audit(user_with_auth_and_credits, mock_prompts):
+    """
+    An audit of code that was already audited with the same prompts copies the
+    prior result at a discount, unless opted out
+    """
+    prompt_registry.clear()
+
+    contract = await Contract.create(
+        address="0xAUDITCACHED",
+        network=NetworkEnum.ETH,
+        method=ContractMethodEnum.SCAN,
+        code="contract Cached {}",
+    )
+    source = await Audit.create(
+        user_id=user_with_auth_and_credits.id,
+        contract=contract,
+        audit_type=AuditTypeEnum.SECURITY,
+        status=AuditStatusEnum.SUCCESS,
+        raw_output="{}",
+        introduction="cached intro",
+        input_tokens=20_000,
+        output_tokens=5_000,
+    )
+    await Finding.create(
+        audit=source,
+        audit_type=AuditTypeEnum.SECURITY,
+        level=FindingLevelEnum.HIGH,
+        name="cached finding",
+        is_attested=True,
+        feedback="not copied",
+    )
+    source.result_key = await LlmPipeline(source).get_result_key()
+    await source.save()
+    assert source.result_key
+
+    audit = await Audit.create(
+        user_id=user_with_auth_and_credits.id,
+        contract=contract,
+        audit_type=AuditTypeEnum.SECURITY,
+    )
+
+    user = await User.get(id=user_with_auth_and_credits.id)
+    used_credits = user.used_credits
+
+    with patch("app.worker.pipelines.audit_generation.agent") as mock_agent:
+        await handle_eval(str(audit.id))
+        mock_agent.run.assert_not_called()
+
+    audit = await Audit.get(id=audit.id).prefetch_related("findings")
+    assert audit.status == AuditStatusEnum.SUCCESS
+    assert audit.result_key == source.result_key
+    assert audit.introduction == "cached intro"
+    assert len(audit.findings) == 1
+    assert audit.findings[0].name == "cached finding"
+    assert not audit.findings[0].is_attested
+    assert audit.findings[0].feedback is None
+
+    await user.refresh_from_db()
+    assert user.used_credits - used_credits == 10
+
+    # forced re-runs go to the LLM.
+    rerun = await Audit.create(
+        user_id=user_with_auth_and_credits.id,
+        contract=contract,
+        audit_type=AuditTypeEnum.SECURITY,
+    )
+    with patch("app.worker.pipelines.audit_generation.agent") as mock_agent:
+        mock_agent.run = AsyncMock(side_effect=Exception("llm unavailable"))
+        with pytest.raises(NotImplementedError):
+            await handle_eval(str(rerun.id), use_cache=False)
+        mock_agent.run.assert_called()
+
+    rerun = await Audit.get(id=rerun.id)
+    assert rerun.status == AuditStatusEnum.FAILED
+
+    # failing to look up the cache fails the audit, rather than leaving it waiting.
+    unkeyed = await Audit.create(
+        user_id=user_with_auth_and_credits.id,
+        contract=contract,
+        audit_type=AuditTypeEnum.SECURITY,
+    )
+    with patch.object(
+        LlmPipeline, "get_result_key", side_effect=ConnectionError("db down")
+    ):
+        with pytest.raises(ConnectionError):
+            await handle_eval(str(unkeyed.id))
+
+    unkeyed = await Audit.get(id=unkeyed.id)
+    assert unkeyed.status == AuditStatusEnum.FAILED
+
+    await contract.delete()
+
+
+@pytest.mark.anyio
+async def test_streams_candidate_output(mock_prompts):
+    """
+    When publishing, candidate output is forwarded as chunks while it's generated
+    """
+    contract = await Contract.create(
+        address="0xAUDITSTREAM",
+        network=NetworkEnum.ETH,
+        method=ContractMethodEnum.SCAN,
+        code="contract Streamed {}",
+    )
+    audit = await Audit.create(contract=contract, audit_type=AuditTypeEnum.GAS)
+    prompt = await Prompt.filter(audit_type=AuditTypeEnum.GAS, tag="test-1").first()
+
+    pipeline = LlmPipeline(audit=audit, should_publish=True)
+    pipeline.STREAM_DEBOUNCE_SECONDS = None
+
+    event_log = JobEventLog(redis=FakeAsyncRedis())
+
+    output = "no gas optimizations were found"
+    with (
+        agent.override(model=TestModel(custom_result_text=output)),
+        patch("app.worker.pipelines.audit_generation.job_event_log", event_log),
+    ):
+        await pipeline._generate_candidate(prompt)
+
+    events = await event_log.read(str(audit.id))
+    assert events[0]["status"] == "start"
+    assert events[-1]["status"] == "done"
+
+    chunks = [event["data"] for event in events if event["status"] == "chunk"]
+    assert len(chunks) > 1
+    assert "".join(chunks) == output
+
+    assert output in pipeline.candidate_responses
+    assert pipeline.usage.output_tokens > 0
+
+    checkpoint = await IntermediateResponse.get(audit_id=audit.id, prompt_id=prompt.id)
+    assert checkpoint.status == AuditStatusEnum.SUCCESS
+    assert checkpoint.result == output
+
+    await contract.delete()
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(
+    "options", [{"quorum": 1}, {"deadline_seconds": 0.2}], ids=["quorum", "deadline"]
+)
+async def test_candidate_quorum(mock_prompts, options):
+    """
+    The reviewer doesn't wait on stragglers once the quorum or deadline is met
+    """
+    prompt_registry.clear()
+
+    contract = await Contract.create(
+        address="0xAUDITQUORUM",
+        network=NetworkEnum.ETH,
+        method=ContractMethodEnum.SCAN,
+        code="contract Quorum {}",
+    )
+    audit = await Audit.create(contract=contract, audit_type=AuditTypeEnum.GAS)
+    pipeline = LlmPipeline(audit=audit, **options)
+
+    async def run_candidate(prompt: Prompt):
+        if prompt.tag == "test-2":
+            await asyncio.sleep(30)
+        return f"{prompt.tag} output", MagicMock(request_tokens=1, response_tokens=1)
+
+    with patch.object(pipeline, "_run_candidate", side_effect=run_candidate):
+        await asyncio.wait_for(pipeline.generate_candidates(), timeout=5)
+
+    assert "test-1 output" in pipeline.candidate_responses
+    assert "test-2 output" not in pipeline.candidate_responses
+
+    steps = {
+        step.step: step.status
+        for step in await IntermediateResponse.filter(audit_id=audit.id)
+    }
+    assert steps == {
+        "test-1": AuditStatusEnum.SUCCESS,
+        "test-2": AuditStatusEnum.CANCELLED,
+    }
+
+    await contract.delete()
+
+
+def test_chunk_code():
+    """
+    Multi-file sources are split by file, dropping libraries and duplicate files
+    """
+    token = "contract Token {\n    uint256 supply;\n}"
+    code = "\n\n".join(
+        [
+            "// File: @openzeppelin/contracts/token/ERC20/ERC20.sol",
+            "contract ERC20 {}",
+            "// File: src/Token.sol",
+            token,
+            "// File: src/vendored/Token.sol",
+            token,
+            "// File: src/Vault.sol",
+            "library Math {}\n\ncontract Vault {}",
+        ]
+    )
+
+    chunks = chunk_code(code, max_chars=80)
+    assert chunks == [
+        f"// File: src/Token.sol\n\n{token}",
+        "// File: src/Vault.sol\n\nlibrary Math {}\n\ncontract Vault {}",
+    ]
+
+    # files too large for a chunk are split on their definitions.
+    chunks = chunk_code(code, max_chars=30)
+    assert chunks[1:] == [
+        "// File: src/Vault.sol\n\nlibrary Math {}",
+        "// File: src/Vault.sol\n\ncontract Vault {}",
+    ]
+
+    # single files are passed through.
+    assert chunk_code(token) == [token]
+
+
+@pytest.mark.anyio
+async def test_chunked_candidates(mock_prompts):
+    """
+    In chunked mode, each candidate runs per chunk and the findings are merged
+    """
+    contract = await Contract.create(
+        address="0xAUDITCHUNKED",
+        network=NetworkEnum.ETH,
+        method=ContractMethodEnum.SCAN,
+        code="// File: src/A.sol\n\ncontract A {}\n\n// File: src/B.sol\n\ncontract B {}",
+    )
+    audit = await Audit.create(contract=contract, audit_type=AuditTypeEnum.GAS)
+    audit = await Audit.get(id=audit.id).select_related("contract")
+
+    pipeline = LlmPipeline(audit=audit, chunked=True)
+    pipeline.chunks = chunk_code(contract.code, max_chars=30)
+    assert len(pipeline.chunks) == 2
+
+    prompt = await Prompt.filter(audit_type=AuditTypeEnum.GAS, tag="test-1").first()
+    with agent.override(model=TestModel(custom_result_text="no findings")):
+        assert await pipeline._generate_candidate(prompt)
+
+    checkpoint = await IntermediateResponse.get(audit_id=audit.id, prompt_id=prompt.id)
+    assert checkpoint.result == "Part 1 of 2:\nno findings\n\nPart 2 of 2:\nno findings"
+    assert checkpoint.result in pipeline.candidate_responses
+    assert pipeline.usage.input_tokens > 0
+
+    await contract.delete()
+
+
+@pytest.mark.anyio
+async def test_batch_audit(user_with_auth_and_credits, mock_prompts):
+    """
+    Batch priority audits are submitted to the batch API, then completed as
+    batches finish
+    """
+    prompt_registry.clear()
+    stub = OpenAIBatchStub()
+    client = stub.client()
+
+    contract = await Contract.create(
+        address="0xAUDITBATCH",
+        network=NetworkEnum.ETH,
+        method=ContractMethodEnum.SCAN,
+        code="contract Batched {}",
+    )
+    audit = await Audit.create(
+        user_id=user_with_auth_and_credits.id,
+        contract=contract,
+        audit_type=AuditTypeEnum.SECURITY,
+    )
+
+    user = await User.get(id=user_with_auth_and_credits.id)
+    used_credits = user.used_credits
+
+    report = OutputStructure(
+        introduction="batched intro",
+        scope="scope",
+        findings={
+            "critical": [],
+            "high": [
+                {
+                    "name": "batched finding",
+                    "explanation": "explanation",
+                    "recommendation": "recommendation",
+                    "reference": "reference",
+                }
+            ],
+            "medium": [],
+            "low": [],
+        },
+        conclusion="conclusion",
+    )
+
+    def respond(request: dict) -> str:
+        if "response_format" in request["body"]:
+            return report.model_dump_json()
+        return "candidate findings"
+
+    async def steps() -> dict:
+        return {
+            step.step: step
+            for step in await IntermediateResponse.filter(audit_id=audit.id)
+        }
+
+    with patch("app.worker.pipelines.audit_batch.llm_client", client):
+        await handle_eval(str(audit.id), priority=AuditPriorityEnum.BATCH)
+
+        candidates = await steps()
+        assert set(candidates) == {"test-1", "test-2"}
+        assert {step.status for step in candidates.values()} == {
+            AuditStatusEnum.PROCESSING
+        }
+        batch_id = candidates["test-1"].batch_id
+        assert batch_id == candidates["test-2"].batch_id
+        requests = stub.requests(batch_id)
+        assert len(requests) == 2
+        assert requests[0]["body"]["messages"][1]["content"] == "contract Batched {}"
+
+        # nothing changes until the batch completes.
+        await handle_batches()
+        assert (await Audit.get(id=audit.id)).status == AuditStatusEnum.PROCESSING
+
+        stub.complete(batch_id, respond)
+        await handle_batches()
+
+        candidates = await steps()
+        assert candidates["test-1"].status == AuditStatusEnum.SUCCESS
+        assert candidates["test-1"].result == "candidate findings"
+        assert candidates["reviewer"].status == AuditStatusEnum.PROCESSING
+
+        reviewer_batch_id = candidates["reviewer"].batch_id
+        stub.complete(reviewer_batch_id, respond)
+        await handle_batches()
+
+    audit = await Audit.get(id=audit.id).prefetch_related("findings")
+    assert audit.status == AuditStatusEnum.SUCCESS
+    assert audit.introduction == "batched intro"
+    assert [finding.name for finding in audit.findings] == ["batched finding"]
+    assert audit.input_tokens == 3_000
+    assert audit.output_tokens == 1_500
+
+    await user.refresh_from_db()
+    assert user.used_credits - used_credits == 50
+
+    await contract.delete()
+
+
+def parse_sse(body: str) -> list[tuple[str | None, dict]]:
+    frames = []
+    for frame in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in frame.splitlines())
+        frames.append((fields.get("id"), json.loads(fields["data"])))
+    return frames
+
+
+@pytest.mark.anyio
+async def test_get_audit_events(user_with_auth, async_client):
+    """
+    Events stream until the audit's own event, and resume after Last-Event-ID.
+    A finished audit without logged events gets its final status
+    """
+    user = await User.get(id=user_with_auth.id)
+    contract = await Contract.create(
+        address="0xAUDITEVENTS",
+        network=NetworkEnum.ETH,
+        method=ContractMethodEnum.SCAN,
+        code="contract Events {}",
+    )
+    audit = await Audit.create(
+        user=user,
+        contract=contract,
+        audit_type=AuditTypeEnum.GAS,
+        status=AuditStatusEnum.PROCESSING,
+    )
+    job_id = str(audit.id)
+    hub = JobEventHub(redis=FakeAsyncRedis())
+
+    event = {"type": "eval", "job_id": job_id}
+    started = await hub.event_log.publish(
+        job_id, {**event, "name": "test-1", "status": "start"}
+    )
+    await hub.event_log.publish(job_id, {**event, "name": "test-1", "status": "done"})
+    await hub.event_log.publish(job_id, {**event, "name": "audit", "status": "success"})
+
+    headers = {"Authorization": f"Bearer {USER_API_KEY}"}
+    with patch("app.api.audit.service.job_event_hub", hub):
+        response = await async_client.get(f"/audit/{job_id}/events", headers=headers)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+
+        frames = parse_sse(response.text)
+        assert [data["status"] for _, data in frames] == ["start", "done", "success"]
+        assert frames[0][0] == started
+
+        response = await async_client.get(
+            f"/audit/{job_id}/events", headers={**headers, "Last-Event-ID": started}
+        )
+        assert parse_sse(response.text) == frames[1:]
+
+        # nothing is logged for this one.
+        audit.status = AuditStatusEnum.FAILED
+        await audit.save()
+        await hub.redis.flushall()
+
+        response = await async_client.get(f"/audit/{job_id}/events", headers=headers)
+        assert parse_sse(response.text) == [
+            (None, {**event, "name": "audit", "status": "failed"})
+        ]
+
+        response = await async_client.get(f"/audit/{uuid4()}/events", headers=headers)
+        assert response.status_code == 404
+
+    assert not hub.subscribers
+
+    await audit.delete()
+    await contract.delete()
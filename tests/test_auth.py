@@ -1,11 +1,21 @@
 import pytest
+from fakeredis import FakeAsyncRedis
 from fastapi import HTTPException, Request, status
 from fastapi.security import HTTPAuthorizationCredentials
 
+from app.api.auth.cache import auth_cache
+from app.api.auth.service import AuthService
 from app.api.blockchain.service import BlockchainService
 from app.api.dependencies import Authentication
-from app.db.models import Auth, Transaction, User
-from app.utils.types.enums import ClientTypeEnum, RoleEnum, TransactionTypeEnum
+from app.db.models import Auth, Permission, Transaction, User
+from app.lib.cache import TieredCache
+from app.utils.types.enums import (
+    AuthScopeEnum,
+    ClientTypeEnum,
+    RoleEnum,
+    TransactionTypeEnum,
+)
+from app.utils.types.shared import AuthState
 from tests.constants import (
     FIRST_PARTY_APP_API_KEY,
     THIRD_PARTY_APP_API_KEY,
@@ -512,3 +522,95 @@ async def test_credit_sync_mocked(async_client, monkeypatch):
     await user.delete()
     # confirm cascading
     assert not await Auth.exists(user_id=user_id)
+
+
+@pytest.mark.anyio
+async def test_tiered_cache():
+    """
+    Values are served from the local tier, fall back to redis, and deletes clear both
+    """
+    cache = TieredCache(namespace="test", redis=FakeAsyncRedis())
+
+    assert await cache.get("key") is None
+
+    await cache.set("key", {"value": 1})
+    assert cache.local.get("key") == {"value": 1}
+
+    # a different process (empty local tier) is still served from redis.
+    cache.local.clear()
+    assert await cache.get("key") == {"value": 1}
+    assert cache.local.get("key") == {"value": 1}
+
+    await cache.delete("key")
+    assert cache.local.get("key") is None
+    assert await cache.redis.get("test|key") is None
+
+
+@pytest.mark.anyio
+async def test_auth_cache_resolves_without_db(user_with_auth):
+    """
+    Once resolved, an API key is served from the cache until it's invalidated
+    """
+    hashed_key = Auth.hash_key(USER_API_KEY)
+    cached = await auth_cache.get_auth(hashed_key)
+    assert cached.user_id == user_with_auth.id
+    assert cached.scope == AuthScopeEnum.WRITE
+
+    auth = await Auth.get(hashed_key=hashed_key)
+    auth.scope = AuthScopeEnum.READ
+    await auth.save()
+
+    cached = await auth_cache.get_auth(hashed_key)
+    assert cached.scope == AuthScopeEnum.WRITE
+
+    await auth_cache.invalidate_auth(auth)
+    cached = await auth_cache.get_auth(hashed_key)
+    assert cached.scope == AuthScopeEnum.READ
+
+    auth.scope = AuthScopeEnum.WRITE
+    await auth.save()
+    await auth_cache.invalidate_auth(auth)
+
+
+@pytest.mark.anyio
+async def test_auth_cache_invalidated_on_rotation(async_client):
+    """
+    Regenerating an API key must immediately invalidate the previous key
+    """
+    user = await User.create(address="0xrotation")
+    await Permission.create(
+        client_type=ClientTypeEnum.USER, user=user, can_create_api_key=True
+    )
+
+    auth_service = AuthService()
+    mock_auth_state = AuthState(
+        user_id=user.id,
+        consumes_credits=True,
+        credit_consumer_user_id=user.id,
+        role=RoleEnum.USER,
+    )
+
+    old_key = await auth_service.generate(
+        auth_obj=mock_auth_state, client_type=ClientTypeEnum.USER
+    )
+
+    response = await async_client.get(
+        "/user/info", headers={"Authorization": f"Bearer {old_key}"}
+    )
+    assert response.status_code == 200
+
+    new_key = await auth_service.generate(
+        auth_obj=mock_auth_state, client_type=ClientTypeEnum.USER
+    )
+
+    response = await async_client.get(
+        "/user/info", headers={"Authorization": f"Bearer {old_key}"}
+    )
+    assert response.status_code == 401
+
+    response = await async_client.get(
+        "/user/info", headers={"Authorization": f"Bearer {new_key}"}
+    )
+    assert response.status_code == 200
+
+    await user.delete()
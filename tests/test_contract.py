@@ -1,17 +1,37 @@
+import asyncio
+import hashlib
 import json
 from unittest.mock import AsyncMock, patch
 
 import pytest
 import pytest_asyncio
 from httpx import Request, Response
+from solidity_parser import parser as solidity_parser
 
 from app.api.auth.service import AuthService
+from app.api.blockchain.cache import source_code_cache
+from app.api.blockchain.service import BlockchainService
 from app.api.contract.interface import ContractScanBody
+from app.api.contract.service import ContractService
 from app.api.user.service import UserService
-from app.db.models import Auth, Contract, Permission
-from app.lib.clients import ExplorerClient
-from app.utils.types.enums import ClientTypeEnum, NetworkEnum, RoleEnum
+from app.db.models import Auth, Contract, ContractAnalysis, IndexerCursor, Permission
+from app.lib.clients import ExplorerClient, Web3Client
+from app.lib.parser_pool import parser_pool
+from app.utils.helpers.code_parser import (
+    SourceCodeParser,
+    analyze_source,
+    decompress_ast,
+)
+from app.utils.helpers.solidity_preprocessor import preprocess, tokenize
+from app.utils.helpers.static_analysis import analyze_ast, summarize
+from app.utils.types.enums import (
+    ClientTypeEnum,
+    ContractMethodEnum,
+    NetworkEnum,
+    RoleEnum,
+)
 from app.utils.types.shared import AuthState
+from app.worker.pipelines.deployment_indexer import DeploymentIndexer
 from tests.constants import USER_API_KEY
 
 USER_WITH_CREDITS_ADDRESS = "0xuserwithcredits"
@@ -177,7 +197,7 @@ async def test_contract_scan_clean(user_with_auth, async_client):
     ADDRESS = "0xfakeaddress"
     async_mock = AsyncMock()
 
-    async def mock_get_source_code(self, client, network, address):
+    async def mock_get_source_code(self, network, address):
         request = Request("GET", "https://mocked.url")
         if network == NetworkEnum.ETH:
             return Response(
@@ -254,6 +274,8 @@ async def test_contract_scan_clean(user_with_auth, async_client):
     assert should_not_exist is None
 
     await Contract.filter(address=ADDRESS).delete()
+    for network in NetworkEnum:
+        await source_code_cache.invalidate(network, ADDRESS)
 
 
 @pytest.mark.anyio
@@ -266,7 +288,7 @@ async def test_contract_scan_multiple_found(user_with_auth, async_client):
     ADDRESS = "0xfakeaddress"
     async_mock = AsyncMock()
 
-    async def mock_get_source_code(self, client, network, address):
+    async def mock_get_source_code(self, network, address):
         request = Request("GET", "https://mocked.url")
         if network in [NetworkEnum.ETH, NetworkEnum.ARB]:
             return Response(
@@ -328,6 +350,8 @@ async def test_contract_scan_multiple_found(user_with_auth, async_client):
     assert non_eth_contract is None
 
     await Contract.filter(address=ADDRESS).delete()
+    for network in NetworkEnum:
+        await source_code_cache.invalidate(network, ADDRESS)
 
 
 @pytest.mark.anyio
@@ -338,7 +362,7 @@ async def test_contract_scan_different_responses(user_with_auth, async_client):
     # Mock the sync_credits method that will be called after dependency check
     async_mock = AsyncMock()
 
-    async def mock_get_source_code(self, client, network, address):
+    async def mock_get_source_code(self, network, address):
         request = Request("GET", "https://mocked.url")
         if network in [NetworkEnum.ETH, NetworkEnum.ARB]:
             return Response(
@@ -393,3 +417,360 @@ async def test_contract_scan_different_responses(user_with_auth, async_client):
             assert non_eth_contract is None
 
     await Contract.all().delete()
+
+
+@pytest.mark.anyio
+async def test_source_code_cache():
+    """
+    Explorer answers are cached, including misses, but errors are retried and
+    concurrent lookups share a request
+    """
+    ADDRESS = "0xcachedaddress"
+    calls = []
+
+    async def mock_get_source_code(self, network, address):
+        calls.append(network)
+        await asyncio.sleep(0.01)
+        request = Request("GET", "https://mocked.url")
+        if network == NetworkEnum.ETH:
+            content = {"result": [{"SourceCode": "contract Cached {}"}]}
+        elif network == NetworkEnum.BASE:
+            content = {"status": "0", "result": "Max rate limit reached"}
+        else:
+            content = {"result": []}
+        return Response(request=request, status_code=200, content=json.dumps(content))
+
+    blockchain_service = BlockchainService()
+    networks = [NetworkEnum.ETH, NetworkEnum.ARB, NetworkEnum.BASE]
+
+    with patch.object(ExplorerClient, "get_source_code", new=mock_get_source_code):
+        for _ in range(2):
+            results = await asyncio.gather(
+                *[
+                    blockchain_service.get_source_code(address=ADDRESS, network=network)
+                    for network in networks
+                    for _ in range(3)
+                ]
+            )
+
+    # the rate limited explorer isn't cached, the others are fetched once.
+    assert sorted(calls) == sorted(networks + [NetworkEnum.BASE])
+
+    eth, arb, base = results[0], results[3], results[6]
+    assert eth["is_available"] and eth["code"] == "contract Cached {}"
+    assert not arb["exists"]
+    assert not base["exists"]
+
+    for network in networks:
+        await source_code_cache.invalidate(network, ADDRESS)
+
+
+@pytest.mark.anyio
+async def test_probes_networks_with_code(user_with_auth, async_client, monkeypatch):
+    """
+    Explorers are only queried on networks where the address has bytecode, or
+    that couldn't be probed
+    """
+    ADDRESS = "0xprobedaddress"
+    scanned = []
+
+    async def mock_get_code_exists(self, addresses):
+        if self.network == NetworkEnum.BASE:
+            raise TimeoutError()
+        return {address: self.network == NetworkEnum.ETH for address in addresses}
+
+    async def mock_get_source_code(self, network, address):
+        scanned.append(network)
+        request = Request("GET", "https://mocked.url")
+        content = {"result": [{"SourceCode": "contract Probed {}"}]}
+        return Response(request=request, status_code=200, content=json.dumps(content))
+
+    monkeypatch.setenv("ALCHEMY_API_KEY", "fake-key")
+
+    with (
+        patch.object(Web3Client, "get_code_exists", new=mock_get_code_exists),
+        patch.object(ExplorerClient, "get_source_code", new=mock_get_source_code),
+    ):
+        response = await async_client.post(
+            "/contract",
+            headers={"Authorization": f"Bearer {USER_API_KEY}"},
+            json=ContractScanBody(address=ADDRESS).model_dump(),
+        )
+
+    assert response.status_code == 202
+    assert sorted(scanned) == sorted([NetworkEnum.ETH, NetworkEnum.BASE])
+
+    await Contract.filter(address=ADDRESS).delete()
+    for network in NetworkEnum:
+        await source_code_cache.invalidate(network, ADDRESS)
+
+
+class FakeChain:
+    """Stands in for Web3Client, with a deployment receipt at some blocks"""
+
+    def __init__(self, head: int, deployments: dict[int, str]):
+        self.head = head
+        self.deployments = deployments
+        self.requested: list[list[int]] = []
+        self.fail_from: int | None = None
+
+    async def get_block_number(self) -> int:
+        return self.head
+
+    async def get_blocks_receipts(self, blocks: list[int]) -> list[list[dict]]:
+        if self.fail_from is not None and blocks[-1] >= self.fail_from:
+            raise ConnectionError("rpc down")
+        self.requested.append(blocks)
+        return [
+            [
+                {"contractAddress": self.deployments.get(block)},
+                {"contractAddress": None},
+            ]
+            for block in blocks
+        ]
+
+
+@pytest.mark.anyio
+async def test_deployment_indexer():
+    """
+    Confirmed block ranges are indexed from a resumable cursor, verified
+    deployments are upserted
+    """
+    VERIFIED = "0xIndexedVerified"
+    UNVERIFIED = "0xIndexedUnverified"
+
+    async def mock_get_source_code(self, network, address):
+        request = Request("GET", "https://mocked.url")
+        source = "contract Indexed {}" if address == VERIFIED else ""
+        content = {"result": [{"SourceCode": source, "ContractName": "Indexed"}]}
+        return Response(request=request, status_code=200, content=json.dumps(content))
+
+    chain = FakeChain(head=120, deployments={103: VERIFIED, 108: UNVERIFIED})
+    indexer = DeploymentIndexer(
+        network=NetworkEnum.ETH, web3_client=chain, batch_blocks=4, confirmations=10
+    )
+    # previously scanned before verification.
+    await Contract.create(
+        method=ContractMethodEnum.SCAN,
+        address=VERIFIED,
+        network=NetworkEnum.ETH,
+        is_available=False,
+    )
+
+    with patch.object(ExplorerClient, "get_source_code", new=mock_get_source_code):
+        # a new network starts from the confirmed head.
+        assert await indexer.run() == 0
+        cursor = await IndexerCursor.get(network=NetworkEnum.ETH)
+        assert cursor.block_number == 110
+
+        await indexer.backfill(from_block=101)
+        chain.fail_from = 109
+        with pytest.raises(ConnectionError):
+            await indexer.run()
+
+        # resumes after the last batch that was written.
+        await cursor.refresh_from_db()
+        assert cursor.block_number == 108
+        chain.fail_from = None
+        chain.head = 125
+        assert await indexer.run(max_blocks=5) == 5
+
+    assert chain.requested == [
+        [101, 102, 103, 104],
+        [105, 106, 107, 108],
+        [109, 110, 111, 112],
+        [113],
+    ]
+    await cursor.refresh_from_db()
+    assert cursor.block_number == 113
+
+    contracts = await Contract.filter(network=NetworkEnum.ETH, address=VERIFIED)
+    assert len(contracts) == 1
+    assert contracts[0].is_available
+    assert contracts[0].code == "contract Indexed {}"
+    assert contracts[0].hashed_code is not None
+    assert not await Contract.exists(address=UNVERIFIED)
+
+    await Contract.filter(address=VERIFIED).delete()
+    await cursor.delete()
+    for address in [VERIFIED, UNVERIFIED]:
+        await source_code_cache.invalidate(NetworkEnum.ETH, address)
+
+
+@pytest.mark.anyio
+async def test_deployment_indexer_overlap():
+    """
+    Overlapping runs never duplicate contracts or move the cursor back
+    """
+    ADDRESS = "0xIndexedOverlap"
+    chain = FakeChain(head=110, deployments={})
+    indexer = DeploymentIndexer(
+        network=NetworkEnum.BASE, web3_client=chain, batch_blocks=2, confirmations=0
+    )
+    cursor = await IndexerCursor.create(network=NetworkEnum.BASE, block_number=100)
+    result = {
+        "address": ADDRESS,
+        "code": "contract Overlap {}",
+        "contract_name": "Overlap",
+        "is_proxy": False,
+    }
+
+    assert await indexer._write([result], expected=100, block_number=102)
+    # a run still expecting the old position writes nothing.
+    assert not await indexer._write([result], expected=100, block_number=104)
+    assert await indexer._write(
+        [{**result, "contract_name": "Renamed"}], expected=102, block_number=104
+    )
+
+    contracts = await Contract.filter(network=NetworkEnum.BASE, address=ADDRESS)
+    assert len(contracts) == 1
+    assert contracts[0].contract_name == "Renamed"
+
+    # a backfill during a run stops it, rather than being overwritten.
+    get_blocks_receipts = chain.get_blocks_receipts
+
+    async def backfill_midway(blocks):
+        if blocks[0] == 107:
+            await indexer.backfill(from_block=50)
+        return await get_blocks_receipts(blocks)
+
+    chain.get_blocks_receipts = backfill_midway
+    assert await indexer.run() == 2
+
+    await cursor.refresh_from_db()
+    assert cursor.block_number == 49
+
+    await Contract.filter(address=ADDRESS).delete()
+    await cursor.delete()
+
+
+@pytest.mark.anyio
+async def test_static_analysis_parsed_once():
+    """
+    Code is parsed once per hashed_code, repeat calls read the stored result
+    """
+    code = """
+    pragma solidity ^0.8.0;
+    contract Token {
+        function mint(address to) public { _mint(to, 1); }
+        function _mint(address to, uint256 amount) internal {}
+        function withdraw() external { selfdestruct(payable(msg.sender)); }
+    }
+    """
+    contract_service = ContractService()
+    body = ContractScanBody(code=code)
+
+    with patch.object(parser_pool, "run", wraps=parser_pool.run) as mock_run:
+        first = await contract_service.process_static_eval_token(body)
+        second = await contract_service.process_static_eval_token(body)
+
+    mock_run.assert_called_once_with(analyze_source, code)
+    assert first == second
+    assert first.is_mintable
+    assert first.can_self_destruct
+    assert first.can_steal_fees
+
+    stored = await ContractAnalysis.get(
+        hashed_code=hashlib.sha256(code.encode()).hexdigest()
+    )
+    assert decompress_ast(stored.ast)["type"] == "SourceUnit"
+
+    # stale analyses are redone.
+    with (
+        patch.object(SourceCodeParser, "ANALYSIS_VERSION", "stale"),
+        patch.object(parser_pool, "run", wraps=parser_pool.run) as mock_run,
+    ):
+        assert await contract_service.process_static_eval_token(body) == first
+
+    assert mock_run.call_count == 1
+
+    await ContractAnalysis.filter(id=stored.id).delete()
+    await Contract.filter(hashed_code=stored.hashed_code).delete()
+
+
+def test_static_analysis_summaries():
+    """
+    Every contract in the source unit is summarized, including calls made inside
+    inline assembly, and detectors read the summaries
+    """
+    code = """
+    pragma solidity ^0.8.0;
+    library Forwarder {
+        function forward(address target) internal {
+            assembly { let ok := delegatecall(gas(), target, 0, 0, 0, 0) }
+        }
+    }
+    contract Token {
+        mapping(address => bool) public blacklisted;
+        modifier onlyOwner() { require(msg.sender == address(0), "owner"); _; }
+        function send(address to) external onlyOwner {
+            require(!blacklisted[to], "banned");
+            payable(to).transfer(1);
+        }
+    }
+    """
+    ast = solidity_parser.parse(code)
+    forwarder, token = summarize(ast)
+
+    assert (forwarder.name, forwarder.kind) == ("Forwarder", "library")
+    assert forwarder.uses_assembly
+    assert "delegatecall" in forwarder.functions[0].calls
+
+    assert token.state_variables == {"blacklisted"}
+    assert [modifier.name for modifier in token.modifiers] == ["onlyOwner"]
+    send = token.functions[0]
+    assert send.modifiers == {"onlyOwner"}
+    assert {"require", "transfer"} <= send.calls
+
+    result = analyze_ast(ast)
+    assert result.has_proxy_functions
+    assert result.has_blocklist
+    assert result.is_honeypot
+    assert not result.is_mintable
+    assert not result.can_self_destruct
+
+
+def test_preprocess_source():
+    """
+    Rewrites are applied outside of strings and comments only, and nested braces
+    in assembly, call options and custom error arguments are handled
+    """
+    code = (
+        "pragma solidity ^0.8.20;\\ncontract T {\n"
+        "    function f(address a) external payable {\n"
+        "        Lib.Layout storage $ = _layout();\n"
+        "        $.balance += 1;\n"
+        "        (bool ok, ) = a.call{value: msg.value, gas: g()}(abi.encode(f(1)));\n"
+        "        if (!ok) revert Errors.Unauthorized(g(a, 1));\n"
+        '        assembly ("memory-safe") { if iszero(ok) { revert(0, 0) } }\n'
+        '        string memory s = "keep\\n { value: x }"; // revert Kept(1);\n'
+        "        Foo({a: 1});\n"
+        "    }\n"
+        "}"
+    )
+
+    assert preprocess("\ufeff" + code) == (
+        "pragma solidity ^0.8.20;\ncontract T {\n"
+        "    function f(address a) external payable {\n"
+        "        \n"
+        "        balance += 1;\n"
+        "        (bool ok, ) = a.call(abi.encode(f(1)));\n"
+        '        if (!ok) require(false, "Errors.Unauthorized error");\n'
+        "        assembly {}\n"
+        '        string memory s = "keep\\n { value: x }"; // revert Kept(1);\n'
+        "        Foo({a: 1});\n"
+        "    }\n"
+        "}"
+    )
+    assert "".join(text for _, text in tokenize(code)) == code
+
+    # escaped as a whole, quotes included, as some explorers return sources.
+    escaped = (
+        'contract E {\\n  string s = \\"hi\\";\\n'
+        "  bytes1 c = \\'a\\';\\n  function f() public { revert Nope(); }\\n}"
+    )
+    assert preprocess(escaped) == (
+        'contract E {\n  string s = "hi";\n'
+        "  bytes1 c = 'a';\n  function f() public { require(false, \"Nope error\"); }\n}"
+    )
+    assert solidity_parser.parse(preprocess(escaped))
@@ -0,0 +1,125 @@
+import json
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.lib.clients.explorer import ExplorerClient, ExplorerPool, TokenBucket
+from app.utils.types.enums import NetworkEnum
+from app.utils.types.errors import ExplorerError
+
+RATE_LIMITED = {"status": "0", "message": "NOTOK", "result": "Max rate limit reached"}
+INVALID_KEY = {"status": "0", "message": "NOTOK", "result": "Invalid API Key"}
+NO_RECORDS = {"status": "0", "message": "No records found", "result": []}
+GAS = {"status": "1", "message": "OK", "result": {"SafeGasPrice": "1"}}
+
+
+def explorer(*bodies: dict | int) -> tuple[ExplorerClient, list[httpx.Request]]:
+    """An ExplorerClient whose responses are `bodies` in order"""
+    requests = []
+    responses = iter(bodies)
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        body = next(responses)
+        if isinstance(body, int):
+            return httpx.Response(body)
+        return httpx.Response(200, content=json.dumps(body))
+
+    pool = ExplorerPool(
+        requests_per_second=1_000,
+        backoff_seconds=0.001,
+        transport=httpx.MockTransport(handle),
+    )
+    return ExplorerClient(pool=pool), requests
+
+
+@pytest.mark.anyio
+async def test_explorer_retries():
+    """
+    Rate limits, whether a 429 or a NOTOK payload, and server errors are retried
+    """
+    client, requests = explorer(RATE_LIMITED, 429, 502, GAS)
+
+    response = await client.get_gas(network=NetworkEnum.ETH)
+
+    assert response.json() == GAS
+    assert len(requests) == 4
+    assert requests[0].url.params["module"] == "gastracker"
+    assert requests[0].url.params["action"] == "gasoracle"
+
+    client, requests = explorer(*[RATE_LIMITED] * 4)
+
+    with pytest.raises(ExplorerError) as err:
+        await client.get_gas(network=NetworkEnum.ETH)
+
+    assert err.value.reason == "rate_limited"
+    assert len(requests) == 4
+
+
+@pytest.mark.anyio
+async def test_explorer_errors():
+    """
+    Other NOTOK payloads fail without retrying, empty answers are returned
+    """
+    client, requests = explorer(INVALID_KEY)
+
+    with pytest.raises(ExplorerError) as err:
+        await client.get_source_code(network=NetworkEnum.ETH, address="0xabc")
+
+    assert err.value.reason == "notok"
+    assert len(requests) == 1
+
+    client, requests = explorer(400)
+
+    with pytest.raises(ExplorerError) as err:
+        await client.get_source_code(network=NetworkEnum.ETH, address="0xabc")
+
+    assert err.value.reason == "http_error"
+    assert len(requests) == 1
+
+    client, requests = explorer(NO_RECORDS)
+
+    response = await client.get_source_code(network=NetworkEnum.ETH, address="0xabc")
+    assert response.json() == NO_RECORDS
+    assert requests[0].url.params["address"] == "0xabc"
+
+
+@pytest.mark.anyio
+async def test_explorer_shares_clients():
+    """
+    Requests to the same host reuse one client, which is replaced once closed
+    """
+    client, _ = explorer(GAS, GAS, GAS)
+    pool = client.pool
+
+    await client.get_gas(network=NetworkEnum.ETH)
+    await client.get_gas(network=NetworkEnum.ETH)
+    assert len(pool._clients) == 1
+    http_client = next(iter(pool._clients.values()))
+
+    await pool.close()
+    assert http_client.is_closed
+    assert not pool._clients
+
+    await client.get_gas(network=NetworkEnum.ETH)
+    assert len(pool._clients) == 1
+
+
+def test_token_bucket():
+    """
+    Bursts up to capacity, then paces callers at the refill rate
+    """
+    with patch("app.lib.clients.explorer.time.monotonic", return_value=100.0):
+        bucket = TokenBucket(rate=5)
+
+        waits = [bucket.reserve() for _ in range(7)]
+
+    assert waits[:5] == [0, 0, 0, 0, 0]
+    assert waits[5:] == [pytest.approx(0.2), pytest.approx(0.4)]
+
+    with patch("app.lib.clients.explorer.time.monotonic", return_value=101.0):
+        # one second refills 5 tokens, 2 of which pay off the debt.
+        waits = [bucket.reserve() for _ in range(4)]
+
+    assert waits == [0, 0, 0, pytest.approx(0.2)]
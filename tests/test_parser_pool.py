@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import pytest
+
+from app.lib.parser_pool import ParserPool
+from app.utils.helpers.code_parser import analyze_source
+from app.utils.types.errors import ParserError, ParserUnavailableError
+
+
+@pytest.mark.anyio
+async def test_parser_pool():
+    """
+    Jobs run in worker processes, and are turned away once the pool is full
+    """
+    pool = ParserPool(max_workers=1, max_queue=1)
+    await pool.start()
+
+    try:
+        ast, result = await pool.run(
+            analyze_source, "contract A { function mint() public {} }"
+        )
+        assert ast is not None
+        assert result["can_self_destruct"] is False
+
+        running = asyncio.create_task(pool.run(time.sleep, 0.5))
+        queued = asyncio.create_task(pool.run(time.sleep, 0.1))
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(ParserUnavailableError):
+            await pool.run(time.sleep, 0)
+
+        await asyncio.gather(running, queued)
+        await pool.run(time.sleep, 0)
+    finally:
+        await pool.close()
+
+
+@pytest.mark.anyio
+async def test_parser_pool_timeout():
+    """
+    A job past its timeout has its worker killed, and the pool keeps working
+    """
+    pool = ParserPool(max_workers=1, max_queue=0)
+
+    try:
+        with pytest.raises(ParserError):
+            await pool.run(time.sleep, 30, timeout=1)
+
+        ast, _ = await pool.run(analyze_source, "contract B {}")
+        assert ast is not None
+    finally:
+        await pool.close()
+
+
+@pytest.mark.anyio
+async def test_parser_pool_queue_wait():
+    """
+    Waiting for a worker doesn't count against a job's timeout
+    """
+    pool = ParserPool(max_workers=1, max_queue=1, timeout=1)
+    await pool.start()
+
+    try:
+        running = asyncio.create_task(pool.run(time.sleep, 0.8))
+        await asyncio.sleep(0.01)
+        # starts ~0.8s in, finishing 1.3s after it was queued.
+        queued = asyncio.create_task(pool.run(time.sleep, 0.5))
+
+        await asyncio.gather(running, queued)
+    finally:
+        await pool.close()
+
+
+@pytest.mark.anyio
+async def test_parser_pool_restart_retryable():
+    """
+    Jobs killed by another job's timeout are retryable, and the replacement
+    workers are warmed before the next job starts
+    """
+    pool = ParserPool(max_workers=2, max_queue=0)
+    await pool.start()
+
+    try:
+        hung = asyncio.create_task(pool.run(time.sleep, 30, timeout=1))
+        neighbour = asyncio.create_task(pool.run(time.sleep, 5, timeout=10))
+
+        with pytest.raises(ParserError):
+            await hung
+        with pytest.raises(ParserUnavailableError):
+            await neighbour
+
+        # the replacement's spawn isn't counted against this job.
+        await pool.run(time.sleep, 0, timeout=0.5)
+    finally:
+        await pool.close()
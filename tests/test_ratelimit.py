@@ -0,0 +1,119 @@
+from unittest.mock import patch
+
+import pytest
+from fakeredis import FakeAsyncRedis
+
+from app.api.auth.cache import auth_cache
+from app.db.models import Auth
+from app.lib.ratelimit import RateLimiter
+from tests.constants import FIRST_PARTY_APP_API_KEY, THIRD_PARTY_APP_API_KEY
+
+
+@pytest.mark.anyio
+async def test_rate_limiter_bucket():
+    """
+    Should allow `limit` requests, then reject until a token is refilled
+    """
+    limiter = RateLimiter(redis=FakeAsyncRedis(), period=60)
+
+    for remaining in [2, 1, 0]:
+        result = await limiter.hit("test-bucket", limit=3)
+        assert result.allowed
+        assert result.remaining == remaining
+
+    result = await limiter.hit("test-bucket", limit=3)
+    assert not result.allowed
+    assert result.remaining == 0
+    assert result.retry_after == pytest.approx(20, abs=1)
+    assert result.headers["Retry-After"] == "20"
+    assert result.headers["X-RateLimit-Limit"] == "3"
+
+    # buckets are independent
+    result = await limiter.hit("other-bucket", limit=3)
+    assert result.allowed
+
+
+@pytest.mark.anyio
+async def test_rate_limiter_local_fast_path():
+    """
+    Once rejected, a key is rejected in-process without calling redis
+    """
+    limiter = RateLimiter(redis=FakeAsyncRedis(), period=60)
+
+    await limiter.hit("test-bucket", limit=1)
+    result = await limiter.hit("test-bucket", limit=1)
+    assert not result.allowed
+
+    with patch.object(limiter, "script", side_effect=AssertionError("called redis")):
+        result = await limiter.hit("test-bucket", limit=1)
+        assert not result.allowed
+
+
+@pytest.mark.anyio
+async def test_rate_limiter_refills():
+    limiter = RateLimiter(redis=FakeAsyncRedis(), period=60)
+
+    with patch("app.lib.ratelimit.time.time", return_value=1_000.0):
+        assert (await limiter.hit("test-bucket", limit=2)).allowed
+        assert (await limiter.hit("test-bucket", limit=2)).allowed
+        assert not (await limiter.hit("test-bucket", limit=2)).allowed
+
+    limiter.blocked.clear()
+
+    # one token refills every 30s
+    with patch("app.lib.ratelimit.time.time", return_value=1_031.0):
+        result = await limiter.hit("test-bucket", limit=2)
+        assert result.allowed
+        assert result.remaining == 0
+
+
+@pytest.mark.anyio
+async def test_rate_limiter_unavailable():
+    """
+    Should fail open if redis can't be reached
+    """
+    limiter = RateLimiter(redis=FakeAsyncRedis(), period=60)
+
+    with patch.object(limiter, "script", side_effect=ConnectionError("down")):
+        assert await limiter.hit("test-bucket", limit=1) is None
+
+
+@pytest.mark.anyio
+async def test_rate_limit_middleware(first_party_app, third_party_app, async_client):
+    """
+    Limits are read from the caller's Auth, and first party apps are exempt
+    """
+    auth = await Auth.get(app_id=third_party_app.id)
+    auth.rate_limit = 2
+    await auth.save()
+    await auth_cache.invalidate_auth(auth)
+
+    limiter = RateLimiter(redis=FakeAsyncRedis())
+    with patch("app.api.middlewares.rate_limiter", limiter):
+        for remaining in ["1", "0"]:
+            response = await async_client.get(
+                "/platform/cost-estimate",
+                headers={"Authorization": f"Bearer {THIRD_PARTY_APP_API_KEY}"},
+            )
+            assert response.status_code == 200
+            assert response.headers["X-RateLimit-Limit"] == "2"
+            assert response.headers["X-RateLimit-Remaining"] == remaining
+
+        response = await async_client.get(
+            "/platform/cost-estimate",
+            headers={"Authorization": f"Bearer {THIRD_PARTY_APP_API_KEY}"},
+        )
+        assert response.status_code == 429
+        assert "Retry-After" in response.headers
+
+        for _ in range(3):
+            response = await async_client.get(
+                "/platform/cost-estimate",
+                headers={"Authorization": f"Bearer {FIRST_PARTY_APP_API_KEY}"},
+            )
+            assert response.status_code == 200
+            assert "X-RateLimit-Limit" not in response.headers
+
+    auth.rate_limit = None
+    await auth.save()
+    await auth_cache.invalidate_auth(auth)
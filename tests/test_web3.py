@@ -0,0 +1,204 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+from web3 import AsyncWeb3
+from web3.exceptions import Web3RPCError, Web3ValueError
+
+from app.api.blockchain.cache import credits_cache
+from app.api.blockchain.service import BlockchainService
+from app.lib.clients.web3 import (
+    CREDITS_ABI,
+    CREDITS_CONTRACTS,
+    BatchingHTTPProvider,
+    Web3Client,
+    web3_registry,
+)
+from app.utils.types.enums import NetworkEnum
+
+DEPLOYED = "0x" + "11" * 20
+NOT_DEPLOYED = "0x" + "22" * 20
+
+
+class FakeRpc:
+    """Answers JSON-RPC posts, failing any call for a block over 100"""
+
+    def __init__(self):
+        self.posts: list[list[dict] | dict] = []
+
+    def answer(self, request: dict) -> dict:
+        if request["method"] == "eth_blockNumber":
+            return {"jsonrpc": "2.0", "id": request["id"], "result": "0x10"}
+        if request["method"] == "eth_getCode":
+            code = "0x6080" if request["params"][0].lower() == DEPLOYED else "0x"
+            return {"jsonrpc": "2.0", "id": request["id"], "result": code}
+
+        block = int(request["params"][0], 16)
+        if block > 100:
+            error = {"code": -32000, "message": f"block {block} not found"}
+            return {"jsonrpc": "2.0", "id": request["id"], "error": error}
+        return {"jsonrpc": "2.0", "id": request["id"], "result": []}
+
+    async def post(self, endpoint_uri, data, **kwargs) -> bytes:
+        body = json.loads(data)
+        self.posts.append(body)
+        if isinstance(body, list):
+            # batch responses don't have to come back in order.
+            return json.dumps([self.answer(request) for request in reversed(body)])
+        return json.dumps(self.answer(body))
+
+
+def provider() -> tuple[BatchingHTTPProvider, FakeRpc]:
+    rpc = FakeRpc()
+    provider = BatchingHTTPProvider("http://rpc.test", max_batch_size=3)
+    provider._request_session_manager.async_make_post_request = rpc.post
+    return provider, rpc
+
+
+@pytest.mark.anyio
+async def test_batches_concurrent_calls():
+    """
+    Calls made together share a POST, and each gets its own result or error
+    """
+    batching_provider, rpc = provider()
+    web3 = AsyncWeb3(batching_provider)
+
+    results = await asyncio.gather(
+        web3.eth.get_block_number(),
+        web3.eth.get_block_receipts(1),
+        web3.eth.get_block_receipts(500),
+        return_exceptions=True,
+    )
+
+    assert len(rpc.posts) == 1
+    assert [request["method"] for request in rpc.posts[0]] == [
+        "eth_blockNumber",
+        "eth_getBlockReceipts",
+        "eth_getBlockReceipts",
+    ]
+    assert results[0] == 16
+    assert results[1] == []
+    assert isinstance(results[2], Web3RPCError)
+    assert "block 500 not found" in str(results[2])
+
+    # batches are capped at max_batch_size, a lone call isn't batched.
+    results = await asyncio.gather(*[web3.eth.get_block_receipts(n) for n in range(4)])
+    assert results == [[], [], [], []]
+    assert [len(post) if isinstance(post, list) else 1 for post in rpc.posts[1:]] == [
+        3,
+        1,
+    ]
+
+
+@pytest.mark.anyio
+async def test_batch_transport_error():
+    """
+    A failed POST fails every call in the batch
+    """
+    batching_provider, _ = provider()
+
+    async def post(endpoint_uri, data, **kwargs):
+        raise ConnectionError("rpc down")
+
+    batching_provider._request_session_manager.async_make_post_request = post
+    web3 = AsyncWeb3(batching_provider)
+
+    results = await asyncio.gather(
+        web3.eth.get_block_number(),
+        web3.eth.get_block_receipts(1),
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(result, ConnectionError) for result in results)
+
+
+@pytest.mark.anyio
+async def test_explicit_batches_refused():
+    """
+    web3's provider-wide batches are refused, calls stay usable meanwhile
+    """
+    batching_provider, _ = provider()
+    web3 = AsyncWeb3(batching_provider)
+
+    with pytest.raises(Web3ValueError):
+        async with web3.batch_requests() as batch:
+            batch.add(web3.eth.get_block_number())
+
+    assert await web3.eth.get_block_number() == 16
+
+
+@pytest.mark.anyio
+async def test_web3_registry(monkeypatch):
+    """
+    Clients on the same network share an AsyncWeb3, contracts are built once
+    """
+    monkeypatch.setenv("RAILWAY_ENVIRONMENT_NAME", "staging")
+
+    first = Web3Client(network=NetworkEnum.ETH_SEPOLIA)
+    second = Web3Client.from_deployment()
+    other = Web3Client(network=NetworkEnum.BASE)
+
+    assert first.provider is second.provider
+    assert first.provider is not other.provider
+    assert isinstance(first.provider.provider, BatchingHTTPProvider)
+
+    address = first.provider.to_checksum_address(CREDITS_CONTRACTS["staging"])
+    contract = web3_registry.contract(first.url, address, CREDITS_ABI)
+    assert web3_registry.contract(second.url, address, CREDITS_ABI) is contract
+
+    await web3_registry.close()
+    assert Web3Client(network=NetworkEnum.ETH_SEPOLIA).provider is not first.provider
+
+
+@pytest.mark.anyio
+async def test_shared_provider_concurrent_calls():
+    """
+    Probes and receipt fetches don't disturb other calls on the same shared
+    provider, everything made together goes out in one batch
+    """
+    rpc = FakeRpc()
+    url = "http://rpc.shared.test"
+    prober = Web3Client(network=NetworkEnum.BASE, url=url)
+    caller = Web3Client(network=NetworkEnum.BASE, url=url)
+    assert prober.provider is caller.provider
+    prober.provider.provider._request_session_manager.async_make_post_request = rpc.post
+
+    block, exists, receipts = await asyncio.gather(
+        caller.get_block_number(),
+        prober.get_code_exists([DEPLOYED, NOT_DEPLOYED]),
+        prober.get_blocks_receipts([1, 2]),
+    )
+
+    assert block == 16
+    assert exists == {DEPLOYED: True, NOT_DEPLOYED: False}
+    assert receipts == [[], []]
+    assert len(rpc.posts) == 1
+    assert len(rpc.posts[0]) == 5
+
+    await web3_registry.close()
+
+
+@pytest.mark.anyio
+async def test_credits_cache():
+    """
+    Credit balances are cached per address, failed reads aren't
+    """
+    ADDRESS = "0xCachedCredits"
+    calls = []
+
+    async def get_user_credits(self, user_address):
+        calls.append(user_address)
+        if len(calls) == 1:
+            raise ConnectionError("rpc down")
+        return 12.5
+
+    blockchain_service = BlockchainService()
+    with patch.object(Web3Client, "get_user_credits", new=get_user_credits):
+        assert await blockchain_service.get_credits(ADDRESS) == 0
+        assert await blockchain_service.get_credits(ADDRESS) == 12.5
+        assert await blockchain_service.get_credits(ADDRESS.lower()) == 12.5
+
+    assert len(calls) == 2
+
+    await credits_cache.delete(ADDRESS.lower())
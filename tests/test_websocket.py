@@ -0,0 +1,163 @@
+import asyncio
+import json
+from contextlib import aclosing
+from types import SimpleNamespace
+from unittest.mock import ANY
+
+import pytest
+from fakeredis import FakeAsyncRedis
+
+from app.api.websocket.router import WebsocketRouter
+from app.lib.events import JobEventHub, stream_position
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.received: list[dict] = []
+        self.client_state = SimpleNamespace(name="CONNECTED")
+
+    async def accept(self):
+        pass
+
+    async def close(self):
+        self.client_state.name = "DISCONNECTED"
+
+    async def send_json(self, data: dict):
+        self.received.append(data)
+
+
+async def wait_for(condition, timeout: float = 2):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+@pytest.mark.anyio
+async def test_websocket_fan_out():
+    """
+    Every socket subscribed to a job receives its events, and the replica only
+    listens to channels of jobs that have a subscriber
+    """
+    redis = FakeAsyncRedis()
+    hub = JobEventHub(redis=redis)
+    router = WebsocketRouter(events=hub)
+
+    first, second, other = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+    await router.assign_job("job-1", first)
+    await router.assign_job("job-1", second)
+    await router.assign_job("job-2", other)
+    await wait_for(lambda: len(hub.subscribers) == 2)
+
+    assert set(await redis.pubsub_channels()) == {b"evals:job-1", b"evals:job-2"}
+
+    event = {"type": "eval", "name": "test", "status": "start", "job_id": "job-1"}
+    await hub.event_log.publish("job-1", event)
+    await wait_for(lambda: first.received and second.received)
+
+    assert first.received == second.received == [{"id": ANY, **event}]
+    assert other.received == []
+
+    # the job stays subscribed until its last socket leaves.
+    await router.unassign_job("job-1", first)
+    await hub.event_log.publish("job-1", {**event, "status": "done"})
+    await wait_for(lambda: len(second.received) == 2)
+    assert len(first.received) == 1
+
+    await router.unassign_job("job-1", second)
+    await router.unassign_job("job-2", other)
+    await wait_for(lambda: hub.listener.done())
+
+    assert await redis.pubsub_channels() == []
+    assert await redis.publish("evals:job-1", json.dumps(event)) == 0
+
+
+@pytest.mark.anyio
+async def test_websocket_replay():
+    """
+    Late subscribers replay the logged events before following live ones, and
+    can resume after the last event they saw
+    """
+    hub = JobEventHub(redis=FakeAsyncRedis())
+    router = WebsocketRouter(events=hub)
+
+    event = {"type": "eval", "name": "test", "job_id": "job-1"}
+    started = await hub.event_log.publish("job-1", {**event, "status": "start"})
+    await hub.event_log.publish("job-1", {**event, "status": "chunk"})
+
+    late, resumed = FakeWebSocket(), FakeWebSocket()
+    await router.assign_job("job-1", late)
+    await router.assign_job("job-1", resumed, started)
+    await wait_for(lambda: len(late.received) == 2 and len(resumed.received) == 1)
+
+    assert [e["status"] for e in late.received] == ["start", "chunk"]
+    assert [e["status"] for e in resumed.received] == ["chunk"]
+
+    await hub.event_log.publish("job-1", {**event, "status": "done"})
+    await wait_for(lambda: len(late.received) == 3 and len(resumed.received) == 2)
+
+    ids = [e["id"] for e in late.received]
+    assert ids == sorted(ids, key=stream_position)
+    assert resumed.received == late.received[1:]
+
+    await router.unassign_job("job-1", late)
+    await router.unassign_job("job-1", resumed)
+    await wait_for(lambda: hub.listener.done())
+
+
+@pytest.mark.anyio
+async def test_slow_subscriber_catches_up():
+    """
+    A subscriber that falls behind its queue re-reads the log, without gaps or
+    duplicates
+    """
+    hub = JobEventHub(redis=FakeAsyncRedis(), queue_size=2)
+    event = {"type": "eval", "name": "test", "status": "chunk", "job_id": "job-1"}
+
+    async with aclosing(hub.subscribe("job-1")) as events:
+        first = await hub.event_log.publish("job-1", event)
+        assert (await events.__anext__())["id"] == first
+
+        ids = [await hub.event_log.publish("job-1", event) for _ in range(5)]
+        # let the listener deliver them all, overflowing the queue.
+        await asyncio.sleep(0.1)
+
+        assert [(await events.__anext__())["id"] for _ in range(5)] == ids
+
+    assert not hub.subscribers
+    await wait_for(lambda: hub.listener.done())
+
+
+@pytest.mark.anyio
+async def test_websocket_heartbeat():
+    """
+    One loop sends heartbeats to every socket, and only drops sockets that leave
+    them unanswered for longer than the grace window
+    """
+    router = WebsocketRouter(heartbeat_interval=0.1, heartbeat_grace=0.25)
+
+    responsive, silent = FakeWebSocket(), FakeWebSocket()
+    await router.connect(responsive)
+    await router.connect(silent)
+    task = router.heartbeat_task
+
+    await wait_for(lambda: responsive.received and silent.received)
+    assert responsive.received[0] == silent.received[0] == {"type": "heartbeat"}
+
+    # still connected after a missed heartbeat, within the grace window.
+    await asyncio.sleep(0.15)
+    assert silent in router.active_connections
+
+    async def answer():
+        while True:
+            router.pong(responsive)
+            await asyncio.sleep(0.02)
+
+    answering = asyncio.create_task(answer())
+    await wait_for(lambda: silent.client_state.name == "DISCONNECTED")
+    assert list(router.active_connections) == [responsive]
+    assert len(responsive.received) > len(silent.received)
+
+    answering.cancel()
+    await router.disconnect(responsive)
+    await wait_for(lambda: task.done())
+    assert not any(router.wheel)